@@ -4,6 +4,10 @@ import struct
 import hashlib
 import random
 
+import numpy as np
+
+from positions import hash_positions as _positions
+
 def bytes_xor(a: bytes, b: bytes) -> bytes:
     """按位异或两个等长字节串"""
     return bytes(x ^ y for x, y in zip(a, b))
@@ -16,25 +20,29 @@ def fingerprint(item: str, psi: int) -> bytes:
     byte_len = psi // 8
     return hashlib.sha256(item.encode('utf-8')).digest()[:byte_len]
 
+def hash_positions(item: str, size: int, hash_count: int, hashing: dict | None = None) -> list:
+    """生成 hash_count 个候选位置，采用双哈希技巧（哈希族见 positions 模块）"""
+    return _positions(item, size, hash_count, hashing)
+
 class GarbledBloomFilter:
-    def __init__(self, size: int, hash_count: int, psi: int):
+    def __init__(self, size: int, hash_count: int, psi: int, hashing: dict | None = None):
         """
         size: 布隆过滤器数组大小
         hash_count: 哈希函数个数（t）
         psi: 每个单元存储比特数（应为8的倍数）
+        hashing: 位置哈希族 {"family", "key"}，None 为 sha256-md5
         """
         self.size = size
         self.hash_count = hash_count
         self.psi = psi
+        self.hashing = hashing
         self.byte_len = psi // 8
         # 初始化数组：每个位置为固定长度的全0字节串
         self.array = [b'\x00' * self.byte_len for _ in range(size)]
 
     def _hashes(self, item: str) -> list:
         """生成 hash_count 个候选位置，采用双哈希技巧"""
-        hash1 = int(hashlib.sha256(item.encode('utf-8')).hexdigest(), 16)
-        hash2 = int(hashlib.md5(item.encode('utf-8')).hexdigest(), 16)
-        return [(hash1 + i * hash2) % self.size for i in range(self.hash_count)]
+        return hash_positions(item, self.size, self.hash_count, self.hashing)
 
     def add(self, item: str):
         """
@@ -75,3 +83,43 @@ class GarbledBloomFilter:
         for pos in positions:
             xor_result = bytes_xor(xor_result, self.array[pos])
         return xor_result == fingerprint(item, self.psi)
+
+
+def build_gbf_batch(items_per_record: list, size: int, hash_count: int, psi: int,
+                    hashing: dict | None = None) -> np.ndarray:
+    """
+    批量构造混淆布隆过滤器：把所有记录编码进一个 (n, size, psi/8) 的 uint8 数组。
+    与 GarbledBloomFilter.add 语义一致（_hashes 位置、fingerprint 指纹、份额异或累积），
+    但每个不同 token 只计算一次哈希位置与指纹，整批份额只做一次 os.urandom 抽取，
+    并用向量化的异或散射写入。
+    items_per_record: 每条记录要插入的 token 列表；hashing 同 GarbledBloomFilter。
+    """
+    byte_len = psi // 8
+    n = len(items_per_record)
+    out = np.zeros((n, size, byte_len), dtype=np.uint8)
+    rec_idx = [i for i, items in enumerate(items_per_record) for _ in items]
+    tokens = [item for items in items_per_record for item in items]
+    T = len(tokens)
+    if T == 0:
+        return out
+
+    # 每个不同 token 的候选位置与指纹只算一次
+    uniq = {}
+    for tok in tokens:
+        if tok not in uniq:
+            uniq[tok] = (hash_positions(tok, size, hash_count, hashing), fingerprint(tok, psi))
+    positions = np.array([uniq[tok][0] for tok in tokens], dtype=np.int64)
+    fps = np.frombuffer(b"".join(uniq[tok][1] for tok in tokens), dtype=np.uint8).reshape(T, byte_len)
+
+    # 一次 CSPRNG 抽取：随机份额 + 每个 token 的特殊位置
+    rand = os.urandom(T * hash_count * byte_len + 2 * T)
+    shares = np.frombuffer(rand, dtype=np.uint8, count=T * hash_count * byte_len).reshape(T, hash_count, byte_len).copy()
+    special = np.frombuffer(rand, dtype=np.uint16, count=T, offset=T * hash_count * byte_len) % hash_count
+    # 特殊位置份额 = fingerprint XOR 其它份额，使 t 个份额的异或恰为指纹
+    rows = np.arange(T)
+    shares[rows, special] ^= np.bitwise_xor.reduce(shares, axis=1) ^ fps
+
+    flat = out.reshape(n * size, byte_len)
+    cells = (np.asarray(rec_idx, dtype=np.int64)[:, None] * size + positions).ravel()
+    np.bitwise_xor.at(flat, cells, shares.reshape(T * hash_count, byte_len))
+    return out
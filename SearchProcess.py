@@ -2,12 +2,7 @@ import hashlib
 from math import ceil
 from QueryUtils import pad_query_blocks, tokenize_normalized
 import DMPF
-
-
-def _hash_positions(item: str, size: int, hash_count: int) -> list:
-    h1 = int(hashlib.sha256(item.encode('utf-8')).hexdigest(), 16)
-    h2 = int(hashlib.md5(item.encode('utf-8')).hexdigest(), 16)
-    return [(h1 + i * h2) % size for i in range(hash_count)]
+from positions import hash_positions, index_hashing
 
 
 def _prp(zeta: bytes, x: int) -> int:
@@ -48,6 +43,7 @@ def search_process(query, authenticated_index, suppression=None, spa_cells: list
     U = authenticated_index['U']
     security_param = authenticated_index['security_param']
     k_tex = authenticated_index.get('k_tex', 4)
+    hashing = index_hashing(authenticated_index)
 
     toks = tokenize_normalized(query)
     tokens = toks or [query]
@@ -65,7 +61,7 @@ def search_process(query, authenticated_index, suppression=None, spa_cells: list
 
     # 关键词 token 路径
     for tok in tokens:
-        indices = _hash_positions(tok, m2, k_tex)
+        indices = hash_positions(tok, m2, k_tex, hashing)
         # PRP-based Cuckoo hashing parameters
         ck = authenticated_index.get('cuckoo_kw', {"kappa": 3, "load": 1.27, "seed": "cuckoo-seed"})
         kappa = min(int(ck.get('kappa', 3)), k_tex)
@@ -97,7 +93,7 @@ def search_process(query, authenticated_index, suppression=None, spa_cells: list
         k_spa = authenticated_index.get('k_spa', 3)
         m1 = authenticated_index['m1']
         for cell in spa_cells:
-            indices = _hash_positions(cell, m1, k_spa)
+            indices = hash_positions(cell, m1, k_spa, hashing)
             ck = authenticated_index.get('cuckoo_spa', {"kappa": 3, "load": 1.27, "seed": "cuckoo-seed-spa"})
             kappa = min(int(ck.get('kappa', 3)), k_spa)
             M = max(1, int(ceil(float(ck.get('load', 1.27)) * max(1, len(indices)))))
@@ -3,6 +3,10 @@ import math
 import hashlib
 import hmac
 
+import numpy as np
+
+from positions import check_hashing
+
 
 def bytes_xor(a: bytes, b: bytes) -> bytes:
     return bytes(x ^ y for x, y in zip(a, b))
@@ -20,6 +24,86 @@ def F(key: bytes, data: bytes, output_len: int) -> bytes:
     return full[:output_len]
 
 
+class PadReader:
+    """
+    Random-access view of the pad F(key, data, output_len).
+    Only the 32-byte HMAC counter blocks covering the requested ranges are computed
+    (and cached), so reading k short segments costs at most k HMACs instead of the
+    whole pad. Bytes returned are identical to the corresponding slice of F.
+    """
+
+    BLOCK = 32
+
+    def __init__(self, key: bytes, data: bytes, output_len: int):
+        self.key = key
+        self.data = data
+        self.output_len = output_len
+        self._blocks = {}
+
+    def _block(self, counter: int) -> bytes:
+        blk = self._blocks.get(counter)
+        if blk is None:
+            if self.output_len <= self.BLOCK:
+                # F does not use counter mode for pads that fit in one digest
+                blk = hmac.new(self.key, self.data, hashlib.sha256).digest()
+            else:
+                blk = hmac.new(self.key, self.data + counter.to_bytes(4, 'big'), hashlib.sha256).digest()
+            self._blocks[counter] = blk
+        return blk
+
+    def read(self, start: int, length: int) -> bytes:
+        end = start + length
+        if start < 0 or end > self.output_len:
+            raise ValueError(f"pad range [{start}, {end}) outside pad of {self.output_len} bytes")
+        first = start // self.BLOCK
+        last = (end - 1) // self.BLOCK
+        if first == last:
+            off = start - first * self.BLOCK
+            return self._block(first)[off:off + length]
+        chunk = b"".join(self._block(c) for c in range(first, last + 1))
+        off = start - first * self.BLOCK
+        return chunk[off:off + length]
+
+    def xor_cells(self, columns, byte_len: int) -> bytes:
+        """XOR of the byte_len-sized pad cells at the given global column indices."""
+        acc = 0
+        for col in columns:
+            acc ^= int.from_bytes(self.read(col * byte_len, byte_len), 'big')
+        return acc.to_bytes(byte_len, 'big')
+
+
+def pad_cells(key: bytes, row_data, output_len: int, columns, byte_len: int) -> np.ndarray:
+    """
+    Batch form of PadReader: the byte_len cells at `columns` of F(key, data, output_len)
+    for every data in row_data, as a (rows, len(columns), byte_len) uint8 array.
+    Per row only the counter blocks covering the columns are computed, and the HMAC
+    key schedule is derived once for all rows.
+    """
+    B = PadReader.BLOCK
+    starts = np.asarray(columns, dtype=np.int64) * byte_len
+    if starts.size and (starts.min() < 0 or starts.max() + byte_len > output_len):
+        raise ValueError(f"pad cells outside pad of {output_len} bytes")
+    byte_idx = (starts[:, None] + np.arange(byte_len)).reshape(-1)
+    counters = np.unique(byte_idx // B)
+    # offset of every requested byte inside the concatenation of the needed blocks
+    local = np.searchsorted(counters, byte_idx // B) * B + byte_idx % B
+    # F does not use counter mode for pads that fit in one digest
+    suffixes = [b""] if output_len <= B else [int(c).to_bytes(4, 'big') for c in counters]
+
+    base = hmac.new(key, digestmod=hashlib.sha256)
+    out = bytearray()
+    for data in row_data:
+        h = base.copy()
+        h.update(data)
+        for suffix in suffixes:
+            blk = h.copy()
+            blk.update(suffix)
+            out += blk.digest()
+    rows = len(out) // (len(suffixes) * B)
+    blocks = np.frombuffer(bytes(out), dtype=np.uint8).reshape(rows, len(suffixes) * B)
+    return blocks[:, local].reshape(rows, len(starts), byte_len)
+
+
 def FC_eval(key: bytes, data: bytes, output_len: int = 16) -> bytes:
     return hmac.new(key, data, hashlib.sha256).digest()[:output_len]
 
@@ -44,78 +128,171 @@ def FX(key: bytes, data: bytes, output_len: int) -> bytes:
     return res
 
 
-def Setup(DB: list, config: dict):
+class FXTable:
+    """
+    FX evaluator for a fixed key K with per-byte lookup tables.
+    The psi per-bit blocks PRF(K, b) are derived once and folded into one 256-entry
+    table per input byte, so FX(K, u) costs len(u) lookups instead of one HMAC per set bit.
+    Output is bit-identical to FX(K, u, output_len) for inputs of at most psi bits.
+    """
+
+    def __init__(self, key: bytes, psi: int, output_len: int):
+        self.byte_len = psi // 8
+        self.output_len = output_len
+        self.tables = []
+        for pos in range(self.byte_len):
+            blocks = []
+            for k in range(8):
+                bit_index = pos * 8 + k
+                blk = hmac.new(key, b"FX" + bit_index.to_bytes(4, 'big'), hashlib.sha256).digest()[:output_len]
+                blocks.append(int.from_bytes(blk, 'big'))
+            table = [0] * 256
+            for v in range(1, 256):
+                low = v & -v
+                table[v] = table[v ^ low] ^ blocks[low.bit_length() - 1]
+            self.tables.append(table)
+
+    def eval_int(self, data) -> int:
+        """FX(K, data) as a big-endian integer (cheap to XOR-accumulate)."""
+        if len(data) > self.byte_len:
+            raise ValueError(f"FXTable covers {self.byte_len} bytes, got {len(data)}")
+        acc = 0
+        for table, byte in zip(self.tables, data):
+            acc ^= table[byte]
+        return acc
+
+    def __call__(self, data) -> bytes:
+        return self.eval_int(data).to_bytes(self.output_len, 'big')
+
+
+def derive_Kv(K_main: bytes, s_val: int, n: int, lam: int) -> bytes:
+    """Constrained key Kv = FC.Cons(K_main, v) for a random prefix v sized for n records."""
+    prefix_length = max(0, s_val - math.ceil(math.log2(max(1, n))))
+    prefix_bytes = (prefix_length + 7) // 8
+    v = os.urandom(prefix_bytes)
+    return FC_cons(K_main, v, output_len=lam)
+
+
+def index_params(config: dict) -> dict:
+    """AUI metadata derived from the configuration (everything except matrices, sigma and ids)."""
+    return {
+        "m_prime_1": config.get("m_prime_1"),
+        "m_prime_2": config.get("m_prime_2"),
+        "m1": config["spatial_bloom_filter"]["size"],
+        "m2": config["keyword_bloom_filter"]["size"],
+        "security_param": config.get("lambda", 16),
+        "U": config.get("U"),
+        "segment_length": config["keyword_bloom_filter"]["psi"] // 8,
+        "k_spa": config.get("spatial_bloom_filter", {}).get("hash_count", 3),
+        "k_tex": config.get("keyword_bloom_filter", {}).get("hash_count", 4),
+        "cuckoo_kw": {
+            "kappa": config.get('cuckoo', {}).get('kappa_kw', 3),
+            "load": config.get('cuckoo', {}).get('load_kw', 1.27),
+            "seed": config.get('cuckoo', {}).get('seed_kw', 'cuckoo-seed'),
+        },
+        "cuckoo_spa": {
+            "kappa": config.get('cuckoo', {}).get('kappa_spa', 3),
+            "load": config.get('cuckoo', {}).get('load_spa', 1.27),
+            "seed": config.get('cuckoo', {}).get('seed_spa', 'cuckoo-seed-spa'),
+        },
+        "hashing": check_hashing(config.get("hashing")),
+    }
+
+
+def encrypt_shard(start_idx: int, rows: list, Ke: bytes, Kv: bytes, m1: int, m2: int, psi: int, lam: int):
+    """
+    Encrypt one contiguous shard of records and fold their FX values into per-column
+    accumulators. rows[k] = (id, spatial cells, keyword cells) for record start_idx + k
+    (1-based). Returns (Ebp rows, EbW rows, sigma accumulators as ints, m1 + m2 of them).
+    Runs unchanged in worker processes, so it only takes picklable arguments.
+    """
+    chunk_len = psi // 8
+    total_len = (m1 + m2) * chunk_len
+    Ispa = []
+    Itex = []
+    sigma_acc = [0] * (m1 + m2)
+    for idx, (obj_id, bp_i, bW_i) in enumerate(rows, start=start_idx):
+        # Encrypt GBFs: XOR the whole record with its pad in one go
+        raw = b"".join(bp_i) + b"".join(bW_i)
+        padi = F(Ke, (str(idx) + str(obj_id)).encode('utf-8'), total_len)
+        enc = (int.from_bytes(raw, 'big') ^ int.from_bytes(padi, 'big')).to_bytes(total_len, 'big')
+        cells = [enc[j * chunk_len:(j + 1) * chunk_len] for j in range(m1 + m2)]
+        Ispa.append(cells[:m1])
+        Itex.append(cells[m1:])
+
+        # Aggregate tags sigma: one FX table per record key Ki
+        Ki = FC_eval(Kv, str(idx).encode('utf-8'), output_len=lam)
+        fx = FXTable(Ki, psi, lam)
+        for j in range(m1):
+            sigma_acc[j] ^= fx.eval_int(bp_i[j])
+        for j in range(m2):
+            sigma_acc[m1 + j] ^= fx.eval_int(bW_i[j])
+    return Ispa, Itex, sigma_acc
+
+
+def _encrypt_shard_task(args):
+    return encrypt_shard(*args)
+
+
+def Setup(DB: list, config: dict, workers: int | None = None):
     """
     构造认证索引与密钥，返回 (AUI, (Ke, Kv, Kh)).
     约定：DB 中每个元素拥有属性 id、spatial_gbf.array、keyword_gbf.array。
+    workers > 1 时按记录分片到进程池并行加密与聚合 sigma（按列 XOR 合并），
+    输出与串行构建完全一致。
     """
     n = len(DB)
     lam = config.get("lambda", 16)
     m1 = config["spatial_bloom_filter"]["size"]
     m2 = config["keyword_bloom_filter"]["size"]
     psi = config["keyword_bloom_filter"]["psi"]
-    chunk_len = psi // 8
 
     # Keys
     Ke = os.urandom(lam)
     Kh = os.urandom(lam)
     K_main = os.urandom(lam)
 
-    # Encrypt GBFs per record -> Ispa, Itex
+    # Constrained key for per-record keys Ki = FC_eval(Kv, i)
+    Kv = derive_Kv(K_main, config["s"], n, lam)
+
+    rows = [(obj.id, list(obj.spatial_gbf.array), list(obj.keyword_gbf.array)) for obj in DB]
+
+    # Encrypt GBFs per record -> Ispa, Itex and fold FX(Ki, cell) into sigma accumulators
+    workers = int(workers or 1)
+    if workers > 1 and n > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # a few shards per worker keeps the pool busy when records differ in cost
+        shard_size = max(1, math.ceil(n / (workers * 4)))
+        tasks = [
+            (start + 1, rows[start:start + shard_size], Ke, Kv, m1, m2, psi, lam)
+            for start in range(0, n, shard_size)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(_encrypt_shard_task, tasks))
+    else:
+        shards = [encrypt_shard(1, rows, Ke, Kv, m1, m2, psi, lam)]
+
     Ispa = []
     Itex = []
-    raw_spa = []
-    raw_tex = []
-    for idx, obj in enumerate(DB, start=1):
-        bp_i = obj.spatial_gbf.array
-        bW_i = obj.keyword_gbf.array
-        raw_spa.append(bp_i)
-        raw_tex.append(bW_i)
-        total_len = (m1 + m2) * chunk_len
-        padi = F(Ke, (str(idx) + str(obj.id)).encode('utf-8'), total_len)
-        Ebp_i = []
-        for j in range(m1):
-            start = j * chunk_len
-            end = (j + 1) * chunk_len
-            Ebp_i.append(bytes_xor(bp_i[j], padi[start:end]))
-        EbW_i = []
-        for j in range(m2):
-            start = (j + m1) * chunk_len
-            end = (j + m1 + 1) * chunk_len
-            EbW_i.append(bytes_xor(bW_i[j], padi[start:end]))
-        Ispa.append(Ebp_i)
-        Itex.append(EbW_i)
-
-    # Constrained key for per-record keys
-    s_val = config["s"]
-    prefix_length = max(0, s_val - math.ceil(math.log2(max(1, n))))
-    prefix_bytes = (prefix_length + 7) // 8
-    v = os.urandom(prefix_bytes)
-    Kv = FC_cons(K_main, v, output_len=lam)
-
-    K_list = []
-    for i in range(1, n + 1):
-        data_i = str(i).encode('utf-8')
-        Ki = FC_eval(Kv, data_i, output_len=lam)
-        K_list.append(Ki)
+    sigma_acc = [0] * (m1 + m2)
+    for shard_spa, shard_tex, shard_acc in shards:
+        Ispa.extend(shard_spa)
+        Itex.extend(shard_tex)
+        for j, val in enumerate(shard_acc):
+            sigma_acc[j] ^= val
 
-    # Aggregate tags sigma
+    # Apply the HMAC(Kh, j || cat_ids) term once per column
     cat_ids = "".join([str(obj.id) for obj in DB]).encode('utf-8')
     sigma_spa = []
     for j in range(m1):
-        xor_val = b"\x00" * lam
-        for i in range(n):
-            fx_val = FX(K_list[i], raw_spa[i][j], output_len=lam)
-            xor_val = bytes_xor(xor_val, fx_val)
+        xor_val = sigma_acc[j].to_bytes(lam, 'big')
         hmac_val = hmac.new(Kh, str(j + 1).encode('utf-8') + cat_ids, hashlib.sha256).digest()[:lam]
         sigma_spa.append(bytes_xor(xor_val, hmac_val))
 
     sigma_tex = []
     for j in range(m2):
-        xor_val = b"\x00" * lam
-        for i in range(n):
-            fx_val = FX(K_list[i], raw_tex[i][j], output_len=lam)
-            xor_val = bytes_xor(xor_val, fx_val)
+        xor_val = sigma_acc[m1 + j].to_bytes(lam, 'big')
         hmac_val = hmac.new(Kh, str(j + 1 + m1).encode('utf-8') + cat_ids, hashlib.sha256).digest()[:lam]
         sigma_tex.append(bytes_xor(xor_val, hmac_val))
 
@@ -125,26 +302,8 @@ def Setup(DB: list, config: dict):
     authenticated_index = {
         "I_tex": Itex_tilde,
         "I_spa": Ispa_tilde,
-        "m_prime_1": config.get("m_prime_1"),
-        "m_prime_2": config.get("m_prime_2"),
-        "m1": m1,
-        "m2": m2,
-        "security_param": lam,
-        "U": config.get("U"),
-        "segment_length": chunk_len,
+        **index_params(config),
         "ids": [obj.id for obj in DB],
-        "k_spa": config.get("spatial_bloom_filter", {}).get("hash_count", 3),
-        "k_tex": config.get("keyword_bloom_filter", {}).get("hash_count", 4),
-        "cuckoo_kw": {
-            "kappa": config.get('cuckoo', {}).get('kappa_kw', 3),
-            "load": config.get('cuckoo', {}).get('load_kw', 1.27),
-            "seed": config.get('cuckoo', {}).get('seed_kw', 'cuckoo-seed'),
-        },
-        "cuckoo_spa": {
-            "kappa": config.get('cuckoo', {}).get('kappa_spa', 3),
-            "load": config.get('cuckoo', {}).get('load_spa', 1.27),
-            "seed": config.get('cuckoo', {}).get('seed_spa', 'cuckoo-seed-spa'),
-        },
     }
 
     K_final = (Ke, Kv, Kh)
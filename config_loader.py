@@ -4,7 +4,8 @@ import configparser
 def load_config(path: str) -> dict:
     """
     Load configuration from an INI file, providing sane defaults.
-    Expects sections: general, spatial_bloom_filter, keyword_bloom_filter, suppression (optional).
+    Expects sections: general, spatial_bloom_filter, keyword_bloom_filter, suppression (optional),
+    hashing (optional; GBF position hash family).
     """
     parser = configparser.ConfigParser()
     parser.read(path, encoding="utf-8")
@@ -85,6 +86,17 @@ def load_config(path: str) -> dict:
             "seed_spa": sec.get("seed_spa", cuckoo["seed_spa"]),
         })
 
+    hashing = {
+        "family": "sha256-md5",
+        "key": "",
+    }
+    if parser.has_section("hashing"):
+        sec = parser["hashing"]
+        hashing.update({
+            "family": sec.get("family", hashing["family"]),
+            "key": sec.get("key", hashing["key"]),
+        })
+
     return {
         **general,
         "spatial_bloom_filter": spatial,
@@ -95,4 +107,5 @@ def load_config(path: str) -> dict:
             "cell_size_lon": float(parser.get("spatial_grid", "cell_size_lon", fallback="0.5")) if parser.has_section("spatial_grid") else 0.5,
         },
         "cuckoo": cuckoo,
+        "hashing": hashing,
     }
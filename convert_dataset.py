@@ -1,45 +1,134 @@
 import math
-from GBF import GarbledBloomFilter
+from GBF import GarbledBloomFilter, build_gbf_batch
 from QueryUtils import tokenize_normalized
 
+
+def spatial_items(x, y, spatial_grid: dict | None = None) -> list:
+    """空间 GBF 要插入的 token：原始坐标 "x,y" 与（可选）网格 cell token。"""
+    # 原始坐标 token（占位）
+    items = [f"{x},{y}"]
+    # 网格 cell token：CELL:R{row}_C{col}
+    if spatial_grid:
+        lat_step = float(spatial_grid.get("cell_size_lat", 0.5))
+        lon_step = float(spatial_grid.get("cell_size_lon", 0.5))
+        row = math.floor(float(x) / lat_step)
+        col = math.floor(float(y) / lon_step)
+        items.append(f"CELL:R{row}_C{col}")
+    return items
+
+
+def keyword_items(keywords) -> list:
+    """关键词 GBF 要插入的 token：标准化分词后的各关键词。"""
+    return tokenize_normalized(str(keywords))
+
+
 class SpatioTextualRecord:
-    def __init__(self, id, x, y, keywords, spatial_config: dict, keyword_config: dict, spatial_grid: dict | None = None):
+    def __init__(self, id, x, y, keywords, spatial_config: dict, keyword_config: dict, spatial_grid: dict | None = None,
+                 hashing: dict | None = None):
         self.id = id
         self.x = x
         self.y = y
         self.keywords = keywords
 
-        # 构造空间 GBF 对象，并添加 "x,y" 信息
+        # 构造空间 GBF 对象，并添加 "x,y" 信息与网格 cell token
         self.spatial_gbf = GarbledBloomFilter(
             size=spatial_config.get("size", 100),
             hash_count=spatial_config.get("hash_count", 3),
-            psi=spatial_config.get("psi", 32)
+            psi=spatial_config.get("psi", 32),
+            hashing=hashing
         )
-        # 原始坐标 token（占位）
-        spatial_item = f"{x},{y}"
-        self.spatial_gbf.add(spatial_item)
-        # 网格 cell token：CELL:R{row}_C{col}
-        if spatial_grid:
-            lat_step = float(spatial_grid.get("cell_size_lat", 0.5))
-            lon_step = float(spatial_grid.get("cell_size_lon", 0.5))
-            row = math.floor(float(x) / lat_step)
-            col = math.floor(float(y) / lon_step)
-            self.spatial_gbf.add(f"CELL:R{row}_C{col}")
+        for item in spatial_items(x, y, spatial_grid):
+            self.spatial_gbf.add(item)
 
         # 构造关键词 GBF 对象，并添加关键词字符串
         self.keyword_gbf = GarbledBloomFilter(
             size=keyword_config.get("size", 200),
             hash_count=keyword_config.get("hash_count", 4),
-            psi=keyword_config.get("psi", 32)
+            psi=keyword_config.get("psi", 32),
+            hashing=hashing
         )
         # 将关键词字符串标准化分词，逐个加入 GBF 以支持多关键词查询
-        for tok in tokenize_normalized(str(keywords)):
+        for tok in keyword_items(keywords):
             self.keyword_gbf.add(tok)
 
+
+class _CellArray:
+    def __init__(self, array):
+        self.array = array
+
+
+class EncodedRecord:
+    """GBFBatch 中的一条记录，提供与 SpatioTextualRecord 相同的 id / *_gbf.array 接口。"""
+
+    def __init__(self, id, spatial_cells: list, keyword_cells: list):
+        self.id = id
+        self.spatial_gbf = _CellArray(spatial_cells)
+        self.keyword_gbf = _CellArray(keyword_cells)
+
+
+def _split_cells(row) -> list:
+    blob = row.tobytes()
+    step = row.shape[-1]
+    return [blob[i:i + step] for i in range(0, len(blob), step)]
+
+
+class GBFBatch:
+    """
+    整批记录的 GBF 编码：spatial 为 (n, m1, byte_len)，keyword 为 (n, m2, byte_len) 的 uint8 数组。
+    可迭代产出 EncodedRecord，因此可直接传给 Setup / 流式构建 / 分段索引。
+    """
+
+    def __init__(self, ids: list, spatial, keyword):
+        self.ids = ids
+        self.spatial = spatial
+        self.keyword = keyword
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return EncodedRecord(self.ids[i], _split_cells(self.spatial[i]), _split_cells(self.keyword[i]))
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield self[i]
+
+
+def encode_batch(records, config: dict) -> GBFBatch:
+    """
+    批量 GBF 编码：把一批记录（RecordBatch 或字典列表）一次性编码为 GBFBatch。
+    编码与 SpatioTextualRecord 逐条 add 的结果在查询语义上完全兼容。
+    """
+    spatial_config = config.get("spatial_bloom_filter", {})
+    keyword_config = config.get("keyword_bloom_filter", {})
+    grid = config.get("spatial_grid", {})
+    hashing = config.get("hashing")
+    ids, spa_items, kw_items = [], [], []
+    for record in records:
+        ids.append(record["id"])
+        spa_items.append(spatial_items(record["x"], record["y"], grid))
+        kw_items.append(keyword_items(record["keywords"]))
+    spatial = build_gbf_batch(
+        spa_items,
+        size=spatial_config.get("size", 100),
+        hash_count=spatial_config.get("hash_count", 3),
+        psi=spatial_config.get("psi", 32),
+        hashing=hashing,
+    )
+    keyword = build_gbf_batch(
+        kw_items,
+        size=keyword_config.get("size", 200),
+        hash_count=keyword_config.get("hash_count", 4),
+        psi=keyword_config.get("psi", 32),
+        hashing=hashing,
+    )
+    return GBFBatch(ids, spatial, keyword)
+
+
 def convert_dataset(dict_list: list, config: dict) -> list:
     """
     将字典列表转换为 SpatioTextualRecord 对象列表。
-    
+
     参数:
       dict_list: 每个元素为字典，必须包含 'id', 'x', 'y', 'keywords'
       config: 配置字典，格式例如：
@@ -47,24 +136,31 @@ def convert_dataset(dict_list: list, config: dict) -> list:
               "spatial_bloom_filter": {"size": 100, "hash_count": 3, "psi": 32},
               "keyword_bloom_filter": {"size": 200, "hash_count": 4, "psi": 32}
           }
-          
+
     返回:
       一个 SpatioTextualRecord 对象列表，每个对象预先构造了 GBF 编码后的属性
       （spatial_gbf 与 keyword_gbf 均为 GarbledBloomFilter 对象）。
     """
+    return list(iter_convert(dict_list, config))
+
+
+def iter_convert(dict_iter, config: dict):
+    """
+    convert_dataset 的惰性版本：逐条消费记录字典并产出 SpatioTextualRecord，
+    不在内存中保留整个数据集（用于流式索引构建）。
+    """
     spatial_config = config.get("spatial_bloom_filter", {})
     keyword_config = config.get("keyword_bloom_filter", {})
-    objects = []
     grid = config.get("spatial_grid", {})
-    for record in dict_list:
-        obj = SpatioTextualRecord(
+    hashing = config.get("hashing")
+    for record in dict_iter:
+        yield SpatioTextualRecord(
             id=record["id"],
             x=record["x"],
             y=record["y"],
             keywords=record["keywords"],
             spatial_config=spatial_config,
             keyword_config=keyword_config,
-            spatial_grid=grid
+            spatial_grid=grid,
+            hashing=hashing
         )
-        objects.append(obj)
-    return objects
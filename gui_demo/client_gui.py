@@ -1,13 +1,11 @@
 from __future__ import annotations
 
-import json
 import os
 import queue
 import sys
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import urllib.request
 
 # Ensure project root on sys.path
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,33 +16,29 @@ if PROJ_ROOT not in sys.path:
 from config_loader import load_config
 from secure_search import (
     QueryPlan,
-    combine_csp_responses,
+    ShareCombiner,
+    batch_payloads,
     decrypt_matches,
+    fold_batch_reply,
     prepare_query_plan,
     prepare_query_plan_with_expansion,
-    run_fx_hmac_verification,
+    run_batch_verification,
+    Verifier,
 )
 from secure_search.indexing import load_index_artifacts
+from secure_search.transport import CSPSession
 try:
     from ai_clients import make_gemini_llm
 except ImportError:  # pragma: no cover
     make_gemini_llm = None
 
 
-def http_post(url: str, obj: dict) -> dict:
-    data = json.dumps(obj).encode('utf-8')
-    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-    with urllib.request.urlopen(req) as resp:
-        body = resp.read()
-        return json.loads(body.decode('utf-8'))
-
-
 class ClientApp:
     def __init__(self) -> None:
         self.root = tk.Tk()
         self.root.title('Secure Search Client GUI')
 
-        default_aui = os.path.join(PROJ_ROOT, 'online_demo', 'aui.pkl')
+        default_aui = os.path.join(PROJ_ROOT, 'online_demo', 'aui.idx')
         default_keys = os.path.join(PROJ_ROOT, 'online_demo', 'K.pkl')
         default_cfg = os.path.join(PROJ_ROOT, 'conFig.ini')
         default_dataset = os.path.join(PROJ_ROOT, 'us-colleges-and-universities.csv')
@@ -62,8 +56,11 @@ class ClientApp:
 
         self.aui: dict | None = None
         self.keys: tuple | None = None
+        self.verifier: Verifier | None = None
         self.config: dict | None = None
         self.query_queue: queue.Queue = queue.Queue()
+        # keep-alive connections to the CSPs, reused by every query of this window
+        self.session = CSPSession()
         self.root.after(100, self._process_queue)
         self._llm_callable = None
         self._llm_initialized = False
@@ -119,6 +116,8 @@ class ClientApp:
         try:
             self.set_status('Loading index...')
             self.aui, self.keys = load_index_artifacts(self.aui_path_var.get(), self.keys_path_var.get())
+            # per-record verification state, reused by every query on this index
+            self.verifier = Verifier(self.aui, self.keys)
             self.config = load_config(self.config_path_var.get())
         except Exception as exc:
             messagebox.showerror('Error', f'Failed to load index: {exc}')
@@ -172,20 +171,21 @@ class ClientApp:
             hits_union: set = set()
             subqueries: list[dict] = []
 
-            for sub_query, plan in zip(subquery_texts, plans):
-                if len(endpoints) != plan.num_parties:
-                    raise ValueError(f'Expected {plan.num_parties} CSP endpoints, got {len(endpoints)}')
-                responses = []
-                for party_id, base in enumerate(endpoints):
-                    body = {
-                        'party_id': party_id,
-                        'tokens': plan.payloads[party_id],
-                        'security_param': plan.security_param,
-                    }
-                    responses.append(http_post(base + '/eval', body))
-                combined_vecs, combined_proofs = combine_csp_responses(plan, responses, self.aui)
+            if len(endpoints) != plans[0].num_parties:
+                raise ValueError(f'Expected {plans[0].num_parties} CSP endpoints, got {len(endpoints)}')
+            # all sub-queries go to each CSP in one /eval_batch round trip
+            combiners = [ShareCombiner(plan, self.aui) for plan in plans]
+            self.session.eval_batch_all(
+                endpoints,
+                [batch_payloads(plans, party_id) for party_id in range(len(endpoints))],
+                plans[0].security_param,
+                on_reply=lambda _, reply: fold_batch_reply(combiners, reply),
+            ).replies()
+            combined = [combiner.arrays() for combiner in combiners]
+            verified = run_batch_verification(plans, combined, self.aui, self.keys, verifier=self.verifier)
+
+            for sub_query, plan, (combined_vecs, _), ok_verify in zip(subquery_texts, plans, combined, verified):
                 _, hits = decrypt_matches(plan, combined_vecs, self.aui, self.keys)
-                ok_verify = run_fx_hmac_verification(plan, combined_vecs, combined_proofs, self.aui, self.keys)
                 hits_union.update(hits)
                 subqueries.append({
                     'query': sub_query,
@@ -255,7 +255,10 @@ class ClientApp:
         self.query_var.set('ORLANDO UNIVERSITY; R: 28.2,-81.6,28.8,-81.1')
 
     def run(self) -> None:
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.session.close()
 
     def _get_llm_callable(self):
         if not self.use_ai_var.get():
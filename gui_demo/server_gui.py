@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import os
-import pickle
 import sys
 import threading
 import tkinter as tk
@@ -17,7 +16,8 @@ if ONLINE_DEMO_DIR not in sys.path:
 if PROJ_ROOT not in sys.path:
     sys.path.insert(0, PROJ_ROOT)
 
-from csp_server import Handler, CSPState
+from csp_server import install_index, make_server
+from secure_search.indexing import load_aui
 
 
 class ServerApp:
@@ -25,7 +25,7 @@ class ServerApp:
         self.root = tk.Tk()
         self.root.title('Secure Search CSP GUI')
 
-        default_aui = os.path.join(PROJ_ROOT, 'online_demo', 'aui.pkl')
+        default_aui = os.path.join(PROJ_ROOT, 'online_demo', 'aui.idx')
         self.aui_path_var = tk.StringVar(value=default_aui)
         self.ports_var = tk.StringVar(value='8001,8002,8003')
         self.status_var = tk.StringVar(value='Servers stopped')
@@ -77,9 +77,7 @@ class ServerApp:
             messagebox.showinfo('Info', 'Servers are already running.')
             return
         try:
-            with open(self.aui_path_var.get(), 'rb') as f:
-                aui = pickle.load(f)
-            CSPState.aui = aui
+            install_index(load_aui(self.aui_path_var.get()))
         except Exception as exc:
             messagebox.showerror('Error', f'Failed to load AUI: {exc}')
             return
@@ -99,7 +97,7 @@ class ServerApp:
         started = []
         try:
             for port in ports:
-                server = HTTPServer(('0.0.0.0', port), Handler)
+                server = make_server(port)
                 thread = threading.Thread(target=server.serve_forever, daemon=True)
                 thread.start()
                 self.servers.append(server)
@@ -10,6 +10,7 @@ from SearchProcess import search_process
 from verification import build_integrity_tags, verify_integrity, verify_fx_hmac
 from QueryUtils import tokenize_normalized
 from GBF import fingerprint
+from positions import hash_positions, index_hashing
 
 
 def combine_result_vectors(result_shares: dict):
@@ -38,13 +39,6 @@ def print_readable_results(raw_df: pd.DataFrame, matched_ids: list, limit: int =
         print(f"{idx}. [{row['IPEDSID']}] {row['NAME']} - {row['ADDRESS']}, {row['CITY']}, {row['STATE']}  ({row.get('Geo Point','')})")
 
 
-def _hash_pos(item: str, size: int, k: int):
-    import hashlib as _hh
-    h1 = int(_hh.sha256(item.encode('utf-8')).hexdigest(), 16)
-    h2 = int(_hh.md5(item.encode('utf-8')).hexdigest(), 16)
-    return [(h1 + i * h2) % size for i in range(k)]
-
-
 def main():
     cfg = load_config("conFig.ini")
     csv_file = "us-colleges-and-universities.csv"
@@ -92,12 +86,13 @@ def main():
     psi = AUI['segment_length'] * 8
     byte_len = AUI['segment_length']
     ids = AUI.get('ids', [])
+    hashing = index_hashing(AUI)
     n = len(ids)
 
     # Decrypt keywords
     tokens_kw = tokens_kw or [query_in]
     k_tex = AUI.get('k_tex', 4)
-    token_indices_kw = [_hash_pos(tok, m2, k_tex) for tok in tokens_kw]
+    token_indices_kw = [hash_positions(tok, m2, k_tex, hashing) for tok in tokens_kw]
 
     def one_time_pad_for_obj(idx1, obj_id):
         total_len = (m1 + m2) * byte_len
@@ -129,7 +124,7 @@ def main():
     if tokens_spa:
         start_idx = len(tokens_kw)
         k_spa = AUI.get('k_spa', 3)
-        token_indices_spa = [_hash_pos(cell, m1, k_spa) for cell in tokens_spa]
+        token_indices_spa = [hash_positions(cell, m1, k_spa, hashing) for cell in tokens_spa]
         for s_i, cell in enumerate(tokens_spa):
             indices = token_indices_spa[s_i]
             fp = fingerprint(cell, psi)
@@ -1,8 +1,6 @@
 import argparse
-import json
 import os
 import sys
-import urllib.request
 
 # Ensure project root on sys.path
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,32 +11,37 @@ if PROJ_ROOT not in sys.path:
 from config_loader import load_config
 from secure_search import (
     prepare_query_plan,
-    combine_csp_responses,
+    ShareCombiner,
     decrypt_matches,
     run_fx_hmac_verification,
 )
 from secure_search.indexing import load_index_artifacts
-
-
-def http_post(url: str, obj: dict) -> dict:
-    data = json.dumps(obj).encode('utf-8')
-    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-    with urllib.request.urlopen(req) as resp:
-        body = resp.read()
-        return json.loads(body.decode('utf-8'))
+from secure_search.pad_table import PadTable
+from secure_search.transport import CSPSession
+from secure_search.wire import WIRE_FORMATS
 
 
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument('--csp', nargs='+', default=['http://127.0.0.1:8001', 'http://127.0.0.1:8002', 'http://127.0.0.1:8003'])
     ap.add_argument('--query', type=str, default=None)
-    ap.add_argument('--aui', type=str, default=os.path.join(THIS_DIR, 'aui.pkl'))
+    ap.add_argument('--aui', type=str, default=os.path.join(THIS_DIR, 'aui.idx'))
     ap.add_argument('--keys', type=str, default=os.path.join(THIS_DIR, 'K.pkl'))
     ap.add_argument('--config', type=str, default=os.path.join(PROJ_ROOT, 'conFig.ini'))
+    ap.add_argument('--wire', choices=WIRE_FORMATS, default='binary',
+                    help='CSP exchange format (json is easier to inspect when debugging)')
+    ap.add_argument('--timeout', type=float, default=None, help='per-party timeout in seconds')
+    ap.add_argument('--deadline', type=float, default=None, help='overall deadline for all parties in seconds')
+    ap.add_argument('--pads', type=str, default=None,
+                    help='owner-precomputed pad table (owner_setup.py --pad-table); pads are derived from K when omitted')
+    ap.add_argument('--verify-rounds', type=int, default=None,
+                    help='randomized batch verification with N subset checks (forgery passes with prob. 2^-N); '
+                         'default checks every token')
     args = ap.parse_args()
 
     cfg = load_config(args.config)
     aui, keys = load_index_artifacts(args.aui, args.keys)
+    pads = PadTable.open(args.pads, aui, keys) if args.pads else None
 
     query_in = args.query or (sys.argv[1] if len(sys.argv) > 1 else input("Enter query (kw; optional R): "))
     plan = prepare_query_plan(query_in, aui, cfg)
@@ -46,18 +49,21 @@ def main() -> None:
     if len(args.csp) != plan.num_parties:
         raise ValueError(f"Expected {plan.num_parties} CSP endpoints, got {len(args.csp)}")
 
-    responses = []
-    for party_id, base in enumerate(args.csp):
-        body = {
-            'party_id': party_id,
-            'tokens': plan.payloads[party_id],
-            'security_param': plan.security_param,
-        }
-        responses.append(http_post(base + '/eval', body))
+    # all parties are queried concurrently; each reply is XOR-folded as soon as it arrives
+    combiner = ShareCombiner(plan, aui)
+    with CSPSession() as session:
+        fanout = session.eval_all(args.csp, plan.payloads, plan.security_param, wire_format=args.wire,
+                                  party_timeout=args.timeout, deadline=args.deadline,
+                                  on_reply=lambda _, reply: combiner.add(reply))
+    for party in fanout.parties:
+        status = 'ok' if party.ok else f'error: {party.error}'
+        print(f"[client] CSP {party.party} {party.endpoint}: {party.latency * 1000:.1f} ms {status}")
+    fanout.replies()  # raises if a party failed
 
-    combined_vecs, combined_proofs = combine_csp_responses(plan, responses, aui)
-    _, hits = decrypt_matches(plan, combined_vecs, aui, keys)
-    ok_verify = run_fx_hmac_verification(plan, combined_vecs, combined_proofs, aui, keys)
+    combined_vecs, combined_proofs = combiner.arrays()
+    _, hits = decrypt_matches(plan, combined_vecs, aui, keys, pads=pads)
+    ok_verify = run_fx_hmac_verification(plan, combined_vecs, combined_proofs, aui, keys, pads=pads,
+                                         rounds=args.verify_rounds)
     print(f"[client] Verify: {'pass' if ok_verify else 'fail'}")
     print(f"[client] Matches: {len(hits)}")
 
@@ -0,0 +1,236 @@
+"""Asyncio CSP front end: many connections on one event loop, pipelined /eval.
+
+Endpoints and index state are shared with ``csp_server`` (``handle_request`` / ``CSPState``);
+only the transport differs.  Each connection has a reader that parses requests as
+they arrive and hands them to a thread pool, and a writer that sends the responses
+back in request order, so a client may pipeline several requests per connection.
+Idle connections cost one pair of coroutines rather than a thread.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+# Ensure project root in path
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJ_ROOT = os.path.abspath(os.path.join(THIS_DIR, '..'))
+for _p in (PROJ_ROOT, THIS_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+from csp_server import MAX_BODY, CSPState, add_index_arguments, encode_reply, handle_request, load_from_args
+from secure_search.wire import INDEX_VERSION_HEADER
+
+# Requests accepted per connection before the reader waits for responses to drain.
+PIPELINE_DEPTH = 16
+# Idle connections are cheap here, so they may stay open much longer than on the threaded server.
+IDLE_TIMEOUT = 300.0
+# Once a request has started, its headers and body must arrive within this many seconds.
+REQUEST_TIMEOUT = 30.0
+MAX_HEADER_LINES = 100
+
+
+class BadRequest(Exception):
+    status = 400
+
+
+class BodyTooLarge(BadRequest):
+    status = 413
+
+
+async def _read_request(reader: asyncio.StreamReader, idle_timeout: float | None,
+                        request_timeout: float | None = REQUEST_TIMEOUT, max_body: int = MAX_BODY):
+    """Parse one HTTP/1.1 request; returns ``(method, path, headers, keep_alive, body)`` or None on EOF.
+
+    Waiting for the request line is bounded by ``idle_timeout``; the rest of the request
+    (headers and body) shares one ``request_timeout`` deadline.  Lines longer than the
+    stream limit raise ``BadRequest``; a Content-Length above ``max_body`` raises
+    ``BodyTooLarge`` before any of the body is read.
+    """
+    try:
+        line = await asyncio.wait_for(reader.readline(), idle_timeout)
+        if not line:
+            return None
+        return await asyncio.wait_for(_read_rest(reader, line, max_body), request_timeout)
+    except (ValueError, asyncio.LimitOverrunError) as e:
+        raise BadRequest(f"request line or header too long: {e}") from None
+
+
+async def _read_rest(reader: asyncio.StreamReader, line: bytes, max_body: int = MAX_BODY):
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise BadRequest(f"malformed request line: {line[:80]!r}")
+    method, path, version = parts
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        raw = await reader.readline()
+        if raw in (b'\r\n', b'\n', b''):
+            break
+        name, sep, value = raw.decode('latin-1').partition(':')
+        if not sep:
+            raise BadRequest("malformed header line")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise BadRequest("too many headers")
+    if 'transfer-encoding' in headers:
+        raise BadRequest("chunked request bodies are not supported")
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise BadRequest("invalid Content-Length") from None
+    if length < 0:
+        raise BadRequest("invalid Content-Length")
+    if length > max_body:
+        raise BodyTooLarge(f"request body of {length} bytes exceeds the {max_body} byte limit")
+    body = await reader.readexactly(length) if length > 0 else b''
+    keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+    return method, path, headers, keep_alive, body
+
+
+def _response(code: int, body: bytes, content_type: str, version: str | None, keep_alive: bool) -> bytes:
+    lines = [
+        f"HTTP/1.1 {code} {HTTPStatus(code).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if version:
+        lines.append(f"{INDEX_VERSION_HEADER}: {version}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+
+class AsyncCSPServer:
+    """Serve ``csp_server.handle_request`` over asyncio streams with per-connection pipelining."""
+
+    def __init__(self, threads: int | None = None, pipeline_depth: int = PIPELINE_DEPTH,
+                 idle_timeout: float | None = IDLE_TIMEOUT,
+                 request_timeout: float | None = REQUEST_TIMEOUT, max_body: int = MAX_BODY) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(threads or os.cpu_count() or 1)),
+                                           thread_name_prefix='csp-eval')
+        self.pipeline_depth = max(1, int(pipeline_depth))
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.max_body = max_body
+        self.server = None
+
+    async def _evaluate(self, method: str, path: str, headers: dict, body: bytes):
+        loop = asyncio.get_running_loop()
+        # XOR aggregation runs on the pool; the loop keeps accepting and parsing
+        return await loop.run_in_executor(self.executor, handle_request, path, body,
+                                          headers.get('content-type'), headers.get('accept'), method)
+
+    async def _writer(self, writer: asyncio.StreamWriter, pending: asyncio.Queue) -> None:
+        # always drains the queue so the reader never blocks on a dead connection
+        open_ = True
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            task, keep_alive, method, path = item
+            code, body, content_type, version = await task
+            if not open_:
+                continue
+            try:
+                writer.write(_response(code, body, content_type, version, keep_alive))
+                await writer.drain()
+            except ConnectionError:
+                open_ = False
+                continue
+            if not CSPState.quiet:
+                print(f"[csp_async] {method} {path} {code}")
+            if not keep_alive:
+                open_ = False
+
+    async def _enqueue(self, pending: asyncio.Queue, item, writer_task: asyncio.Task) -> bool:
+        # a dead writer never drains the queue; stop reading instead of blocking on put
+        put = asyncio.ensure_future(pending.put(item))
+        await asyncio.wait({put, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            return False
+        return True
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.pipeline_depth)
+        writer_task = asyncio.create_task(self._writer(writer, pending))
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, self.idle_timeout, self.request_timeout,
+                                                  self.max_body)
+                except BadRequest as e:
+                    fut = asyncio.get_running_loop().create_future()
+                    fut.set_result((e.status, *encode_reply({"error": str(e)}), None))
+                    await self._enqueue(pending, (fut, False, '-', '-'), writer_task)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                method, path, headers, keep_alive, body = request
+                task = asyncio.create_task(self._evaluate(method, path, headers, body))
+                if not await self._enqueue(pending, (task, keep_alive, method, path), writer_task):
+                    break
+                if not keep_alive:
+                    break
+            if await self._enqueue(pending, None, writer_task):
+                await writer_task
+        finally:
+            if not writer_task.done():
+                writer_task.cancel()
+            try:
+                await writer_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"[csp_async] connection writer failed: {e!r}", file=sys.stderr)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host: str = '0.0.0.0', port: int = 8001):
+        self.server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        return self.server
+
+    async def serve_forever(self, host: str = '0.0.0.0', port: int = 8001) -> None:
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='asyncio CSP server (pipelined /eval)')
+    add_index_arguments(ap)
+    ap.add_argument('--pipeline-depth', type=int, default=PIPELINE_DEPTH,
+                    help='in-flight requests accepted per connection')
+    ap.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                    help='close connections idle for this many seconds (0 = never)')
+    ap.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT,
+                    help='seconds allowed for the headers and body of one request (0 = no limit)')
+    args = ap.parse_args()
+
+    load_from_args(args)
+    print(f"[csp_async] AUI loaded. Port={args.port} backend={args.backend} threads={args.threads}")
+
+    server = AsyncCSPServer(args.threads, args.pipeline_depth, args.idle_timeout or None,
+                            args.request_timeout or None, int(args.max_body_mb * 1024 * 1024))
+    try:
+        asyncio.run(server.serve_forever(port=args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
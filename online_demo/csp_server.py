@@ -1,9 +1,18 @@
 import argparse
 import base64
+import hashlib
 import json
 import os
 import sys
 import pickle
+import selectors
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
 # Ensure project root in path
@@ -12,101 +21,822 @@ PROJ_ROOT = os.path.abspath(os.path.join(THIS_DIR, '..'))
 if PROJ_ROOT not in sys.path:
     sys.path.insert(0, PROJ_ROOT)
 
+from secure_search.csp_engine import EVALUATOR_BACKENDS, AggregationCache, make_evaluator
+from secure_search.index_format import index_fingerprint, is_mapped, shared_index
+from secure_search.indexing import load_aui
+from secure_search.segments import (
+    evaluate_segments,
+    evaluate_segments_batch,
+    load_segment_auis,
+    load_segment_manifest,
+)
+from secure_search import wire
+from secure_search.metrics import COUNT_BUCKETS, TEXT_CONTENT_TYPE, Registry, RequestTrace, SlowQueryLog
+
+
+# Idle keep-alive connections are closed after this many seconds.
+KEEPALIVE_TIMEOUT = 15.0
+# Socket timeout while a worker reads one request or writes its response.
+REQUEST_TIMEOUT = 5.0
+# Largest request body accepted; bigger requests get 413 before their body is read.
+MAX_BODY = 32 * 1024 * 1024
+# Default memory budget of the column-aggregation cache.
+CACHE_MB = 64
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """One served index version; never mutated once published.
+
+    Either ``evaluator`` (single index) or ``segments`` (``[(segment_id, evaluator), ...]``
+    plus the manifest ``generation``) is set.
+    """
+
+    version: str
+    aui: dict | None = None
+    evaluator: object = None
+    segments: tuple | None = None
+    generation: int | None = None
+    source: str | None = None
+    loaded_at: float = 0.0
+
 
 class CSPState:
-    aui = None
+    # the served index; requests read it once, loads replace it with a new snapshot
+    snapshot: IndexSnapshot | None = None
+    backend = 'numpy'
+    quiet = False
+    # column-subset aggregations shared by all evaluators; emptied on every load but
+    # never replaced, so its hit/miss counters run for the life of the process
+    cache = AggregationCache(CACHE_MB * 1024 * 1024)
+    slow_log = SlowQueryLog(None)
+    # loads queued or running on the loader thread, and the last one's failure
+    loading = 0
+    last_error = None
+    # set in prefork workers, where only the supervisor may replace the index
+    prefork = False
+
+
+_load_lock = threading.Lock()
+# one loader thread: loads never run on request workers and are published in order
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='csp-loader')
+
+
+def build_snapshot(aui: dict, source: str | None = None) -> IndexSnapshot:
+    """Build and pre-warm the evaluator for ``aui`` without publishing it."""
+    evaluator = make_evaluator(aui, CSPState.backend, CSPState.cache)
+    evaluator.warm()
+    return IndexSnapshot(index_fingerprint(aui), aui=aui, evaluator=evaluator, source=source,
+                         loaded_at=time.time())
+
+
+def build_segment_snapshot(root: str) -> IndexSnapshot:
+    """Build and pre-warm evaluators for every live segment of ``root``."""
+    manifest = load_segment_manifest(root)
+    version = hashlib.blake2b(str(manifest['generation']).encode('utf-8'), digest_size=8)
+    segs = []
+    for seg_id, aui in load_segment_auis(root, manifest):
+        evaluator = make_evaluator(aui, CSPState.backend, CSPState.cache)
+        evaluator.warm()
+        segs.append((seg_id, evaluator))
+        version.update(f"{seg_id}:{index_fingerprint(aui)}".encode('utf-8'))
+    return IndexSnapshot(version.hexdigest(), segments=tuple(segs), generation=manifest['generation'],
+                         source=str(root), loaded_at=time.time())
+
+
+def publish(snapshot: IndexSnapshot) -> IndexSnapshot:
+    # a single reference assignment: in-flight requests finish on the snapshot they read
+    CSPState.snapshot = snapshot
+    CSPState.cache.clear()
+    return snapshot
+
+
+def install_index(aui: dict, source: str | None = None) -> IndexSnapshot:
+    """Make ``aui`` the served index (built and warmed on the calling thread)."""
+    return publish(build_snapshot(aui, source))
+
+
+def install_segments(root: str) -> IndexSnapshot:
+    """Serve every live segment of a segmented index directory."""
+    return publish(build_segment_snapshot(root))
+
+
+def submit_load(build, *args) -> Future:
+    """Run ``build(*args)`` on the loader thread and publish the resulting snapshot."""
+    with _load_lock:
+        CSPState.loading += 1
+
+    def run():
+        try:
+            snapshot = publish(build(*args))
+            CSPState.last_error = None
+            return snapshot
+        except Exception as e:
+            CSPState.last_error = str(e)
+            raise
+        finally:
+            with _load_lock:
+                CSPState.loading -= 1
+
+    return _loader.submit(run)
+
+
+def share_served_index() -> None:
+    """Re-publish a heap-resident index from a shared file mapping (for prefork workers)."""
+    snapshot = CSPState.snapshot
+    if snapshot is None or snapshot.aui is None or is_mapped(snapshot.aui):
+        return
+    publish(build_snapshot(shared_index(snapshot.aui), snapshot.source))
+
+
+def _encode_cells(blob: bytes, byte_len: int) -> list:
+    return [base64.b64encode(blob[i:i + byte_len]).decode('utf-8') for i in range(0, len(blob), byte_len)]
+
+
+class PlainText(str):
+    """A ``dispatch`` reply sent as ``text/plain`` (used for /metrics)."""
+
+
+def _index_stats() -> dict:
+    snapshot = CSPState.snapshot
+    if snapshot is None:
+        evaluators = []
+    elif snapshot.segments is not None:
+        evaluators = [ev for _, ev in snapshot.segments]
+    else:
+        evaluators = [snapshot.evaluator]
+    return {
+        "rows": sum(ev.n for ev in evaluators),
+        "bytes": sum(ev.nbytes for ev in evaluators),
+        "segments": len(evaluators),
+    }
+
+
+METRICS = Registry()
+REQUESTS = METRICS.counter('csp_requests_total', 'Requests served, by endpoint and status.', ('path', 'status'))
+LATENCY = METRICS.histogram('csp_request_seconds', 'End-to-end request latency.', ('path',))
+PHASE_LATENCY = METRICS.histogram('csp_request_phase_seconds', 'Latency of the parse, aggregate and encode phases.',
+                                  ('path', 'phase'))
+BYTES_IN = METRICS.counter('csp_request_bytes_total', 'Request body bytes received.', ('path',))
+BYTES_OUT = METRICS.counter('csp_response_bytes_total', 'Response body bytes sent.', ('path',))
+TOKENS = METRICS.histogram('csp_request_tokens', 'Tokens per evaluation request.', ('path',), COUNT_BUCKETS)
+COLUMNS = METRICS.histogram('csp_request_columns', 'Bucket columns per evaluation request.', ('path',), COUNT_BUCKETS)
+SLOW = METRICS.counter('csp_slow_requests_total', 'Requests over the slow-query threshold.', ('path',))
+METRICS.callback_counter('csp_cache_hits_total', 'Aggregation cache hits.', lambda: CSPState.cache.stats()['hits'])
+METRICS.callback_counter('csp_cache_misses_total', 'Aggregation cache misses.', lambda: CSPState.cache.stats()['misses'])
+METRICS.gauge('csp_cache_hit_ratio', 'Aggregation cache hit ratio since start.', lambda: CSPState.cache.stats()['hit_rate'])
+METRICS.gauge('csp_cache_bytes', 'Bytes held by the aggregation cache.', lambda: CSPState.cache.stats()['bytes'])
+METRICS.gauge('csp_cache_entries', 'Entries held by the aggregation cache.', lambda: CSPState.cache.stats()['entries'])
+METRICS.gauge('csp_index_rows', 'Rows (objects) in the served index.', lambda: _index_stats()['rows'])
+METRICS.gauge('csp_index_bytes', 'Bytes of encrypted matrices in the served index.', lambda: _index_stats()['bytes'])
+METRICS.gauge('csp_index_segments', 'Segments in the served index.', lambda: _index_stats()['segments'])
+METRICS.gauge('csp_index_loads_pending', 'Index loads queued or running.', lambda: CSPState.loading)
+
+
+def _count_payload(payload: dict, trace: RequestTrace) -> None:
+    queries = payload.get('queries')
+    token_lists = [q.get('tokens', []) if isinstance(q, dict) else q for q in queries] if queries is not None \
+        else [payload.get('tokens', [])]
+    trace.queries = len(token_lists)
+    for tokens in token_lists:
+        trace.tokens += len(tokens)
+        for tok in tokens:
+            trace.columns += sum(len(b.get('columns', [])) for b in tok.get('buckets', []))
+
+
+def _load_inline(blob: str) -> IndexSnapshot:
+    return build_snapshot(pickle.loads(base64.b64decode(blob)), 'inline')
+
+
+def _load_path(path: str) -> IndexSnapshot:
+    return build_snapshot(load_aui(path), path)
+
+
+def _load_index(payload: dict, binary: bool = False, trace: RequestTrace | None = None,
+                snapshot: IndexSnapshot | None = None):
+    """Load a new index on the loader thread; queries keep using the old one until it is warm.
+
+    Accepts a base64 pickle or a file path (binary index or pickle).  With
+    ``"background": true`` the reply is sent as soon as the load is queued.
+    """
+    if CSPState.prefork:
+        return 409, {"error": "prefork mode: reload the index by sending SIGHUP to the supervisor"}
+    if 'aui_b64' in payload:
+        future = submit_load(_load_inline, payload['aui_b64'])
+    elif 'aui_path' in payload:
+        future = submit_load(_load_path, payload['aui_path'])
+    elif 'segments_path' in payload:
+        future = submit_load(build_segment_snapshot, payload['segments_path'])
+    else:
+        return 400, {"error": "aui_b64, aui_path or segments_path required"}
+    if payload.get('background'):
+        return 202, {"status": "loading", "index_version": snapshot.version if snapshot else None}
+    try:
+        loaded = future.result()
+    except Exception as e:
+        return 500, {"error": f"load_index failed: {e}"}
+    reply = {"status": "ok", "index_version": loaded.version}
+    if loaded.generation is not None:
+        reply["generation"] = loaded.generation
+    return 200, reply
+
+
+def _single_reply(evaluator, vec_blobs, proof_blobs, lam: int, binary: bool):
+    byte_len = evaluator.byte_len
+    if binary:
+        return wire.encode_eval_response(vec_blobs, proof_blobs, evaluator.n, byte_len, lam)
+    result_shares = [_encode_cells(v, byte_len) for v in vec_blobs]
+    proof_shares = [base64.b64encode(p).decode('utf-8') for p in proof_blobs]
+    return {"result_shares": result_shares, "proof_shares": proof_shares}
+
+
+def _segmented_reply(segments, results, generation, lam: int, binary: bool):
+    evaluators = dict(segments)
+    if binary:
+        return wire.encode_segmented_response(
+            [(seg_id, vecs, proofs, evaluators[seg_id].n, evaluators[seg_id].byte_len)
+             for seg_id, vecs, proofs in results],
+            generation, lam)
+    out = []
+    for seg_id, vec_blobs, proof_blobs in results:
+        byte_len = evaluators[seg_id].byte_len
+        out.append({
+            "segment": seg_id,
+            "result_shares": [_encode_cells(v, byte_len) for v in vec_blobs],
+            "proof_shares": [base64.b64encode(p).decode('utf-8') for p in proof_blobs],
+        })
+    return {"segments": out, "generation": generation}
+
+
+def _served_security_param(snapshot: IndexSnapshot) -> int:
+    """Proof length of the served index (every segment must agree)."""
+    if snapshot.segments is None:
+        return int(snapshot.evaluator.security_param)
+    params = {int(evaluator.security_param) for _, evaluator in snapshot.segments}
+    if len(params) > 1:
+        raise ValueError(f"segments disagree on security_param: {sorted(params)}")
+    return params.pop() if params else 16
+
+
+def _security_param_error(payload: dict, lam: int) -> str | None:
+    """Why a request's ``security_param`` cannot be served, or None; absent means the index's own.
+
+    Proofs are the index's lam-byte sigma sums, so any other length is refused up front
+    rather than truncated (JSON) or failing the binary encoder.
+    """
+    requested = payload.get('security_param', lam)
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return f"invalid security_param: {requested!r}"
+    if requested != lam:
+        return f"security_param {requested} does not match the served index ({lam})"
+    return None
+
+
+def _eval(payload: dict, binary: bool = False, trace: RequestTrace | None = None,
+          snapshot: IndexSnapshot | None = None):
+    """Evaluate one party's tokens; ``binary`` selects the wire-format reply."""
+    trace = trace or RequestTrace('/eval')
+    try:
+        if snapshot is None:
+            return 400, {"error": "AUI not loaded"}
+        segments, evaluator, generation = snapshot.segments, snapshot.evaluator, snapshot.generation
+        lam = _served_security_param(snapshot)
+        error = _security_param_error(payload, lam)
+        if error:
+            return 400, {"error": error}
+        if segments is not None:
+            with trace.phase('aggregate'):
+                results = evaluate_segments(segments, payload.get('tokens', []), lam)
+            with trace.phase('encode'):
+                return 200, _segmented_reply(segments, results, generation, lam, binary)
+        tokens = payload.get('tokens', [])
+        with trace.phase('aggregate'):
+            vec_blobs, proof_blobs = evaluator.evaluate(tokens, lam)
+        with trace.phase('encode'):
+            return 200, _single_reply(evaluator, vec_blobs, proof_blobs, lam, binary)
+    except Exception as e:
+        return 500, {"error": f"eval failed: {e}"}
+
+
+def _eval_batch(payload: dict, binary: bool = False, trace: RequestTrace | None = None,
+                snapshot: IndexSnapshot | None = None):
+    """Evaluate the tokens of many queries in one sweep; one ``/eval`` reply per query."""
+    trace = trace or RequestTrace('/eval_batch')
+    try:
+        if snapshot is None:
+            return 400, {"error": "AUI not loaded"}
+        segments, evaluator, generation = snapshot.segments, snapshot.evaluator, snapshot.generation
+        queries = [q.get('tokens', []) if isinstance(q, dict) else q for q in payload.get('queries', [])]
+        lam = _served_security_param(snapshot)
+        error = _security_param_error(payload, lam)
+        if error:
+            return 400, {"error": error}
+        if segments is not None:
+            with trace.phase('aggregate'):
+                results = evaluate_segments_batch(segments, queries, lam)
+            with trace.phase('encode'):
+                replies = [_segmented_reply(segments, res, generation, lam, binary) for res in results]
+        else:
+            with trace.phase('aggregate'):
+                results = evaluator.evaluate_batch(queries, lam)
+            with trace.phase('encode'):
+                replies = [_single_reply(evaluator, vecs, proofs, lam, binary) for vecs, proofs in results]
+        with trace.phase('encode'):
+            if binary:
+                return 200, wire.encode_batch_response(replies)
+            return 200, {"results": replies}
+    except Exception as e:
+        return 500, {"error": f"eval_batch failed: {e}"}
+
+
+def _cache_stats():
+    return 200, CSPState.cache.stats()
+
 
+def _metrics():
+    return 200, PlainText(METRICS.render())
 
-def bytes_xor(a: bytes, b: bytes) -> bytes:
-    return bytes(x ^ y for x, y in zip(a, b))
+
+def _index_status():
+    snapshot = CSPState.snapshot
+    return 200, {
+        "index_version": snapshot.version if snapshot else None,
+        "generation": snapshot.generation if snapshot else None,
+        "source": snapshot.source if snapshot else None,
+        "loaded_at": snapshot.loaded_at if snapshot else None,
+        "loading": CSPState.loading,
+        "last_error": CSPState.last_error,
+    }
+
+
+ROUTES = {
+    '/load_index': _load_index,
+    '/eval': _eval,
+    '/eval_batch': _eval_batch,
+}
+
+# read-only endpoints served on GET
+GET_ROUTES = {
+    '/cache_stats': _cache_stats,
+    '/metrics': _metrics,
+    '/index_status': _index_status,
+}
+
+
+def dispatch(path: str, body: bytes, content_type: str | None = None, accept: str | None = None,
+             method: str = 'POST', trace: RequestTrace | None = None, snapshot: IndexSnapshot | None = None):
+    """Route one request to its endpoint; returns ``(status, reply)``.
+
+    The body is JSON or, with the binary ``Content-Type``, a wire-format request; the
+    reply is a JSON object, or ``bytes`` in the wire format when ``accept`` asks for
+    it (see ``encode_reply``).  Transport independent, so every server front end
+    shares the same endpoints.
+    """
+    if method == 'GET':
+        route = GET_ROUTES.get(path)
+        return route() if route is not None else (404, {"error": "not found"})
+    if method != 'POST':
+        return 405, {"error": "method not allowed"}
+    route = ROUTES.get(path)
+    if route is None:
+        return 404, {"error": "not found"}
+    trace = trace or RequestTrace(path, method)
+    try:
+        with trace.phase('parse'):
+            payload = wire.decode_request(body, content_type)
+            _count_payload(payload, trace)
+    except Exception as e:
+        kind = "binary request" if wire.is_binary(content_type) else "json"
+        return 400, {"error": f"invalid {kind}: {e}"}
+    return route(payload, wire.wants_binary(accept), trace, snapshot or CSPState.snapshot)
+
+
+def encode_reply(reply) -> tuple:
+    """``(body bytes, Content-Type)`` for a ``dispatch`` reply."""
+    if isinstance(reply, (bytes, bytearray)):
+        return bytes(reply), wire.BINARY_CONTENT_TYPE
+    if isinstance(reply, PlainText):
+        return reply.encode('utf-8'), TEXT_CONTENT_TYPE
+    return json.dumps(reply).encode('utf-8'), wire.JSON_CONTENT_TYPE
+
+
+def handle_request(path: str, body: bytes, content_type: str | None = None, accept: str | None = None,
+                   method: str = 'POST') -> tuple:
+    """``dispatch`` plus reply encoding, metrics and the slow-query log.
+
+    Returns ``(status, body bytes, Content-Type, index version)``, the version being the
+    snapshot that was live when the request arrived; this is what the front ends call.
+    """
+    snapshot = CSPState.snapshot
+    known = path in ROUTES or path in GET_ROUTES
+    label = path if known else 'other'
+    trace = RequestTrace(label, method)
+    trace.bytes_in = len(body)
+    status, reply = dispatch(path, body, content_type, accept, method, trace, snapshot)
+    with trace.phase('encode'):
+        out, out_type = encode_reply(reply)
+    trace.status = status
+    trace.bytes_out = len(out)
+
+    REQUESTS.inc(path=label, status=status)
+    LATENCY.observe(trace.elapsed(), path=label)
+    for phase, seconds in trace.phases.items():
+        PHASE_LATENCY.observe(seconds, path=label, phase=phase)
+    BYTES_IN.inc(trace.bytes_in, path=label)
+    BYTES_OUT.inc(trace.bytes_out, path=label)
+    if trace.queries:
+        TOKENS.observe(trace.tokens, path=label)
+        COLUMNS.observe(trace.columns, path=label)
+    if CSPState.slow_log.maybe_log(trace):
+        SLOW.inc(path=label)
+    return status, out, out_type, snapshot.version if snapshot else None
 
 
 class Handler(BaseHTTPRequestHandler):
-    def _send(self, code=200, obj=None):
+    # HTTP/1.1 keeps connections open between requests; every response carries Content-Length
+    protocol_version = 'HTTP/1.1'
+    timeout = REQUEST_TIMEOUT
+    # headers and body go out in separate writes; without TCP_NODELAY the body waits
+    # for the client's delayed ACK on every reused connection
+    disable_nagle_algorithm = True
+
+    def _send(self, code: int, body: bytes, content_type: str, version: str | None = None):
         self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
+        if version:
+            self.send_header(wire.INDEX_VERSION_HEADER, version)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        if obj is not None:
-            self.wfile.write(json.dumps(obj).encode('utf-8'))
+        self.wfile.write(body)
+
+    def _refuse(self, code: int, message: str):
+        # the body is left unread, so the connection cannot carry another request
+        self.close_connection = True
+        return self._send(code, *encode_reply({"error": message}))
 
     def do_POST(self):
-        length = int(self.headers.get('Content-Length', '0'))
+        try:
+            length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self._refuse(400, "invalid Content-Length")
+        max_body = getattr(self.server, 'max_body', MAX_BODY)
+        if length > max_body:
+            return self._refuse(413, f"request body of {length} bytes exceeds the {max_body} byte limit")
         data = self.rfile.read(length)
+        return self._send(*handle_request(self.path, data, self.headers.get('Content-Type'),
+                                          self.headers.get('Accept')))
+
+    def do_GET(self):
+        return self._send(*handle_request(self.path, b'', method='GET'))
+
+    def handle(self):
+        # one request per dispatch; between requests PooledHTTPServer parks the connection
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self):
+        # a kept-alive connection keeps its buffered reader for the next request
+        if self.close_connection:
+            super().finish()
+
+    def log_message(self, format, *args):
+        if not CSPState.quiet:
+            super().log_message(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that queues requests, not connections, on a fixed-size worker pool.
+
+    A worker serves one request and hands the connection back.  Idle keep-alive
+    connections wait in a selector on a single thread and go back to the pool only
+    when their next request arrives (or are closed after ``idle_timeout``), so a
+    client that leaves its socket open does not hold a worker.  A slow ``/eval`` only
+    occupies its own worker; the numpy XOR kernels release the GIL, so concurrent
+    queries run in parallel across cores.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers: int | None = None,
+                 idle_timeout: float = KEEPALIVE_TIMEOUT, max_body: int = MAX_BODY):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.idle_timeout = idle_timeout
+        self.max_body = max_body
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='csp-worker')
+        self._idle_lock = threading.Lock()
+        # created on first use in each process: prefork workers must not share one selector
+        self._idle_pid = None
+        self._selector = None
+        self._wakeup = None
+        self._closing = False
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._serve_request, None, request, client_address)
+
+    def _serve_request(self, handler, request, client_address):
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.handle()
+                handler.finish()
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        if handler.close_connection or self._closing:
+            self.shutdown_request(request)
+        else:
+            self._park(handler, request, client_address)
+
+    def _park(self, handler, request, client_address):
+        # a pipelined request may already sit in the handler's read buffer
+        try:
+            request.setblocking(False)
+            pending = handler.rfile.peek(1)
+            request.settimeout(handler.timeout)
+        except OSError:
+            self._drop(handler, request)
+            return
+        if pending:
+            self.pool.submit(self._serve_request, handler, request, client_address)
+            return
+        with self._idle_lock:
+            self._start_idle_loop()
+            self._selector.register(request, selectors.EVENT_READ,
+                                    (handler, client_address, time.monotonic() + self.idle_timeout))
+        self._wake()
+
+    def _wake(self):
         try:
-            payload = json.loads(data.decode('utf-8'))
+            self._wakeup[1].send(b'\0')
+        except OSError:
+            pass
+
+    def _drop(self, handler, request):
+        handler.close_connection = True
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _start_idle_loop(self):
+        if self._idle_pid == os.getpid():
+            return
+        self._idle_pid = os.getpid()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = socket.socketpair()
+        self._wakeup[0].setblocking(False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, None)
+        threading.Thread(target=self._idle_loop, args=(self._selector,), name='csp-idle', daemon=True).start()
+
+    def _idle_loop(self, selector):
+        while not self._closing:
+            with self._idle_lock:
+                deadlines = [key.data[2] for key in selector.get_map().values() if key.data]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            events = selector.select(timeout)
+            ready, expired = [], []
+            with self._idle_lock:
+                for key, _ in events:
+                    if key.data is None:
+                        try:
+                            key.fileobj.recv(4096)
+                        except BlockingIOError:
+                            pass
+                    elif key.fileobj in selector.get_map():
+                        selector.unregister(key.fileobj)
+                        ready.append((key.fileobj, key.data))
+                now = time.monotonic()
+                for key in list(selector.get_map().values()):
+                    if key.data and key.data[2] <= now:
+                        selector.unregister(key.fileobj)
+                        expired.append((key.fileobj, key.data))
+            for request, (handler, client_address, _) in ready:
+                try:
+                    self.pool.submit(self._serve_request, handler, request, client_address)
+                except RuntimeError:  # pool shut down
+                    self._drop(handler, request)
+            for request, (handler, _, _) in expired:
+                self._drop(handler, request)
+        with self._idle_lock:
+            selector.close()
+            for sock in self._wakeup:
+                sock.close()
+
+    def idle_connections(self) -> int:
+        with self._idle_lock:
+            if self._selector is None or self._idle_pid != os.getpid():
+                return 0
+            return len(self._selector.get_map()) - 1
+
+    def server_close(self):
+        super().server_close()
+        self._closing = True
+        with self._idle_lock:
+            parked = []
+            if self._selector is not None and self._idle_pid == os.getpid():
+                parked = [(key.fileobj, key.data) for key in self._selector.get_map().values() if key.data]
+                for request, _ in parked:
+                    self._selector.unregister(request)
+        for request, (handler, _, _) in parked:
+            self._drop(handler, request)
+        if self._wakeup is not None and self._idle_pid == os.getpid():
+            self._wake()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(port: int, threads: int | None = None, host: str = '0.0.0.0',
+                max_body: int = MAX_BODY) -> HTTPServer:
+    """Create the CSP HTTP server; ``threads=1`` serves one connection at a time."""
+    return PooledHTTPServer((host, port), Handler, workers=threads, max_body=max_body)
+
+
+def _exit_worker(signum, frame):
+    raise SystemExit(0)
+
+
+class PreforkSupervisor:
+    """Serve one listening socket from ``workers`` forked processes (POSIX only).
+
+    The index is loaded once here and kept in a shared file mapping, so every worker
+    reads the same physical pages while request handling -- GIL-bound JSON and
+    bookkeeping included -- scales with the process count.  Workers that die are
+    replaced; SIGHUP calls ``reload`` and rolls the workers over to the new index
+    (old workers finish their connections first); SIGTERM / SIGINT stop everything.
+    """
+
+    poll_interval = 0.2
+
+    def __init__(self, server: HTTPServer, workers: int, reload=None) -> None:
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("prefork workers require os.fork (POSIX)")
+        self.server = server
+        self.workers = max(1, int(workers))
+        self.reload = reload
+        self.children = set()
+        self.retiring = set()
+        self._stopping = False
+        self._reload_requested = False
+        # accept() must not block once a sibling process has taken the connection
+        server.socket.setblocking(False)
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return pid
+        code = 0
+        try:
+            CSPState.prefork = True
+            signal.signal(signal.SIGTERM, _exit_worker)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            self.server.serve_forever()
+        except SystemExit:
+            pass
+        except BaseException:
+            code = 1
+            traceback.print_exc()
+        finally:
+            # let the connections already accepted by this worker finish
+            self.server.pool.shutdown(wait=True)
+            os._exit(code)
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            self.children.discard(pid)
+            if not self._stopping:
+                print(f"[csp_server] worker {pid} exited (status {status}); restarting", file=sys.stderr)
+                self._spawn()
+
+    def _roll(self) -> None:
+        try:
+            self.reload()
         except Exception as e:
-            return self._send(400, {"error": f"invalid json: {e}"})
+            print(f"[csp_server] reload failed, keeping the current index: {e}", file=sys.stderr)
+            return
+        old, self.children = self.children, set()
+        for _ in range(self.workers):
+            self._spawn()
+        for pid in old:
+            os.kill(pid, signal.SIGTERM)
+        self.retiring |= old
+        print(f"[csp_server] reloaded index version={CSPState.snapshot.version}")
+
+    def serve_forever(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        if self.reload is not None:
+            signal.signal(signal.SIGHUP, self._on_reload)
+        for _ in range(self.workers):
+            self._spawn()
+        try:
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self._roll()
+                self._reap()
+                time.sleep(self.poll_interval)
+        finally:
+            self.stop()
 
-        if self.path == '/load_index':
-            # Accept base64 pickle or file path
+    def stop(self) -> None:
+        self._stopping = True
+        for pid in self.children | self.retiring:
             try:
-                if 'aui_b64' in payload:
-                    aui = pickle.loads(base64.b64decode(payload['aui_b64']))
-                elif 'aui_path' in payload:
-                    with open(payload['aui_path'], 'rb') as f:
-                        aui = pickle.load(f)
-                else:
-                    return self._send(400, {"error": "aui_b64 or aui_path required"})
-                CSPState.aui = aui
-                return self._send(200, {"status": "ok"})
-            except Exception as e:
-                return self._send(500, {"error": f"load_index failed: {e}"})
-
-        if self.path == '/eval':
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.children | self.retiring:
             try:
-                aui = CSPState.aui
-                if aui is None:
-                    return self._send(400, {"error": "AUI not loaded"})
-                party_id = int(payload.get('party_id', 0))
-                tokens = payload.get('tokens', [])
-                lam = int(payload.get('security_param', aui['security_param']))
-                n = len(aui['ids'])
-                byte_len = aui['segment_length']
-
-                result_shares = []
-                proof_shares = []
-                for tok in tokens:
-                    typ = tok.get('type', 'kw')
-                    buckets = tok.get('buckets', [])
-                    vec_total = [b"\x00" * byte_len for _ in range(n)]
-                    proof_total = b"\x00" * lam
-                    if typ == 'kw':
-                        mat = aui['I_tex']
-                    else:
-                        mat = aui['I_spa']
-                    for binfo in buckets:
-                        cols = binfo['columns']
-                        bits = binfo['bits']  # list[int 0/1] for this party
-                        for local_idx, col_idx in enumerate(cols):
-                            if int(bits[local_idx]) == 1:
-                                col_cells = [row[col_idx] for row in mat['EbW' if typ == 'kw' else 'Ebp']]
-                                for i in range(n):
-                                    vec_total[i] = bytes_xor(vec_total[i], col_cells[i])
-                                proof_total = bytes_xor(proof_total, mat['sigma'][col_idx])
-                    # encode
-                    result_shares.append([base64.b64encode(v).decode('utf-8') for v in vec_total])
-                    proof_shares.append(base64.b64encode(proof_total).decode('utf-8'))
-
-                return self._send(200, {"result_shares": result_shares, "proof_shares": proof_shares})
-            except Exception as e:
-                return self._send(500, {"error": f"eval failed: {e}"})
-
-        return self._send(404, {"error": "not found"})
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children.clear()
+        self.retiring.clear()
+
+
+def add_index_arguments(ap: argparse.ArgumentParser) -> None:
+    """Index / backend options shared by every CSP front end."""
+    ap.add_argument('--port', type=int, default=8001)
+    ap.add_argument('--aui', type=str, default=os.path.join(THIS_DIR, 'aui.idx'), help='path to AUI (binary index or pickle)')
+    ap.add_argument('--backend', choices=sorted(EVALUATOR_BACKENDS), default=CSPState.backend,
+                    help='share evaluation engine (legacy = reference Python loop)')
+    ap.add_argument('--segments', type=str, default=None,
+                    help='serve a segmented index directory (segments.json) instead of --aui')
+    ap.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                    help='worker threads evaluating requests concurrently (default: CPU count)')
+    ap.add_argument('--quiet', action='store_true', help='do not log every request')
+    ap.add_argument('--cache-mb', type=float, default=CACHE_MB,
+                    help='memory budget of the column-aggregation LRU cache in MiB (0 disables)')
+    ap.add_argument('--slow-ms', type=float, default=None,
+                    help='log requests slower than this many milliseconds as JSON lines')
+    ap.add_argument('--slow-log', type=str, default=None,
+                    help='file for the slow-query log (default: stderr)')
+    ap.add_argument('--max-body-mb', type=float, default=MAX_BODY / (1024 * 1024),
+                    help='reject request bodies larger than this many MiB with 413')
+
+
+def load_from_args(args) -> None:
+    CSPState.backend = args.backend
+    CSPState.quiet = args.quiet
+    # resized in place: the metrics read its hit/miss counters, which must not restart on reload
+    CSPState.cache.resize(int(args.cache_mb * 1024 * 1024))
+    CSPState.slow_log = SlowQueryLog(args.slow_ms, args.slow_log)
+    if args.segments:
+        install_segments(args.segments)
+    else:
+        install_index(load_aui(args.aui), args.aui)
 
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--port', type=int, default=8001)
-    ap.add_argument('--aui', type=str, default=os.path.join(THIS_DIR, 'aui.pkl'), help='path to pickled AUI')
+    add_index_arguments(ap)
+    ap.add_argument('--workers', type=int, default=1,
+                    help='pre-forked worker processes sharing one mapped copy of the index (POSIX)')
     args = ap.parse_args()
+    if args.workers > 1 and args.backend == 'legacy':
+        ap.error('--workers needs the numpy backend (the legacy backend keeps a private row-major copy)')
+
+    def reload():
+        load_from_args(args)
+        share_served_index()
 
-    with open(args.aui, 'rb') as f:
-        CSPState.aui = pickle.load(f)
-    print(f"[csp_server] AUI loaded. Port={args.port}")
+    if args.workers > 1:
+        reload()
+    else:
+        load_from_args(args)
+    print(f"[csp_server] AUI loaded. Port={args.port} backend={args.backend} threads={args.threads} "
+          f"workers={args.workers} version={CSPState.snapshot.version}")
 
-    httpd = HTTPServer(('0.0.0.0', args.port), Handler)
+    httpd = make_server(args.port, args.threads, max_body=int(args.max_body_mb * 1024 * 1024))
     try:
-        httpd.serve_forever()
+        if args.workers > 1:
+            PreforkSupervisor(httpd, args.workers, reload).serve_forever()
+        else:
+            httpd.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 
@@ -7,15 +8,34 @@ PROJ_ROOT = os.path.abspath(os.path.join(THIS_DIR, '..'))
 if PROJ_ROOT not in sys.path:
     sys.path.insert(0, PROJ_ROOT)
 
-from secure_search import build_index_from_csv, save_index_artifacts
+from secure_search import build_index_from_csv, build_streaming_index_from_csv, save_index_artifacts
+from secure_search.indexing import load_index_artifacts
+from secure_search.pad_table import build_pad_table
 
 
 def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                    help='processes used to build the index (1 = serial)')
+    ap.add_argument('--stream', action='store_true',
+                    help='build with bounded memory, writing rows straight to aui.idx')
+    ap.add_argument('--pad-table', nargs='?', const=os.path.join(THIS_DIR, 'pads.tbl'), default=None,
+                    help='also write the precomputed pad table for trusted clients (default path: pads.tbl)')
+    args = ap.parse_args()
+
     config_path = os.path.join(PROJ_ROOT, "conFig.ini")
     csv_file = os.path.join(PROJ_ROOT, "us-colleges-and-universities.csv")
-    aui, keys = build_index_from_csv(csv_file, config_path)
-    aui_path, key_path = save_index_artifacts(aui, keys, THIS_DIR)
+    if args.stream:
+        aui_path, key_path = build_streaming_index_from_csv(csv_file, config_path, THIS_DIR, workers=args.workers)
+    else:
+        aui, keys = build_index_from_csv(csv_file, config_path, workers=args.workers)
+        aui_path, key_path = save_index_artifacts(aui, keys, THIS_DIR)
     print(f"[owner_setup] Wrote {aui_path} and {key_path}")
+    if args.pad_table:
+        if args.stream:
+            aui, keys = load_index_artifacts(aui_path, key_path)
+        pad_path = build_pad_table(args.pad_table, aui, keys)
+        print(f"[owner_setup] Wrote {pad_path}")
 
 
 if __name__ == "__main__":
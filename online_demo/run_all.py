@@ -11,7 +11,7 @@ def main():
     try:
         this_dir = os.path.dirname(os.path.abspath(__file__))
         csp_path = os.path.join(this_dir, 'csp_server.py')
-        aui_path = os.path.join(this_dir, 'aui.pkl')
+        aui_path = os.path.join(this_dir, 'aui.idx')
         for p in ports:
             procs.append(subprocess.Popen([sys.executable, csp_path, "--port", str(p), "--aui", aui_path]))
         time.sleep(1.5)
@@ -0,0 +1,88 @@
+# positions.py
+"""
+GBF 位置哈希：token → k 个候选列位置。
+
+构建（GBF）、查询规划、解密与验证都要对同一批 token 计算位置，这里统一实现，
+并用有界 LRU 缓存按 (token, size, k, 哈希族) 记忆结果。
+
+哈希族：
+  - "sha256-md5"（默认，旧索引使用）：h1 = SHA-256，h2 = MD5，位置 (h1 + i*h2) % size
+  - "blake2b"：一次带密钥的 BLAKE2b-128 摘要，拆成两个 64 位字 h1 / h2，
+    步长取 1 + h2 % (size - 1)，保证步长不是 size 的倍数（size 为 1 时位置全为 0）
+
+所用哈希族记录在 AUI 的 "hashing" 字段（二进制索引写入头部），
+缺省该字段的旧索引按 "sha256-md5" 处理。
+"""
+import hashlib
+from functools import lru_cache
+
+LEGACY_FAMILY = "sha256-md5"
+BLAKE2B_FAMILY = "blake2b"
+HASH_FAMILIES = (LEGACY_FAMILY, BLAKE2B_FAMILY)
+
+DEFAULT_HASHING = {"family": LEGACY_FAMILY, "key": ""}
+
+# 记忆的 (token, size, k, 哈希族) 条目上限
+POSITION_CACHE_SIZE = 1 << 16
+
+
+def _legacy_words(data: bytes, key: bytes):
+    h1 = int(hashlib.sha256(data).hexdigest(), 16)
+    h2 = int(hashlib.md5(data).hexdigest(), 16)
+    return h1, h2
+
+
+def _blake2b_words(data: bytes, key: bytes):
+    digest = hashlib.blake2b(data, digest_size=16, key=key).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+_WORDS = {
+    LEGACY_FAMILY: _legacy_words,
+    BLAKE2B_FAMILY: _blake2b_words,
+}
+
+
+def check_hashing(hashing: dict | None) -> dict:
+    """规范化哈希族配置 {"family", "key"}；未知哈希族抛出 ValueError。"""
+    spec = dict(DEFAULT_HASHING)
+    if hashing:
+        spec.update({k: hashing[k] for k in ("family", "key") if k in hashing})
+    spec["family"] = str(spec["family"]).lower()
+    spec["key"] = str(spec["key"] or "")
+    if spec["family"] not in _WORDS:
+        raise ValueError(f"未知的位置哈希族: {spec['family']}（可选 {', '.join(HASH_FAMILIES)}）")
+    if len(spec["key"].encode('utf-8')) > hashlib.blake2b.MAX_KEY_SIZE:
+        raise ValueError(f"位置哈希密钥不能超过 {hashlib.blake2b.MAX_KEY_SIZE} 字节")
+    return spec
+
+
+def index_hashing(aui: dict) -> dict:
+    """AUI 所用的位置哈希族；旧索引没有 "hashing" 字段时为 sha256-md5。"""
+    return check_hashing(aui.get("hashing"))
+
+
+@lru_cache(maxsize=POSITION_CACHE_SIZE)
+def _positions(item: str, size: int, k: int, family: str, key: str) -> tuple:
+    h1, h2 = _WORDS[family](item.encode('utf-8'), key.encode('utf-8'))
+    if family == BLAKE2B_FAMILY:
+        # 步长落在 [1, size-1]：对任意 size（含奇数）都不会让相邻位置重合
+        h2 = 1 + h2 % (size - 1) if size > 1 else 0
+    return tuple((h1 + i * h2) % size for i in range(k))
+
+
+def hash_positions(item: str, size: int, k: int, hashing: dict | None = None) -> list:
+    """生成 k 个候选位置，采用双哈希技巧；hashing 为 None 时使用 sha256-md5。"""
+    if hashing is None:
+        return list(_positions(item, size, k, LEGACY_FAMILY, ""))
+    spec = check_hashing(hashing)
+    return list(_positions(item, size, k, spec["family"], spec["key"]))
+
+
+def cache_info():
+    """位置缓存的命中/未命中统计（functools 的 CacheInfo）。"""
+    return _positions.cache_info()
+
+
+def cache_clear():
+    _positions.cache_clear()
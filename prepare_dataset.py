@@ -1,5 +1,105 @@
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 
+REQUIRED_COLUMNS = ['IPEDSID', 'Geo Point', 'NAME', 'ADDRESS', 'CITY', 'STATE']
+
+
+@dataclass
+class RecordBatch:
+    """
+    列式记录批：ids / x / y / keywords 四列等长。
+    比逐条字典更紧凑，可直接交给批量编码；需要旧接口时用 to_dicts()。
+    """
+    ids: list
+    x: np.ndarray
+    y: np.ndarray
+    keywords: list
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for uni_id, lat, lon, kw in zip(self.ids, self.x.tolist(), self.y.tolist(), self.keywords):
+            yield {'id': uni_id, 'x': lat, 'y': lon, 'keywords': kw}
+
+    def to_dicts(self) -> list:
+        return list(self)
+
+
+def _check_columns(columns):
+    # 检查CSV文件是否包含所有必需的列
+    for col in REQUIRED_COLUMNS:
+        if col not in columns:
+            raise ValueError(f"CSV文件缺少必需的列: {col}")
+
+
+def _read_csv(csv_file, **kwargs):
+    _check_columns(pd.read_csv(csv_file, sep=";", nrows=0).columns)
+    return pd.read_csv(csv_file, sep=";", usecols=REQUIRED_COLUMNS, **kwargs)
+
+
+def _transform_frame(df, skipped: dict) -> RecordBatch:
+    """
+    向量化转换一个 DataFrame：用掩码过滤空字段，按列解析 'Geo Point'。
+    跳过的行按首个为空的字段累计到 skipped（不逐行打印）。
+    """
+    keep = pd.Series(True, index=df.index)
+    for col in REQUIRED_COLUMNS:
+        empty = df[col].isna() | df[col].astype(str).str.strip().eq("")
+        hit = keep & empty
+        if hit.any():
+            skipped[col] = skipped.get(col, 0) + int(hit.sum())
+        keep &= ~empty
+    df = df[keep]
+
+    # 假设 'Geo Point' 格式为 "lat, lon"
+    geo = df['Geo Point'].astype(str)
+    parts = geo.str.split(',', expand=True)
+    if len(df) and parts.shape[1] != 2:
+        bad = geo[geo.str.count(',') != 1]
+        raise ValueError(f"在处理第 {bad.index[0]} 行的 'Geo Point' 字段时出错: {bad.iloc[0]}")
+    try:
+        lat = parts[0].str.strip().astype(float).to_numpy() if len(df) else np.empty(0)
+        lon = parts[1].str.strip().astype(float).to_numpy() if len(df) else np.empty(0)
+    except ValueError as e:
+        lat_ok = pd.to_numeric(parts[0].str.strip(), errors='coerce').notna()
+        lon_ok = pd.to_numeric(parts[1].str.strip(), errors='coerce').notna()
+        bad = geo[~(lat_ok & lon_ok)]
+        raise ValueError(f"在处理第 {bad.index[0]} 行的 'Geo Point' 字段时出错: {bad.iloc[0]}") from e
+
+    # 将 (NAME, ADDRESS, CITY, STATE) 四个字段组合为关键词集合（这里直接拼接成字符串）
+    keywords = (df['NAME'].astype(str) + " " + df['ADDRESS'].astype(str) + " "
+                + df['CITY'].astype(str) + " " + df['STATE'].astype(str))
+    return RecordBatch(ids=df['IPEDSID'].tolist(), x=lat, y=lon, keywords=keywords.tolist())
+
+
+def _report_skipped(skipped: dict):
+    if skipped:
+        detail = ", ".join(f"{col}={cnt}" for col, cnt in skipped.items())
+        print(f"Warning: 共跳过 {sum(skipped.values())} 行必需字段为空的记录（{detail}）。")
+
+
+def load_record_batch(csv_file) -> RecordBatch:
+    """只读取必需列，一次性返回整个数据集的列式记录批。"""
+    skipped = {}
+    batch = _transform_frame(_read_csv(csv_file), skipped)
+    _report_skipped(skipped)
+    return batch
+
+
+def iter_record_batches(csv_file, chunksize: int = 10000):
+    """
+    按块读取 CSV，逐块产出 RecordBatch。
+    内存占用只与 chunksize 有关，适合流式构建索引；跳过统计在读完后汇报一次。
+    """
+    skipped = {}
+    for chunk in _read_csv(csv_file, chunksize=chunksize):
+        yield _transform_frame(chunk, skipped)
+    _report_skipped(skipped)
+
+
 def load_and_transform(csv_file):
     """
     读取美国大学信息数据集 CSV 文件，挑选指定列形成三元组形式：
@@ -11,46 +111,10 @@ def load_and_transform(csv_file):
     返回:
       - dataset: 一个列表，每个元素为字典，包含键 'id', 'x', 'y', 'keywords'
     """
-    df = pd.read_csv(csv_file, sep=";")
-    
-    # 检查CSV文件是否包含所有必需的列
-    required_columns = ['IPEDSID', 'Geo Point', 'NAME', 'ADDRESS', 'CITY', 'STATE']
-    for col in required_columns:
-        if col not in df.columns:
-            raise ValueError(f"CSV文件缺少必需的列: {col}")
-    
-    dataset = []
-    for index, row in df.iterrows():
-        # 检查必需字段是否为空或缺失
-        skip = False
-        for col in required_columns:
-            if pd.isnull(row[col]) or str(row[col]).strip() == "":
-                print(f"Warning: 第 {index} 行字段 {col} 为空，跳过该行。")
-                skip = True
-                break
-        if skip:
-            continue
-
-        uni_id = row['IPEDSID']
-        geo_point = row['Geo Point']
-        # 假设 'Geo Point' 格式为 "lat, lon"
-        try:
-            lat_str, lon_str = [s.strip() for s in str(geo_point).split(',')]
-            lat = float(lat_str)
-            lon = float(lon_str)
-        except Exception as e:
-            raise ValueError(f"在处理第 {index} 行的 'Geo Point' 字段时出错: {geo_point}") from e
-        
-        # 将 (NAME, ADDRESS, CITY, STATE) 四个字段组合为关键词集合（这里直接拼接成字符串）
-        keywords = f"{row['NAME']} {row['ADDRESS']} {row['CITY']} {row['STATE']}"
-        
-        # 构造符合 Setup 接口要求的记录（三元组形式）
-        record = {
-            'id': uni_id,
-            'x': lat,
-            'y': lon,
-            'keywords': keywords
-            # 如果后续需要GBF编码后的结果，可在这里预留位置或进行编码
-        }
-        dataset.append(record)
-    return dataset
+    return load_record_batch(csv_file).to_dicts()
+
+
+def iter_records(csv_file, chunksize: int = 10000):
+    """按块惰性读取 CSV，逐条产出与 load_and_transform 相同的记录字典。"""
+    for batch in iter_record_batches(csv_file, chunksize=chunksize):
+        yield from batch
@@ -1,13 +1,22 @@
 """Core APIs for the secure spatio-textual search demo."""
 
 from .indexing import build_index_from_csv, save_index_artifacts, load_index_artifacts
+from .streaming import build_streaming_index, build_streaming_index_from_csv
 from .query import (
     QueryPlan,
     prepare_query_plan,
+    prepare_query_plans,
+    batch_payloads,
     combine_csp_responses,
+    combine_batch_responses,
+    ShareCombiner,
+    fold_batch_reply,
     decrypt_matches,
     run_fx_hmac_verification,
+    run_batch_verification,
+    Verifier,
 )
+from .segments import SegmentedIndex, combine_segment_responses
 from .expansion_client import prepare_query_plan_with_expansion, ExpandedQueryPlan
 from .query_expansion import expand_query_keywords, ExpansionResult
 
@@ -15,13 +24,24 @@ __all__ = [
     'build_index_from_csv',
     'save_index_artifacts',
     'load_index_artifacts',
+    'build_streaming_index',
+    'build_streaming_index_from_csv',
     'QueryPlan',
     'prepare_query_plan',
+    'prepare_query_plans',
+    'batch_payloads',
+    'combine_batch_responses',
+    'ShareCombiner',
+    'fold_batch_reply',
     'prepare_query_plan_with_expansion',
+    'SegmentedIndex',
+    'combine_segment_responses',
     'ExpandedQueryPlan',
     'combine_csp_responses',
     'decrypt_matches',
     'run_fx_hmac_verification',
+    'run_batch_verification',
+    'Verifier',
     'expand_query_keywords',
     'ExpansionResult',
 ]
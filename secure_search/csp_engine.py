@@ -0,0 +1,321 @@
+"""Share evaluation engines used by the CSP servers."""
+
+from __future__ import annotations
+
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .index_format import columnar_matrix, sigma_matrix
+
+# Row-chunk budget of a batch sweep: touched columns x rows x byte_len held at once.
+_SWEEP_BYTES = 32 * 1024 * 1024
+
+# token type -> (index section, encrypted matrix key)
+MATRIX_KEYS = {
+    "kw": ("I_tex", "EbW"),
+    "spa": ("I_spa", "Ebp"),
+}
+
+
+def selected_columns(buckets: Sequence[dict]) -> List[int]:
+    """Return the columns whose DMPF selection bit is set for this party."""
+    cols: List[int] = []
+    for binfo in buckets:
+        bits = binfo['bits']
+        for local_idx, col_idx in enumerate(binfo['columns']):
+            if int(bits[local_idx]) == 1:
+                cols.append(int(col_idx))
+    return cols
+
+
+def normalized_columns(cols: Sequence[int]) -> Tuple[int, ...]:
+    """Canonical form of a column selection: a column chosen twice cancels under XOR."""
+    odd = set()
+    for c in cols:
+        odd ^= {c}
+    return tuple(sorted(odd))
+
+
+class AggregationCache:
+    """Memory-bounded LRU of column-subset aggregations shared by evaluators.
+
+    Keys are ``(evaluator scope, matrix, normalized columns)`` and values the
+    aggregated ``n * byte_len`` vector with its sigma XOR.  Each evaluator has its
+    own scope, so entries of a replaced index can never be served for a new one;
+    ``clear`` drops them eagerly when an index is (re)loaded.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[tuple, Tuple[bytes, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._scopes = itertools.count(1)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def new_scope(self) -> int:
+        return next(self._scopes)
+
+    def get(self, key: tuple):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, vec: bytes, sigma: bytes) -> None:
+        size = len(vec) + len(sigma)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0]) + len(old[1])
+            self._entries[key] = (vec, sigma)
+            self.bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes:
+            _, (v, s) = self._entries.popitem(last=False)
+            self.bytes -= len(v) + len(s)
+            self.evictions += 1
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the memory budget in place, evicting least recently used entries to fit.
+
+        The hit/miss/eviction counters carry on, so they stay monotonic across reloads.
+        """
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            self._evict()
+
+    def clear(self) -> None:
+        """Drop every entry; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ColumnarEvaluator:
+    """XOR-aggregate token shares over contiguous column-major matrices.
+
+    Each matrix is held as a ``(m, n, byte_len)`` uint8 array so that a column is one
+    contiguous block; a token's share is the XOR reduction of its selected columns.
+    """
+
+    name = "numpy"
+
+    def __init__(self, aui: dict, cache: AggregationCache | None = None) -> None:
+        self.cache = cache if cache is not None and cache.max_bytes > 0 else None
+        self.scope = self.cache.new_scope() if self.cache is not None else 0
+        self.n = len(aui['ids'])
+        self.byte_len = int(aui['segment_length'])
+        self.security_param = int(aui['security_param'])
+        self.matrices: Dict[str, np.ndarray] = {}
+        self.sigmas: Dict[str, np.ndarray] = {}
+        for typ, (section, key) in MATRIX_KEYS.items():
+            sigma = aui[section]['sigma']
+            lam = len(sigma[0]) if len(sigma) else self.security_param
+            self.matrices[typ] = columnar_matrix(aui[section][key], self.byte_len)
+            self.sigmas[typ] = sigma_matrix(sigma, lam)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of encrypted matrices served (mapped, not necessarily resident)."""
+        return sum(m.nbytes for m in self.matrices.values())
+
+    def warm(self) -> None:
+        """Fault every page of the (possibly mmap'd) matrices in before serving."""
+        for matrix in self.matrices.values():
+            flat = matrix.reshape(-1)
+            for i in range(0, flat.size, _SWEEP_BYTES):
+                np.bitwise_or.reduce(flat[i:i + _SWEEP_BYTES])
+
+    def _aggregate(self, typ: str, cols: Tuple[int, ...]) -> Tuple[bytes, bytes]:
+        matrix = self.matrices[typ]
+        sigma = self.sigmas[typ]
+        if not cols:
+            return bytes(self.n * self.byte_len), bytes(sigma.shape[1])
+        vec = matrix[cols[0]].copy()
+        for col_idx in cols[1:]:
+            np.bitwise_xor(vec, matrix[col_idx], out=vec)
+        return vec.tobytes(), np.bitwise_xor.reduce(sigma[list(cols)], axis=0).tobytes()
+
+    def evaluate_token(self, token: dict, lam: int) -> Tuple[bytes, bytes]:
+        typ = 'kw' if token.get('type', 'kw') == 'kw' else 'spa'
+        cols = normalized_columns(selected_columns(token.get('buckets', [])))
+        if not cols:
+            return bytes(self.n * self.byte_len), bytes(lam)
+        if self.cache is None:
+            vec, sig = self._aggregate(typ, cols)
+        else:
+            key = (self.scope, typ, cols)
+            hit = self.cache.get(key)
+            if hit is None:
+                vec, sig = self._aggregate(typ, cols)
+                self.cache.put(key, vec, sig)
+            else:
+                vec, sig = hit
+        return vec, sig[:lam]
+
+    def evaluate(self, tokens: Sequence[dict], lam: int) -> Tuple[List[bytes], List[bytes]]:
+        """Return per-token ``(n * byte_len)`` result blobs and ``lam``-byte proof shares."""
+        result_shares: List[bytes] = []
+        proof_shares: List[bytes] = []
+        for tok in tokens:
+            vec, proof = self.evaluate_token(tok, lam)
+            result_shares.append(vec)
+            proof_shares.append(proof)
+        return result_shares, proof_shares
+
+    def evaluate_batch(self, queries: Sequence[Sequence[dict]], lam: int) -> List[Tuple[List[bytes], List[bytes]]]:
+        """Evaluate many queries' tokens in one sweep over the index.
+
+        Identical column selections are aggregated once, and the rows are walked in
+        chunks that read every touched column a single time, so a burst of queries
+        costs one pass rather than one pass per query.  Returns ``evaluate``'s
+        ``(result blobs, proof shares)`` per query.
+        """
+        selections: Dict[Tuple[str, Tuple[int, ...]], int] = {}
+        query_keys = []
+        for tokens in queries:
+            keys = []
+            for tok in tokens:
+                typ = 'kw' if tok.get('type', 'kw') == 'kw' else 'spa'
+                key = (typ, normalized_columns(selected_columns(tok.get('buckets', []))))
+                selections.setdefault(key, len(selections))
+                keys.append(key)
+            query_keys.append(keys)
+
+        aggregated: Dict[Tuple[str, Tuple[int, ...]], Tuple[bytes, bytes]] = {}
+        for key in selections:
+            if self.cache is not None and key[1]:
+                hit = self.cache.get((self.scope,) + key)
+                if hit is not None:
+                    aggregated[key] = hit
+        for typ in MATRIX_KEYS:
+            keys = [key for key in selections if key[0] == typ and key not in aggregated]
+            if not keys:
+                continue
+            for key, (vec, sig) in zip(keys, self._sweep(typ, [cols for _, cols in keys])):
+                aggregated[key] = (vec, sig)
+                if self.cache is not None and key[1]:
+                    self.cache.put((self.scope,) + key, vec, sig)
+        return [
+            ([aggregated[key][0] for key in keys], [aggregated[key][1][:lam] for key in keys])
+            for keys in query_keys
+        ]
+
+    def _sweep(self, typ: str, selections: List[Tuple[int, ...]]) -> List[Tuple[bytes, bytes]]:
+        matrix = self.matrices[typ]
+        sigma = self.sigmas[typ]
+        touched = sorted({c for cols in selections for c in cols})
+        local = {c: i for i, c in enumerate(touched)}
+        picks = [[local[c] for c in cols] for cols in selections]
+        outs = [np.zeros((self.n, self.byte_len), dtype=np.uint8) for _ in selections]
+        if touched:
+            step = max(1, _SWEEP_BYTES // (len(touched) * self.byte_len))
+            for r0 in range(0, self.n, step):
+                block = matrix[touched, r0:r0 + step]
+                for out, pick in zip(outs, picks):
+                    if pick:
+                        np.bitwise_xor.reduce(block[pick], axis=0, out=out[r0:r0 + step])
+        results = []
+        for out, cols in zip(outs, selections):
+            if cols:
+                sig = np.bitwise_xor.reduce(sigma[list(cols)], axis=0).tobytes()
+            else:
+                sig = bytes(sigma.shape[1])
+            results.append((out.tobytes(), sig))
+        return results
+
+
+class LegacyEvaluator:
+    """Reference backend: the original per-cell Python XOR loop over row-major lists."""
+
+    name = "legacy"
+
+    def __init__(self, aui: dict) -> None:
+        if isinstance(aui['I_tex']['EbW'], np.ndarray):
+            raise ValueError("legacy backend requires a row-major (pickled) index")
+        self.aui = aui
+        self.n = len(aui['ids'])
+        self.byte_len = int(aui['segment_length'])
+        self.security_param = int(aui['security_param'])
+
+    def warm(self) -> None:
+        # row-major lists are already resident
+        pass
+
+    @property
+    def nbytes(self) -> int:
+        width = sum(len(self.aui[section][key][0]) for section, key in MATRIX_KEYS.values() if self.n)
+        return self.n * width * self.byte_len
+
+    def evaluate_token(self, token: dict, lam: int) -> Tuple[bytes, bytes]:
+        typ = token.get('type', 'kw')
+        section, key = MATRIX_KEYS['kw' if typ == 'kw' else 'spa']
+        mat = self.aui[section]
+        vec_total = [b"\x00" * self.byte_len for _ in range(self.n)]
+        proof_total = b"\x00" * lam
+        for col_idx in selected_columns(token.get('buckets', [])):
+            col_cells = [row[col_idx] for row in mat[key]]
+            for i in range(self.n):
+                vec_total[i] = bytes(a ^ b for a, b in zip(vec_total[i], col_cells[i]))
+            proof_total = bytes(a ^ b for a, b in zip(proof_total, mat['sigma'][col_idx]))
+        return b"".join(vec_total), proof_total
+
+    def evaluate(self, tokens: Sequence[dict], lam: int) -> Tuple[List[bytes], List[bytes]]:
+        result_shares: List[bytes] = []
+        proof_shares: List[bytes] = []
+        for tok in tokens:
+            vec, proof = self.evaluate_token(tok, lam)
+            result_shares.append(vec)
+            proof_shares.append(proof)
+        return result_shares, proof_shares
+
+    def evaluate_batch(self, queries: Sequence[Sequence[dict]], lam: int) -> List[Tuple[List[bytes], List[bytes]]]:
+        return [self.evaluate(tokens, lam) for tokens in queries]
+
+
+EVALUATOR_BACKENDS = {
+    ColumnarEvaluator.name: ColumnarEvaluator,
+    LegacyEvaluator.name: LegacyEvaluator,
+}
+
+
+def make_evaluator(aui: dict, backend: str = ColumnarEvaluator.name, cache: AggregationCache | None = None):
+    """Build the share evaluator for ``aui`` using the named backend.
+
+    ``cache`` (numpy backend only) memoises column-subset aggregations.
+    """
+    try:
+        cls = EVALUATOR_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"unknown evaluator backend: {backend}") from None
+    if cls is ColumnarEvaluator:
+        return cls(aui, cache=cache)
+    return cls(aui)
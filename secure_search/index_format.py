@@ -0,0 +1,251 @@
+"""Versioned binary on-disk format for authenticated indexes.
+
+Layout (all integers little-endian)::
+
+    magic (8s) | version (u32) | header_size (u32) | header_len (u32) | header JSON ...
+    <padding up to header_size>
+    data region: page-aligned blocks, offsets in the header are relative to header_size
+
+The header carries the AUI metadata and a block table.  Encrypted matrices are
+stored column-major as ``(m, n, byte_len)`` uint8 blocks so that a CSP touching a
+handful of columns only pages in those columns; sigma tags are ``(m, lam)`` blocks
+and ``ids`` is a JSON-lines block.  ``read_index`` maps the file and returns
+zero-copy NumPy views.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+MAGIC = b"STVLSIDX"
+FORMAT_VERSION = 1
+PAGE = 4096
+# Where ``shared_index`` places indexes that are not already file-backed.
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+_PREAMBLE = struct.Struct("<8sIII")
+
+# block name -> (index section, key inside the section)
+MATRIX_BLOCKS = {
+    "I_spa.Ebp": ("I_spa", "Ebp"),
+    "I_tex.EbW": ("I_tex", "EbW"),
+}
+SIGMA_BLOCKS = {
+    "I_spa.sigma": ("I_spa", "sigma"),
+    "I_tex.sigma": ("I_tex", "sigma"),
+}
+_ARRAY_KEYS = ("I_spa", "I_tex", "ids")
+
+
+def _align(value: int, boundary: int = PAGE) -> int:
+    return (value + boundary - 1) // boundary * boundary
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def columnar_matrix(rows, byte_len: int) -> np.ndarray:
+    """Convert a row-major ``rows[i][j] -> bytes`` matrix to a ``(m, n, byte_len)`` array.
+
+    Arrays that are already column-major (e.g. memory-mapped indexes) are returned as-is.
+    """
+    if isinstance(rows, np.ndarray):
+        return rows
+    n = len(rows)
+    m = len(rows[0]) if n else 0
+    flat = b"".join(b"".join(row) for row in rows)
+    arr = np.frombuffer(flat, dtype=np.uint8).reshape(n, m, byte_len)
+    return np.ascontiguousarray(arr.transpose(1, 0, 2))
+
+
+def sigma_matrix(sigma, lam: int) -> np.ndarray:
+    """Stack per-column sigma tags into an ``(m, lam)`` array."""
+    if isinstance(sigma, np.ndarray):
+        return sigma
+    return np.frombuffer(b"".join(sigma), dtype=np.uint8).reshape(len(sigma), lam)
+
+
+def is_index_file(path: str | Path) -> bool:
+    """Return True if ``path`` starts with the binary index magic."""
+    with Path(path).open("rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def block_layout(n: int, m1: int, m2: int, byte_len: int, lam: int) -> Dict[str, dict]:
+    """Compute the fixed-size block table (offsets relative to the data region)."""
+    shapes = {
+        "I_spa.Ebp": [m1, n, byte_len],
+        "I_tex.EbW": [m2, n, byte_len],
+        "I_spa.sigma": [m1, lam],
+        "I_tex.sigma": [m2, lam],
+    }
+    layout: Dict[str, dict] = {}
+    offset = 0
+    for name, shape in shapes.items():
+        layout[name] = {"offset": offset, "shape": shape, "dtype": "uint8"}
+        offset = _align(offset + int(np.prod(shape)))
+    layout["ids"] = {"offset": offset, "length": 0}
+    return layout
+
+
+def encode_ids(ids) -> bytes:
+    return b"".join(json.dumps(x, default=_json_default).encode("utf-8") + b"\n" for x in ids)
+
+
+def decode_ids(blob) -> List:
+    return [json.loads(line) for line in bytes(blob).decode("utf-8").splitlines() if line]
+
+
+def write_header(f, header: dict, header_size: int | None = None, *,
+                 magic: bytes = MAGIC, version: int = FORMAT_VERSION) -> int:
+    """Write the preamble and header JSON at the start of ``f``; return the header size."""
+    body = json.dumps(header, default=_json_default, sort_keys=True).encode("utf-8")
+    needed = _PREAMBLE.size + len(body)
+    if header_size is None:
+        header_size = _align(needed)
+    elif needed > header_size:
+        raise ValueError(f"index header needs {needed} bytes, only {header_size} reserved")
+    f.seek(0)
+    f.write(_PREAMBLE.pack(magic, version, header_size, len(body)))
+    f.write(body)
+    f.write(b"\x00" * (header_size - needed))
+    return header_size
+
+
+def index_metadata(aui: dict) -> dict:
+    """Return the AUI entries that are stored in the header rather than as blocks."""
+    return {k: v for k, v in aui.items() if k not in _ARRAY_KEYS}
+
+
+def index_fingerprint(aui: dict) -> str:
+    """Short hex id of an index, equal on every party serving the same AUI.
+
+    Derived from the shape parameters and the sigma tags, which are keyed per build,
+    so it is cheap to compute and changes whenever the index is rebuilt.
+    """
+    lam = int(aui["security_param"])
+    h = hashlib.blake2b(digest_size=8)
+    h.update(json.dumps([len(aui["ids"]), int(aui["m1"]), int(aui["m2"]),
+                         int(aui["segment_length"]), lam]).encode("utf-8"))
+    for section, key in SIGMA_BLOCKS.values():
+        sigma = aui[section][key]
+        if len(sigma):
+            h.update(memoryview(np.ascontiguousarray(sigma_matrix(sigma, lam))).cast("B"))
+    return h.hexdigest()
+
+
+def write_index(path: str | Path, aui: dict) -> Path:
+    """Serialise ``aui`` (row-major lists or column-major arrays) to ``path``."""
+    path = Path(path)
+    ids = aui["ids"]
+    n = len(ids)
+    m1 = int(aui["m1"])
+    m2 = int(aui["m2"])
+    byte_len = int(aui["segment_length"])
+    lam = int(aui["security_param"])
+    layout = block_layout(n, m1, m2, byte_len, lam)
+    ids_blob = encode_ids(ids)
+    layout["ids"]["length"] = len(ids_blob)
+    header = {"n": n, "meta": index_metadata(aui), "blocks": layout}
+
+    with path.open("wb") as f:
+        header_size = write_header(f, header)
+        for name, (section, key) in MATRIX_BLOCKS.items():
+            arr = columnar_matrix(aui[section][key], byte_len) if n else np.zeros(0, np.uint8)
+            f.seek(header_size + layout[name]["offset"])
+            f.write(memoryview(np.ascontiguousarray(arr, dtype=np.uint8)).cast("B"))
+        for name, (section, key) in SIGMA_BLOCKS.items():
+            sigma = aui[section][key]
+            arr = sigma_matrix(sigma, lam) if len(sigma) else np.zeros(0, np.uint8)
+            f.seek(header_size + layout[name]["offset"])
+            f.write(memoryview(np.ascontiguousarray(arr, dtype=np.uint8)).cast("B"))
+        f.seek(header_size + layout["ids"]["offset"])
+        f.write(ids_blob)
+    return path
+
+
+def read_header(f, *, magic: bytes = MAGIC, version: int = FORMAT_VERSION,
+                kind: str = "index") -> Tuple[dict, int]:
+    """Read and validate the preamble; return ``(header, header_size)``."""
+    raw = f.read(_PREAMBLE.size)
+    if len(raw) < _PREAMBLE.size:
+        raise ValueError(f"truncated {kind} file")
+    found, found_version, header_size, header_len = _PREAMBLE.unpack(raw)
+    if found != magic:
+        raise ValueError(f"not a binary {kind} file")
+    if found_version != version:
+        raise ValueError(f"unsupported {kind} format version {found_version} (expected {version})")
+    header = json.loads(f.read(header_len).decode("utf-8"))
+    return header, header_size
+
+
+def read_index(path: str | Path, use_mmap: bool = True) -> dict:
+    """Open a binary index and return an AUI dict backed by NumPy arrays.
+
+    With ``use_mmap`` the matrices and sigma tags are zero-copy read-only views onto a
+    shared file mapping, so only the pages a query touches are read from disk.
+    """
+    with Path(path).open("rb") as f:
+        header, header_size = read_header(f)
+        if use_mmap:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            f.seek(0)
+            buf = f.read()
+
+    blocks = header["blocks"]
+
+    def _view(name: str) -> np.ndarray:
+        info = blocks[name]
+        count = int(np.prod(info["shape"]))
+        arr = np.frombuffer(buf, dtype=np.uint8, count=count, offset=header_size + info["offset"])
+        return arr.reshape(info["shape"])
+
+    ids_info = blocks["ids"]
+    ids_start = header_size + ids_info["offset"]
+    aui = dict(header["meta"])
+    aui["ids"] = decode_ids(buf[ids_start:ids_start + ids_info["length"]])
+    aui["I_spa"] = {"Ebp": _view("I_spa.Ebp"), "sigma": _view("I_spa.sigma")}
+    aui["I_tex"] = {"EbW": _view("I_tex.EbW"), "sigma": _view("I_tex.sigma")}
+    return aui
+
+
+def is_mapped(aui: dict) -> bool:
+    """True if the AUI's matrices are views onto a file mapping (see ``read_index``)."""
+    for section, key in MATRIX_BLOCKS.values():
+        arr = aui[section][key]
+        while isinstance(arr, np.ndarray):
+            arr = arr.base
+        if not isinstance(arr, mmap.mmap):
+            return False
+    return True
+
+
+def shared_index(aui: dict, directory: str | Path | None = None) -> dict:
+    """Return ``aui`` backed by a file mapping that forked processes share page for page.
+
+    Mapped indexes are returned unchanged.  Others are written to an anonymous (already
+    unlinked) file under ``directory`` -- ``/dev/shm`` where available -- and mapped
+    back, so every process holding the result uses the same physical copy.
+    """
+    if is_mapped(aui):
+        return aui
+    fd, path = tempfile.mkstemp(prefix="aui-", suffix=".idx", dir=directory or SHARED_DIR)
+    os.close(fd)
+    try:
+        write_index(path, aui)
+        return read_index(path, use_mmap=True)
+    finally:
+        os.unlink(path)
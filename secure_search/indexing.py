@@ -9,37 +9,62 @@ import pickle
 
 from config_loader import load_config
 import prepare_dataset
-from convert_dataset import convert_dataset
+from convert_dataset import encode_batch
 from SetupProcess import Setup
 
+from .index_format import is_index_file, read_index, write_index
+
 IndexArtifacts = Tuple[dict, tuple]
 
+AUI_FILENAMES = {
+    "binary": "aui.idx",
+    "pickle": "aui.pkl",
+}
+
 
-def build_index_from_csv(csv_path: str, config_path: str) -> IndexArtifacts:
-    """Construct the authenticated index and key tuple from a CSV dataset."""
+def build_index_from_csv(csv_path: str, config_path: str, workers: int | None = None) -> IndexArtifacts:
+    """Construct the authenticated index and key tuple from a CSV dataset.
+
+    ``workers`` > 1 shards Setup across a process pool; the result is identical.
+    """
     cfg = load_config(config_path)
-    dict_list = prepare_dataset.load_and_transform(csv_path)
-    db = convert_dataset(dict_list, cfg)
-    return Setup(db, cfg)
+    db = encode_batch(prepare_dataset.load_record_batch(csv_path), cfg)
+    return Setup(db, cfg, workers=workers)
+
 
+def save_index_artifacts(aui: dict, keys: tuple, output_dir: str | Path, fmt: str = "binary") -> Tuple[Path, Path]:
+    """Persist the authenticated index and keys to disk and return their paths.
 
-def save_index_artifacts(aui: dict, keys: tuple, output_dir: str | Path) -> Tuple[Path, Path]:
-    """Persist the authenticated index and keys to disk and return their paths."""
+    ``fmt="binary"`` writes the memory-mappable ``aui.idx`` format; ``fmt="pickle"``
+    keeps the legacy ``aui.pkl`` output.
+    """
+    if fmt not in AUI_FILENAMES:
+        raise ValueError(f"unknown index format: {fmt}")
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-    aui_path = out_dir / "aui.pkl"
+    aui_path = out_dir / AUI_FILENAMES[fmt]
     key_path = out_dir / "K.pkl"
-    with aui_path.open("wb") as f:
-        pickle.dump(aui, f)
+    if fmt == "binary":
+        write_index(aui_path, aui)
+    else:
+        with aui_path.open("wb") as f:
+            pickle.dump(aui, f)
     with key_path.open("wb") as f:
         pickle.dump(keys, f)
     return aui_path, key_path
 
 
-def load_index_artifacts(aui_path: str | Path, key_path: str | Path) -> IndexArtifacts:
-    """Load the authenticated index and keys from disk."""
+def load_aui(aui_path: str | Path, use_mmap: bool = True) -> dict:
+    """Load an authenticated index, detecting the binary format or a legacy pickle."""
+    if is_index_file(aui_path):
+        return read_index(aui_path, use_mmap=use_mmap)
     with Path(aui_path).open("rb") as f:
-        aui = pickle.load(f)
+        return pickle.load(f)
+
+
+def load_index_artifacts(aui_path: str | Path, key_path: str | Path, use_mmap: bool = True) -> IndexArtifacts:
+    """Load the authenticated index and keys from disk."""
+    aui = load_aui(aui_path, use_mmap=use_mmap)
     with Path(key_path).open("rb") as f:
         keys = pickle.load(f)
     return aui, keys
@@ -0,0 +1,223 @@
+"""Minimal Prometheus-style metrics and per-request tracing for the CSP servers.
+
+Only the text exposition format is produced, so no client library is needed.
+Metrics are thread-safe; label values are passed as keyword arguments.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    inner = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + inner + "}"
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, read, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, doc, labels)
+        self._read = read
+
+    def samples(self) -> List[str]:
+        value = self._read()
+        if not self.label_names:
+            return [f"{self.name} {_num(value)}"]
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in sorted(value.items())]
+
+
+class CallbackCounter(Gauge):
+    """Counter whose monotonic value is kept elsewhere and read at scrape time."""
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._series.items())
+        out = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                labels = _labels(self.label_names + ("le",), key + (_num(bound),))
+                out.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _labels(self.label_names, key)
+            out.append(f"{self.name}_sum{base} {_num(total)}")
+            out.append(f"{self.name}_count{base} {count}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, doc, labels))
+
+    def gauge(self, name: str, doc: str, read, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, doc, read, labels))
+
+    def callback_counter(self, name: str, doc: str, read, labels: Sequence[str] = ()) -> CallbackCounter:
+        return self.register(CallbackCounter(name, doc, read, labels))
+
+    def histogram(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, doc, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """Timings and sizes of one request, filled in as it moves through the server."""
+
+    def __init__(self, path: str, method: str = "POST") -> None:
+        self.path = path
+        self.method = method
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.status = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.queries = 0
+        self.tokens = 0
+        self.columns = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def record(self) -> dict:
+        return {
+            "ts": round(time.time(), 3),
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "total_ms": round(self.elapsed() * 1000, 3),
+            **{f"{k}_ms": round(v * 1000, 3) for k, v in self.phases.items()},
+            "queries": self.queries,
+            "tokens": self.tokens,
+            "columns": self.columns,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class SlowQueryLog:
+    """Append one JSON line per request slower than ``threshold_ms``."""
+
+    def __init__(self, threshold_ms: float | None, path: str | None = None) -> None:
+        self.threshold = None if threshold_ms is None or threshold_ms < 0 else threshold_ms / 1000.0
+        self.path = path
+        self._lock = threading.Lock()
+
+    def maybe_log(self, trace: RequestTrace) -> bool:
+        if self.threshold is None or trace.elapsed() < self.threshold:
+            return False
+        line = json.dumps(trace.record(), sort_keys=True)
+        with self._lock:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                print(f"[slow-query] {line}", file=sys.stderr, flush=True)
+        return True
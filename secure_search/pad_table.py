@@ -0,0 +1,157 @@
+"""Owner-precomputed pad table: every one-time pad cell of an index, memory-mapped.
+
+Decrypting or verifying a result strips the pad ``F(Ke, i || id_i)`` from each
+selected cell, which normally costs HMACs per (object, column).  A trusted querier
+holding ``Ke`` can instead be given the pads themselves, laid out like the index
+matrices -- column-major ``(m1 + m2, n, byte_len)`` uint8, spatial columns first --
+so a query's handful of columns is a slice of the file.
+
+Layout: the ``index_format`` preamble with its own magic, a JSON header binding
+the table to one index (``index_fingerprint``) and key (``key_check``), then one
+page-aligned data block.  ``PadTable.open`` refuses a table built for another
+index or key, so a stale table cannot silently produce wrong pads.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import mmap
+import os
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from SetupProcess import pad_cells
+
+from .index_format import _align, index_fingerprint, read_header, write_header
+
+MAGIC = b"STVLSPAD"
+FORMAT_VERSION = 1
+# Rows derived per pass while building a table.
+BUILD_ROWS = 4096
+
+
+def key_check(Ke: bytes) -> str:
+    """Short public check value of ``Ke``; tells tables of different keys apart without revealing it."""
+    return hmac.new(Ke, b"pad-table", hashlib.sha256).hexdigest()[:16]
+
+
+def _row_data(aui: dict, rows) -> list:
+    ids = aui["ids"]
+    return [(str(row + 1) + str(ids[row])).encode("utf-8") for row in rows]
+
+
+def _shape(aui: dict) -> list:
+    return [int(aui["m1"]) + int(aui["m2"]), len(aui["ids"]), int(aui["segment_length"])]
+
+
+class DerivedPads:
+    """Pads computed from ``Ke`` on demand; the default when no table is supplied."""
+
+    def __init__(self, aui: dict, Ke: bytes) -> None:
+        self.aui = aui
+        self.Ke = Ke
+        m, _, self.byte_len = _shape(aui)
+        self.total_len = m * self.byte_len
+
+    def cells(self, rows: Sequence[int], columns: Sequence[int]) -> np.ndarray:
+        """``(len(rows), len(columns), byte_len)`` pad cells; columns count spatial first."""
+        rows = np.asarray(rows).tolist()
+        return pad_cells(self.Ke, _row_data(self.aui, rows), self.total_len, columns, self.byte_len)
+
+
+class PadTable:
+    """Read-only view of a pad table file; see ``PadTable.open``."""
+
+    def __init__(self, path: str | Path, pads: np.ndarray, header: dict) -> None:
+        self.path = Path(path)
+        self.pads = pads
+        self.header = header
+
+    @property
+    def index_version(self) -> str:
+        return self.header["index_version"]
+
+    @classmethod
+    def open(cls, path: str | Path, aui: dict, keys: tuple | None = None,
+             use_mmap: bool = True) -> "PadTable":
+        """Map the table at ``path`` after checking it belongs to ``aui`` (and ``keys``).
+
+        Raises ``ValueError`` if the table was built for a different index, shape or key.
+        """
+        with Path(path).open("rb") as f:
+            header, header_size = read_header(f, magic=MAGIC, version=FORMAT_VERSION, kind="pad table")
+            if use_mmap:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                f.seek(0)
+                buf = f.read()
+        table = cls(path, None, header)
+        table.check(aui, keys)
+        shape = header["shape"]
+        count = int(np.prod(shape))
+        table.pads = np.frombuffer(buf, dtype=np.uint8, count=count, offset=header_size).reshape(shape)
+        return table
+
+    def check(self, aui: dict, keys: tuple | None = None) -> None:
+        """Raise ``ValueError`` unless this table holds the pads of ``aui`` under ``keys``."""
+        if self.header["shape"] != _shape(aui):
+            raise ValueError(f"pad table shape {self.header['shape']} does not match index {_shape(aui)}")
+        version = index_fingerprint(aui)
+        if self.index_version != version:
+            raise ValueError(f"stale pad table: built for index {self.index_version}, loaded index is {version}")
+        if keys is not None and self.header["key_check"] != key_check(keys[0]):
+            raise ValueError("pad table was built with a different encryption key")
+
+    def cells(self, rows: Sequence[int], columns: Sequence[int]) -> np.ndarray:
+        """``(len(rows), len(columns), byte_len)`` pad cells; columns count spatial first."""
+        rows = np.asarray(rows, dtype=np.intp)
+        picked = self.pads[np.asarray(columns, dtype=np.intp)]
+        return picked[:, rows].transpose(1, 0, 2)
+
+
+def pad_source(aui: dict, keys: tuple, pads: PadTable | None = None):
+    """``pads`` checked against ``aui``/``keys``, or on-demand ``DerivedPads`` when None."""
+    if pads is None:
+        return DerivedPads(aui, keys[0])
+    pads.check(aui, keys)
+    return pads
+
+
+def build_pad_table(path: str | Path, aui: dict, keys: tuple, rows_per_pass: int = BUILD_ROWS) -> Path:
+    """Derive every pad cell of ``aui`` under ``keys`` and write the table to ``path``.
+
+    The file is written next to ``path`` and renamed into place, so a reader never
+    maps a half-written table.
+    """
+    path = Path(path)
+    shape = _shape(aui)
+    m, n, byte_len = shape
+    header = {
+        "shape": shape,
+        "index_version": index_fingerprint(aui),
+        "key_check": key_check(keys[0]),
+    }
+    derived = DerivedPads(aui, keys[0])
+    columns = list(range(m))
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with tmp.open("w+b") as f:
+            header_size = write_header(f, header, magic=MAGIC, version=FORMAT_VERSION)
+            f.truncate(header_size + _align(m * n * byte_len))
+            if m and n and byte_len:
+                with mmap.mmap(f.fileno(), 0) as buf:
+                    out = np.frombuffer(buf, dtype=np.uint8, count=m * n * byte_len,
+                                        offset=header_size).reshape(shape)
+                    for r0 in range(0, n, rows_per_pass):
+                        rows = range(r0, min(n, r0 + rows_per_pass))
+                        out[:, r0:r0 + len(rows)] = derived.cells(rows, columns).transpose(1, 0, 2)
+                    del out
+                    buf.flush()
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
@@ -2,23 +2,20 @@
 
 from __future__ import annotations
 
-import base64
 import math
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
+
+import numpy as np
 
 from QueryUtils import tokenize_normalized
 from GBF import fingerprint
-from SetupProcess import F
-from verification import verify_fx_hmac
+from verification import Verifier, verify_fx_hmac
 from DMPF import Gen
+from positions import hash_positions, index_hashing
 
-
-def _hash_pos(item: str, size: int, k: int) -> List[int]:
-    import hashlib
-    h1 = int(hashlib.sha256(item.encode('utf-8')).hexdigest(), 16)
-    h2 = int(hashlib.md5(item.encode('utf-8')).hexdigest(), 16)
-    return [(h1 + i * h2) % size for i in range(k)]
+from .pad_table import PadTable, pad_source
+from .wire import token_shares
 
 
 def _prp(zeta: bytes, x: int) -> int:
@@ -90,18 +87,19 @@ def prepare_query_plan(query_text: str, aui: dict, config: dict) -> QueryPlan:
     k_spa = int(aui.get("k_spa", 3))
     ck_kw = aui.get("cuckoo_kw", {"kappa": 3, "load": 1.27, "seed": "cuckoo-seed"})
     ck_spa = aui.get("cuckoo_spa", {"kappa": 3, "load": 1.27, "seed": "cuckoo-seed-spa"})
+    hashing = index_hashing(aui)
 
     per_party = [[{"type": typ, "buckets": []} for typ, _ in tokens_all] for _ in range(U)]
 
     for tok_idx, (typ, tok) in enumerate(tokens_all):
         if typ == 'kw':
-            S = _hash_pos(tok, m2, k_tex)
+            S = hash_positions(tok, m2, k_tex, hashing)
             kappa = min(int(ck_kw.get("kappa", 3)), k_tex)
             load = float(ck_kw.get("load", 1.27))
             zeta = str(ck_kw.get('seed', 'cuckoo-seed')).encode('utf-8')
             m = m2
         else:
-            S = _hash_pos(tok, m1, k_spa)
+            S = hash_positions(tok, m1, k_spa, hashing)
             kappa = min(int(ck_spa.get("kappa", 3)), k_spa)
             load = float(ck_spa.get("load", 1.27))
             zeta = str(ck_spa.get('seed', 'cuckoo-seed-spa')).encode('utf-8')
@@ -131,86 +129,229 @@ def prepare_query_plan(query_text: str, aui: dict, config: dict) -> QueryPlan:
     )
 
 
+def prepare_query_plans(query_texts: Sequence[str], aui: dict, config: dict) -> List[QueryPlan]:
+    """Plan a burst of queries for one ``/eval_batch`` round trip per party."""
+    return [prepare_query_plan(q, aui, config) for q in query_texts]
+
+
+def batch_payloads(plans: Sequence[QueryPlan], party: int) -> List[List[dict]]:
+    """The token payloads party ``party`` receives for ``plans``, in plan order."""
+    return [plan.payloads[party] for plan in plans]
+
+
+def combine_batch_responses(plans: Sequence[QueryPlan], responses: List[dict], aui: dict) -> List[Tuple[List[List[bytes]], List[bytes]]]:
+    """``combine_csp_responses`` for every plan of a batch.
+
+    ``responses`` holds one ``/eval_batch`` reply per party, each with a ``results``
+    list in plan order.
+    """
+    combiners = [ShareCombiner(plan, aui) for plan in plans]
+    for resp in responses:
+        fold_batch_reply(combiners, resp)
+    return [combiner.result() for combiner in combiners]
+
+
+def _check_index_versions(versions: set) -> None:
+    """Reject replies computed by the parties on different index versions."""
+    versions = versions - {None}
+    if len(versions) > 1:
+        raise ValueError(f"parties answered from different index versions: {', '.join(sorted(versions))}")
+
+
+class ShareCombiner:
+    """XOR-fold the parties' replies for one plan as they arrive.
+
+    Every token share is viewed as a uint8 buffer and XORed in place into a
+    ``(tokens, n * byte_len)`` accumulator (proofs into ``(tokens, lam)``), so a
+    fan-out can fold each reply while the other parties are still answering; see
+    ``transport.fan_out(on_reply=...)``.  The shares only XOR to the result once
+    every one of the plan's ``num_parties`` replies is in, so ``arrays`` and
+    ``result`` raise ``ValueError`` before that.
+    """
+
+    def __init__(self, plan: QueryPlan, aui: dict) -> None:
+        self.parties = int(plan.num_parties)
+        self.lam = int(aui["security_param"])
+        self.n = len(aui["ids"])
+        self.byte_len = int(aui["segment_length"])
+        token_count = len(plan.tokens)
+        self.vecs = np.zeros((token_count, self.n * self.byte_len), dtype=np.uint8)
+        self.proofs = np.zeros((token_count, self.lam), dtype=np.uint8)
+        self.replies = 0
+        self._versions: set = set()
+
+    def add(self, resp: dict, index_version: str | None = None) -> None:
+        """Fold one party's reply (JSON or binary, see ``wire``) into the accumulators.
+
+        The reply is checked in full before anything is folded, so a malformed reply
+        raises ``ValueError`` and leaves the combiner unchanged.
+        """
+        self._fold(*self._accept(resp, index_version))
+
+    def _accept(self, resp: dict, index_version: str | None):
+        version = resp.get("index_version", index_version)
+        _check_index_versions(self._versions | {version})
+        binary = "result_blobs" in resp
+        counts = {len(resp.get("result_blobs" if binary else "result_shares", [])),
+                  len(resp.get("proof_blobs" if binary else "proof_shares", []))}
+        if counts != {len(self.vecs)}:
+            raise ValueError(f"reply holds {sorted(counts)} token shares, expected {len(self.vecs)}")
+        vec_len = self.vecs.shape[1]
+        shares = []
+        for t_idx in range(len(self.vecs)):
+            vec_blob, proof_blob = token_shares(resp, t_idx)
+            if len(vec_blob) != vec_len:
+                raise ValueError(f"token {t_idx}: share has {len(vec_blob)} bytes, expected {vec_len}")
+            if len(proof_blob) < self.lam:
+                raise ValueError(f"token {t_idx}: proof has {len(proof_blob)} bytes, expected {self.lam}")
+            shares.append((vec_blob, proof_blob))
+        return version, shares
+
+    def _fold(self, version: str | None, shares: list) -> None:
+        for t_idx, (vec_blob, proof_blob) in enumerate(shares):
+            np.bitwise_xor(self.vecs[t_idx], np.frombuffer(vec_blob, dtype=np.uint8), out=self.vecs[t_idx])
+            np.bitwise_xor(self.proofs[t_idx], np.frombuffer(proof_blob, dtype=np.uint8, count=self.lam),
+                           out=self.proofs[t_idx])
+        self._versions.add(version)
+        self.replies += 1
+
+    def _check_complete(self) -> None:
+        if self.replies != self.parties:
+            raise ValueError(f"combined {self.replies} of {self.parties} party replies")
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The ``(vecs, proofs)`` accumulators, which ``decrypt_matches`` and verification take as is."""
+        self._check_complete()
+        return self.vecs, self.proofs
+
+    def result(self) -> Tuple[List[List[bytes]], List[bytes]]:
+        """``(combined_vecs, combined_proofs)`` in the per-cell form ``combine_csp_responses`` returns."""
+        self._check_complete()
+        combined_vecs: List[List[bytes]] = []
+        for row in self.vecs:
+            blob = row.tobytes()
+            combined_vecs.append([blob[i:i + self.byte_len] for i in range(0, len(blob), self.byte_len)])
+        return combined_vecs, [proof.tobytes() for proof in self.proofs]
+
+
+def fold_batch_reply(combiners: Sequence[ShareCombiner], resp: dict) -> None:
+    """Fold one party's ``/eval_batch`` reply into the per-plan combiners."""
+    results = resp.get("results", [])
+    if len(results) != len(combiners):
+        raise ValueError("batch reply does not match the number of planned queries")
+    # check every query's shares before folding any, so a bad reply changes nothing
+    accepted = [combiner._accept(result, resp.get("index_version")) for combiner, result in zip(combiners, results)]
+    for combiner, shares in zip(combiners, accepted):
+        combiner._fold(*shares)
+
+
 def combine_csp_responses(plan: QueryPlan, responses: List[dict], aui: dict) -> Tuple[List[List[bytes]], List[bytes]]:
-    lam = int(aui["security_param"])
-    n = len(aui["ids"])
-    byte_len = int(aui["segment_length"])
-    token_count = len(plan.tokens)
+    combiner = ShareCombiner(plan, aui)
+    for resp in responses:
+        combiner.add(resp)
+    return combiner.result()
+
 
-    def _decode(blob: str) -> bytes:
-        return base64.b64decode(blob.encode('utf-8'))
+# Rows decrypted per pass; bounds the pad buffer (rows x selected columns x byte_len).
+_DECRYPT_ROWS = 8192
 
-    combined_vecs: List[List[bytes]] = []
-    combined_proofs: List[bytes] = []
 
-    for t_idx in range(token_count):
-        vec = [b"\x00" * byte_len for _ in range(n)]
-        proof = b"\x00" * lam
-        for resp in responses:
-            token_vecs = resp["result_shares"][t_idx]
-            token_proof = resp["proof_shares"][t_idx]
-            for i in range(n):
-                vec[i] = bytes(a ^ b for a, b in zip(vec[i], _decode(token_vecs[i])))
-            proof = bytes(a ^ b for a, b in zip(proof, _decode(token_proof)))
-        combined_vecs.append(vec)
-        combined_proofs.append(proof)
+def _token_cells(combined_vecs, n: int, byte_len: int) -> np.ndarray:
+    """``(tokens, n, byte_len)`` view of combined shares (per-cell lists or a ``ShareCombiner.vecs`` array)."""
+    if isinstance(combined_vecs, np.ndarray):
+        return combined_vecs.reshape(len(combined_vecs), n, byte_len)
+    blob = b"".join(b"".join(cells) for cells in combined_vecs)
+    return np.frombuffer(blob, dtype=np.uint8).reshape(len(combined_vecs), n, byte_len)
 
-    return combined_vecs, combined_proofs
 
+def _as_words(cells: np.ndarray) -> np.ndarray:
+    """One comparable value per cell: an unsigned word for 1/2/4/8-byte cells, else the raw bytes."""
+    byte_len = cells.shape[-1]
+    if byte_len in (1, 2, 4, 8):
+        return np.ascontiguousarray(cells).view(f"<u{byte_len}")[..., 0]
+    return np.ascontiguousarray(cells).view(np.dtype((np.void, byte_len)))[..., 0]
 
-def decrypt_matches(plan: QueryPlan, combined_vecs: List[List[bytes]], aui: dict, keys: tuple) -> Tuple[List[bool], List]:
-    Ke, _, _ = keys
+
+def match_mask(plan: QueryPlan, combined_vecs, aui: dict, keys: tuple,
+               pads: PadTable | None = None) -> np.ndarray:
+    """Bitset of the objects matching ``plan`` (``np.packbits``, little bit order).
+
+    Objects are decrypted as arrays: a check (keyword token or spatial cell) compares
+    the decrypted cells of a whole batch of rows against its fingerprint at once.  The
+    keyword AND narrows the candidate rows token by token, so pads for later tokens are
+    only derived for rows still alive; the spatial OR is a vectorised ``any`` over the
+    remaining rows.  With a ``PadTable`` the pads are read from it instead of derived.
+    """
+    source = pad_source(aui, keys, pads)
     m1 = int(aui["m1"])
     m2 = int(aui["m2"])
-    n = len(aui["ids"])
+    ids = aui["ids"]
+    n = len(ids)
     byte_len = int(aui["segment_length"])
     k_tex = int(aui.get("k_tex", 4))
     k_spa = int(aui.get("k_spa", 3))
+    hashing = index_hashing(aui)
 
-    def pad_for_obj(idx1: int, obj_id) -> bytes:
-        total_len = (m1 + m2) * byte_len
-        return F(Ke, (str(idx1) + str(obj_id)).encode('utf-8'), total_len)
-
-    matches = [True] * n
+    # (token index, global pad columns, fingerprint) for the keyword AND / spatial OR
+    kw_checks = []
     for t_idx, (typ, tok) in enumerate(plan.tokens):
         if typ != 'kw':
             continue
-        S = _hash_pos(tok, m2, k_tex)
-        fp = fingerprint(tok, byte_len * 8)
-        for row_idx, obj_id in enumerate(aui["ids"], start=1):
-            enc_vec = combined_vecs[t_idx][row_idx - 1]
-            pad = pad_for_obj(row_idx, obj_id)
-            pad_acc = b"\x00" * byte_len
-            for j in S:
-                start = (m1 + j) * byte_len
-                pad_acc = bytes(a ^ b for a, b in zip(pad_acc, pad[start:start + byte_len]))
-            plain = bytes(a ^ b for a, b in zip(enc_vec, pad_acc))
-            matches[row_idx - 1] &= (plain == fp)
-
-    spatial_ok = [False] * n if plan.spatial_tokens else [True] * n
+        cols = [m1 + j for j in hash_positions(tok, m2, k_tex, hashing)]
+        kw_checks.append((t_idx, cols, fingerprint(tok, byte_len * 8)))
+    spa_checks = []
     base_idx = len(plan.keyword_tokens or [plan.query])
     for s_off, cell in enumerate(plan.spatial_tokens):
-        S = _hash_pos(cell, m1, k_spa)
-        fp = fingerprint(cell, byte_len * 8)
-        t_idx = base_idx + s_off
-        for row_idx, obj_id in enumerate(aui["ids"], start=1):
-            enc_vec = combined_vecs[t_idx][row_idx - 1]
-            pad = pad_for_obj(row_idx, obj_id)
-            pad_acc = b"\x00" * byte_len
-            for j in S:
-                start = j * byte_len
-                pad_acc = bytes(a ^ b for a, b in zip(pad_acc, pad[start:start + byte_len]))
-            plain = bytes(a ^ b for a, b in zip(enc_vec, pad_acc))
-            if plain == fp:
-                spatial_ok[row_idx - 1] = True
-
-    final_ok = [matches[i] and spatial_ok[i] for i in range(n)]
-    hits = [aui["ids"][i] for i, ok in enumerate(final_ok) if ok]
-    return final_ok, hits
-
-
-def run_fx_hmac_verification(plan: QueryPlan, combined_vecs: List[List[bytes]], combined_proofs: List[bytes], aui: dict, keys: tuple) -> bool:
+        cols = hash_positions(cell, m1, k_spa, hashing)
+        spa_checks.append((base_idx + s_off, cols, fingerprint(cell, byte_len * 8)))
+
+    vecs = _token_cells(combined_vecs, n, byte_len)
+
+    def _hits(rows: np.ndarray, checks: list) -> np.ndarray:
+        # (len(rows), len(checks)) booleans: decrypted cell == fingerprint
+        columns = sorted({c for _, cols, _ in checks for c in cols})
+        col_pos = {c: i for i, c in enumerate(columns)}
+        selections = [[col_pos[c] for c in cols] for _, cols, _ in checks]
+        targets = [_as_words(np.frombuffer(fp, dtype=np.uint8)) for _, _, fp in checks]
+        out = np.empty((len(rows), len(checks)), dtype=bool)
+        for r0 in range(0, len(rows), _DECRYPT_ROWS):
+            chunk = rows[r0:r0 + _DECRYPT_ROWS]
+            cells = source.cells(chunk, columns)
+            for c_idx, (t_idx, _, _) in enumerate(checks):
+                plain = vecs[t_idx, chunk] ^ np.bitwise_xor.reduce(cells[:, selections[c_idx]], axis=1)
+                out[r0:r0 + len(chunk), c_idx] = _as_words(plain) == targets[c_idx]
+        return out
+
+    alive = np.arange(n)
+    for check in kw_checks:
+        if not alive.size:
+            break
+        alive = alive[_hits(alive, [check])[:, 0]]
+    if spa_checks and alive.size:
+        alive = alive[_hits(alive, spa_checks).any(axis=1)]
+
+    mask = np.zeros(n, dtype=bool)
+    mask[alive] = True
+    return np.packbits(mask, bitorder='little')
+
+
+def decrypt_matches(plan: QueryPlan, combined_vecs, aui: dict, keys: tuple,
+                    pads: PadTable | None = None) -> Tuple[List[bool], List]:
+    n = len(aui["ids"])
+    final_ok = np.unpackbits(match_mask(plan, combined_vecs, aui, keys, pads), count=n, bitorder='little').astype(bool)
+    hits = [aui["ids"][i] for i in np.flatnonzero(final_ok)]
+    return final_ok.tolist(), hits
+
+
+def run_fx_hmac_verification(plan: QueryPlan, combined_vecs: List[List[bytes]], combined_proofs: List[bytes], aui: dict, keys: tuple,
+                             pads: PadTable | None = None, verifier: Verifier | None = None,
+                             rounds: int | None = None) -> bool:
+    """FX+HMAC check of one plan's combined result; ``rounds`` enables randomized batch verification."""
     tokens_override = [tok for _, tok in plan.tokens]
+    if pads is not None:
+        pads.check(aui, keys)
+    if verifier is not None:
+        return verifier.verify(tokens_override, combined_vecs, combined_proofs, rounds=rounds)
     return verify_fx_hmac(
         plan.query,
         aui,
@@ -218,4 +359,23 @@ def run_fx_hmac_verification(plan: QueryPlan, combined_vecs: List[List[bytes]],
         combined_vecs,
         combined_proofs,
         tokens_override=tokens_override,
+        pads=pads,
+        rounds=rounds,
     )
+
+
+def run_batch_verification(plans: Sequence[QueryPlan], results: Sequence[Tuple[List[List[bytes]], List[bytes]]],
+                           aui: dict, keys: tuple, pads: PadTable | None = None,
+                           verifier: Verifier | None = None, rounds: int | None = None) -> List[bool]:
+    """Verify the ``(combined_vecs, combined_proofs)`` of several plans in one pass; one bool per plan.
+
+    Pass a long-lived ``verifier`` (``Verifier(aui, keys, pads)``) to reuse its per-record
+    state across calls; otherwise one is built for this batch.  ``rounds`` replaces the
+    per-token checks of the whole batch by that many random-subset checks.
+    """
+    if verifier is None:
+        if pads is not None:
+            pads.check(aui, keys)
+        verifier = Verifier(aui, keys, pads)
+    items = [([tok for _, tok in plan.tokens], vecs, proofs) for plan, (vecs, proofs) in zip(plans, results)]
+    return verifier.verify_many(items, rounds=rounds)
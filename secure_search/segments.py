@@ -0,0 +1,291 @@
+"""Updatable authenticated index built from immutable segments (LSM style).
+
+Each segment is an ordinary authenticated index produced by ``Setup`` over a batch of
+records, so it has its own keys, key-derivation prefix, ``cat_ids`` term and sigma.
+Appends add a segment, deletes add tombstones, and compaction merges segments into
+one, so update cost is proportional to the change rather than the dataset.
+
+On disk (``root``)::
+
+    segments.json        public manifest (config, live segment files) shared with CSPs
+    K_segments.pkl       owner/client secrets: per-segment keys and tombstones
+    seg-000001.idx ...   one binary index (see index_format) per segment
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from SetupProcess import Setup
+
+from .index_format import read_index, write_index
+from .pad_table import DerivedPads
+from .query import QueryPlan, combine_csp_responses, decrypt_matches, run_fx_hmac_verification
+
+MANIFEST_NAME = "segments.json"
+SECRETS_NAME = "K_segments.pkl"
+# Rows decrypted per pass while compacting; bounds the pad buffer.
+_COMPACT_ROWS = 4096
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def load_segment_manifest(root: str | Path) -> dict:
+    """Read the public manifest of a segmented index directory."""
+    with (Path(root) / MANIFEST_NAME).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_segment_auis(root: str | Path, manifest: dict | None = None) -> List[Tuple[str, dict]]:
+    """Open every live segment listed in the manifest as ``(segment_id, aui)`` pairs."""
+    root = Path(root)
+    manifest = manifest or load_segment_manifest(root)
+    return [(seg["id"], read_index(root / seg["file"])) for seg in manifest["segments"]]
+
+
+@dataclass
+class SegmentSecrets:
+    keys: Dict[str, tuple] = field(default_factory=dict)
+    tombstones: Dict[str, Set] = field(default_factory=dict)
+
+
+class SegmentedIndex:
+    """Owner/client handle on a segmented index directory."""
+
+    def __init__(self, root: str | Path, manifest: dict, secrets: SegmentSecrets) -> None:
+        self.root = Path(root)
+        self.manifest = manifest
+        self.secrets = secrets
+        self._lock = threading.RLock()
+        self._auis: Dict[str, dict] = {}
+
+    # -- persistence -----------------------------------------------------
+    @classmethod
+    def create(cls, root: str | Path, config: dict) -> "SegmentedIndex":
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        manifest = {"generation": 0, "next_segment": 1, "config": config, "segments": []}
+        index = cls(root, manifest, SegmentSecrets())
+        index._save()
+        return index
+
+    @classmethod
+    def open(cls, root: str | Path) -> "SegmentedIndex":
+        root = Path(root)
+        with (root / SECRETS_NAME).open("rb") as f:
+            secrets = pickle.load(f)
+        return cls(root, load_segment_manifest(root), secrets)
+
+    def _save(self) -> None:
+        # secrets first: a manifest must never reference a segment without keys
+        _write_atomic(self.root / SECRETS_NAME, pickle.dumps(self.secrets))
+        body = json.dumps(self.manifest, indent=2, sort_keys=True).encode("utf-8")
+        _write_atomic(self.root / MANIFEST_NAME, body)
+
+    @property
+    def config(self) -> dict:
+        return self.manifest["config"]
+
+    def segment_ids(self) -> List[str]:
+        return [seg["id"] for seg in self.manifest["segments"]]
+
+    def segment_aui(self, seg_id: str) -> dict:
+        aui = self._auis.get(seg_id)
+        if aui is None:
+            seg = next(s for s in self.manifest["segments"] if s["id"] == seg_id)
+            aui = self._auis[seg_id] = read_index(self.root / seg["file"])
+        return aui
+
+    def segments(self) -> List[Tuple[str, dict, tuple, Set]]:
+        """Live segments as ``(segment_id, aui, keys, tombstoned ids)``."""
+        with self._lock:
+            return [
+                (seg_id, self.segment_aui(seg_id), self.secrets.keys[seg_id],
+                 set(self.secrets.tombstones.get(seg_id, ())))
+                for seg_id in self.segment_ids()
+            ]
+
+    def plan_aui(self) -> dict:
+        """Metadata used to plan queries (identical across segments)."""
+        ids = self.segment_ids()
+        if not ids:
+            raise ValueError("segmented index has no segments")
+        return self.segment_aui(ids[0])
+
+    # -- updates ---------------------------------------------------------
+    def _write_segment(self, records: Sequence, workers: int | None) -> Tuple[dict, tuple]:
+        with self._lock:
+            seg_no = self.manifest["next_segment"]
+            self.manifest["next_segment"] = seg_no + 1
+        seg_id = f"seg-{seg_no:06d}"
+        aui, keys = Setup(list(records), self.config, workers=workers)
+        write_index(self.root / f"{seg_id}.idx", aui)
+        return {"id": seg_id, "file": f"{seg_id}.idx", "n": len(aui["ids"])}, keys
+
+    def append(self, records: Sequence, workers: int | None = None) -> str:
+        """Index ``records`` (as produced by convert_dataset) into a new segment."""
+        if not records:
+            raise ValueError("append needs at least one record")
+        entry, keys = self._write_segment(records, workers)
+        with self._lock:
+            self.secrets.keys[entry["id"]] = keys
+            self.manifest["segments"].append(entry)
+            self.manifest["generation"] += 1
+            self._save()
+        return entry["id"]
+
+    def delete(self, ids: Iterable) -> int:
+        """Tombstone every live occurrence of ``ids``; return the number of rows hidden."""
+        wanted = {str(x) for x in ids}
+        hidden = 0
+        with self._lock:
+            for seg_id, aui, _, dead in self.segments():
+                for obj_id in aui["ids"]:
+                    if str(obj_id) in wanted and obj_id not in dead:
+                        self.secrets.tombstones.setdefault(seg_id, set()).add(obj_id)
+                        dead.add(obj_id)
+                        hidden += 1
+            if hidden:
+                self.manifest["generation"] += 1
+                self._save()
+        return hidden
+
+    def _live_records(self, seg_id: str, aui: dict, keys: tuple, dead: Set) -> List[SimpleNamespace]:
+        """Decrypt a segment's live rows back to raw GBF cells for re-indexing.
+
+        Rows are decrypted a block at a time: the pads of every column come from
+        ``DerivedPads`` and are XORed onto the ``(rows, m1 + m2, byte_len)`` slice of
+        both matrices in one go.
+        """
+        m1 = int(aui["m1"])
+        byte_len = int(aui["segment_length"])
+        matrices = (np.asarray(aui["I_spa"]["Ebp"]), np.asarray(aui["I_tex"]["EbW"]))
+        pads = DerivedPads(aui, keys[0])
+        columns = np.arange(int(aui["m1"]) + int(aui["m2"]))
+        ids = aui["ids"]
+        live = [row for row, obj_id in enumerate(ids) if obj_id not in dead]
+        out = []
+        for start in range(0, len(live), _COMPACT_ROWS):
+            rows = live[start:start + _COMPACT_ROWS]
+            enc = np.concatenate([matrix[:, rows] for matrix in matrices]).transpose(1, 0, 2)
+            raw = enc ^ pads.cells(rows, columns)
+            for row, cells in zip(rows, raw):
+                blob = cells.tobytes()
+                cells = [blob[k:k + byte_len] for k in range(0, len(blob), byte_len)]
+                out.append(SimpleNamespace(
+                    id=ids[row],
+                    spatial_gbf=SimpleNamespace(array=cells[:m1]),
+                    keyword_gbf=SimpleNamespace(array=cells[m1:]),
+                ))
+        return out
+
+    def compact(self, segment_ids: Sequence[str] | None = None, workers: int | None = None) -> str | None:
+        """Merge segments (default: all) into one, dropping tombstoned rows.
+
+        Updates made while compaction runs are kept: new segments are untouched and
+        tombstones added to the merged segments are carried over by id.
+        """
+        with self._lock:
+            chosen = list(segment_ids) if segment_ids is not None else self.segment_ids()
+            snapshot = [s for s in self.segments() if s[0] in chosen]
+        if len(snapshot) < 2 and not any(dead for *_, dead in snapshot):
+            return None
+        records: List[SimpleNamespace] = []
+        for seg_id, aui, keys, dead in snapshot:
+            records.extend(self._live_records(seg_id, aui, keys, dead))
+        entry, keys = self._write_segment(records, workers) if records else (None, None)
+
+        with self._lock:
+            late_deletes = set()
+            for seg_id, _, _, dead in snapshot:
+                late_deletes |= set(self.secrets.tombstones.get(seg_id, ())) - dead
+            merged_ids = {seg_id for seg_id, *_ in snapshot}
+            segs = self.manifest["segments"]
+            pos = min(i for i, s in enumerate(segs) if s["id"] in merged_ids)
+            remaining = [s for s in segs if s["id"] not in merged_ids]
+            if entry is not None:
+                remaining.insert(pos, entry)
+                self.secrets.keys[entry["id"]] = keys
+                if late_deletes:
+                    self.secrets.tombstones[entry["id"]] = late_deletes
+            self.manifest["segments"] = remaining
+            self.manifest["generation"] += 1
+            for seg_id in merged_ids:
+                self.secrets.keys.pop(seg_id, None)
+                self.secrets.tombstones.pop(seg_id, None)
+                self._auis.pop(seg_id, None)
+            self._save()
+        for seg_id in merged_ids:
+            try:
+                os.remove(self.root / f"{seg_id}.idx")
+            except OSError:
+                pass
+        return entry["id"] if entry else None
+
+    def compact_in_background(self, **kwargs) -> threading.Thread:
+        """Run ``compact`` on a daemon thread; appends and deletes stay available."""
+        thread = threading.Thread(target=self.compact, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+
+def evaluate_segments(evaluators: Sequence[Tuple[str, object]], tokens: Sequence[dict], lam: int):
+    """CSP side: evaluate one token payload over every segment.
+
+    Returns ``[(segment_id, result_blobs, proof_blobs), ...]`` in manifest order.
+    """
+    out = []
+    for seg_id, evaluator in evaluators:
+        vecs, proofs = evaluator.evaluate(tokens, lam)
+        out.append((seg_id, vecs, proofs))
+    return out
+
+
+def evaluate_segments_batch(evaluators: Sequence[Tuple[str, object]], queries: Sequence[Sequence[dict]], lam: int):
+    """CSP side: ``evaluate_segments`` for many queries, one sweep per segment.
+
+    Returns one ``[(segment_id, result_blobs, proof_blobs), ...]`` list per query.
+    """
+    out = [[] for _ in queries]
+    for seg_id, evaluator in evaluators:
+        for per_query, (vecs, proofs) in zip(out, evaluator.evaluate_batch(queries, lam)):
+            per_query.append((seg_id, vecs, proofs))
+    return out
+
+
+def combine_segment_responses(plan: QueryPlan, responses: List[dict], index: SegmentedIndex) -> Tuple[List, bool]:
+    """Client side: combine, decrypt and verify each segment's shares.
+
+    ``responses`` are the per-party ``/eval`` bodies of a segmented CSP, each holding a
+    ``segments`` list.  Every live segment must be answered by every party, otherwise
+    verification fails (a CSP cannot silently drop a segment).  Returns
+    ``(hits, verified)`` with tombstoned rows removed.
+    """
+    hits: List = []
+    verified = True
+    for seg_id, aui, keys, dead in index.segments():
+        party_resps = []
+        for resp in responses:
+            seg_resp = next((s for s in resp.get("segments", []) if s.get("segment") == seg_id), None)
+            if seg_resp is None:
+                return [], False
+            party_resps.append(seg_resp)
+        combined_vecs, combined_proofs = combine_csp_responses(plan, party_resps, aui)
+        _, seg_hits = decrypt_matches(plan, combined_vecs, aui, keys)
+        verified &= bool(run_fx_hmac_verification(plan, combined_vecs, combined_proofs, aui, keys))
+        hits.extend(h for h in seg_hits if h not in dead)
+    return hits, verified
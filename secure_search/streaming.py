@@ -0,0 +1,199 @@
+"""Streaming, bounded-memory construction of binary authenticated indexes."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import pickle
+import shutil
+import tempfile
+from collections import deque
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from config_loader import load_config
+import prepare_dataset
+from convert_dataset import encode_batch
+from SetupProcess import derive_Kv, encrypt_shard, index_params
+
+from .index_format import block_layout, encode_ids, write_header
+
+# Kv's key-derivation prefix is sized for this many records, since n is unknown up front.
+DEFAULT_CAPACITY = 2 ** 32
+
+_TRANSPOSE_BYTES = 32 * 1024 * 1024
+
+
+def _shard_task(args):
+    return encrypt_shard(*args)
+
+
+class StreamingIndexBuilder:
+    """Build an ``aui.idx`` file from a record stream with memory independent of n.
+
+    Encrypted rows are appended to a row-major spill file as they are produced; only
+    the ``(m1 + m2)`` sigma accumulators and per-column ``HMAC(Kh, j || cat_ids)``
+    states stay resident.  ``finish`` transposes the spill into the column-major
+    blocks of the binary format chunk by chunk.
+    """
+
+    def __init__(self, out_path: str | Path, config: dict, *, capacity: int = DEFAULT_CAPACITY,
+                 batch_size: int = 1024, workers: int | None = None) -> None:
+        self.out_path = Path(out_path)
+        self.config = config
+        self.params = index_params(config)
+        self.m1 = int(self.params["m1"])
+        self.m2 = int(self.params["m2"])
+        self.lam = int(self.params["security_param"])
+        self.byte_len = int(self.params["segment_length"])
+        self.psi = config["keyword_bloom_filter"]["psi"]
+        self.batch_size = max(1, int(batch_size))
+        self.workers = int(workers or 1)
+
+        # Keys (same roles as in Setup)
+        self.Ke = os.urandom(self.lam)
+        self.Kh = os.urandom(self.lam)
+        K_main = os.urandom(self.lam)
+        self.Kv = derive_Kv(K_main, config["s"], capacity, self.lam)
+
+        self.n = 0
+        self.sigma_acc = [0] * (self.m1 + self.m2)
+        self.column_macs = [
+            hmac.new(self.Kh, str(j + 1).encode('utf-8'), hashlib.sha256)
+            for j in range(self.m1 + self.m2)
+        ]
+
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self._spill_dir = tempfile.mkdtemp(prefix=".aui-build-", dir=self.out_path.parent)
+        self._rows_path = Path(self._spill_dir) / "rows.bin"
+        self._ids_path = Path(self._spill_dir) / "ids.jsonl"
+        self._rows = self._rows_path.open("wb")
+        self._ids = self._ids_path.open("wb")
+
+    def _absorb(self, rows: list, shard) -> None:
+        """Write one encrypted shard and fold its sigma partial sums and ids."""
+        Ispa, Itex, acc = shard
+        for spa_cells, tex_cells in zip(Ispa, Itex):
+            self._rows.write(b"".join(spa_cells))
+            self._rows.write(b"".join(tex_cells))
+        for j, val in enumerate(acc):
+            self.sigma_acc[j] ^= val
+        ids = [obj_id for obj_id, _, _ in rows]
+        cat_ids = "".join(str(x) for x in ids).encode('utf-8')
+        for mac in self.column_macs:
+            mac.update(cat_ids)
+        self._ids.write(encode_ids(ids))
+
+    def _batches(self, records: Iterable):
+        batch: List[tuple] = []
+        for obj in records:
+            batch.append((obj.id, list(obj.spatial_gbf.array), list(obj.keyword_gbf.array)))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def add(self, records: Iterable) -> None:
+        """Consume records exposing ``id``, ``spatial_gbf.array`` and ``keyword_gbf.array``."""
+        args = (self.Ke, self.Kv, self.m1, self.m2, self.psi, self.lam)
+        if self.workers <= 1:
+            for rows in self._batches(records):
+                self._absorb(rows, encrypt_shard(self.n + 1, rows, *args))
+                self.n += len(rows)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        # keep a bounded number of shards in flight so memory stays independent of n
+        pending: deque = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for rows in self._batches(records):
+                pending.append((rows, pool.submit(_shard_task, (self.n + 1, rows) + args)))
+                self.n += len(rows)
+                while len(pending) >= 2 * self.workers:
+                    done_rows, fut = pending.popleft()
+                    self._absorb(done_rows, fut.result())
+            while pending:
+                done_rows, fut = pending.popleft()
+                self._absorb(done_rows, fut.result())
+
+    def keys(self) -> tuple:
+        return (self.Ke, self.Kv, self.Kh)
+
+    def finish(self) -> Tuple[Path, tuple]:
+        """Write the binary index and return ``(path, (Ke, Kv, Kh))``."""
+        self._rows.close()
+        self._ids.close()
+        try:
+            self._write_index()
+        finally:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+        return self.out_path, self.keys()
+
+    def _write_index(self) -> None:
+        n, m1, m2 = self.n, self.m1, self.m2
+        byte_len, lam = self.byte_len, self.lam
+        layout = block_layout(n, m1, m2, byte_len, lam)
+        layout["ids"]["length"] = self._ids_path.stat().st_size
+        header = {"n": n, "meta": self.params, "blocks": layout}
+
+        sigma = np.empty((m1 + m2, lam), dtype=np.uint8)
+        for j, (acc, mac) in enumerate(zip(self.sigma_acc, self.column_macs)):
+            tag = acc ^ int.from_bytes(mac.digest()[:lam], 'big')
+            sigma[j] = np.frombuffer(tag.to_bytes(lam, 'big'), dtype=np.uint8)
+
+        with self.out_path.open("wb") as f:
+            header_size = write_header(f, header)
+            f.truncate(header_size + layout["ids"]["offset"] + layout["ids"]["length"])
+            f.seek(header_size + layout["I_spa.sigma"]["offset"])
+            f.write(sigma[:m1].tobytes())
+            f.seek(header_size + layout["I_tex.sigma"]["offset"])
+            f.write(sigma[m1:].tobytes())
+            f.seek(header_size + layout["ids"]["offset"])
+            with self._ids_path.open("rb") as ids_f:
+                shutil.copyfileobj(ids_f, f)
+
+        if n == 0:
+            return
+        m = m1 + m2
+        spill = np.memmap(self._rows_path, dtype=np.uint8, mode="r", shape=(n, m, byte_len))
+        out_spa = np.memmap(self.out_path, dtype=np.uint8, mode="r+", shape=(m1, n, byte_len),
+                            offset=header_size + layout["I_spa.Ebp"]["offset"])
+        out_tex = np.memmap(self.out_path, dtype=np.uint8, mode="r+", shape=(m2, n, byte_len),
+                            offset=header_size + layout["I_tex.EbW"]["offset"])
+        step = max(1, _TRANSPOSE_BYTES // (m * byte_len))
+        for r0 in range(0, n, step):
+            block = np.asarray(spill[r0:r0 + step])
+            out_spa[:, r0:r0 + len(block)] = block[:, :m1].transpose(1, 0, 2)
+            out_tex[:, r0:r0 + len(block)] = block[:, m1:].transpose(1, 0, 2)
+        out_spa.flush()
+        out_tex.flush()
+        del spill, out_spa, out_tex
+
+
+def build_streaming_index(records: Iterable, config: dict, out_path: str | Path, **kwargs) -> Tuple[Path, tuple]:
+    """Stream ``records`` into a binary index at ``out_path``; return ``(path, keys)``."""
+    builder = StreamingIndexBuilder(out_path, config, **kwargs)
+    builder.add(records)
+    return builder.finish()
+
+
+def build_streaming_index_from_csv(csv_path: str, config_path: str, output_dir: str | Path, *,
+                                   chunksize: int = 10000, **kwargs) -> Tuple[Path, Path]:
+    """Build ``aui.idx`` and ``K.pkl`` from a CSV without materialising the dataset."""
+    cfg = load_config(config_path)
+    records = (
+        rec
+        for batch in prepare_dataset.iter_record_batches(csv_path, chunksize=chunksize)
+        for rec in encode_batch(batch, cfg)
+    )
+    out_dir = Path(output_dir)
+    aui_path, keys = build_streaming_index(records, cfg, out_dir / "aui.idx", **kwargs)
+    key_path = out_dir / "K.pkl"
+    with key_path.open("wb") as f:
+        pickle.dump(keys, f)
+    return aui_path, key_path
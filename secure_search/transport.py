@@ -0,0 +1,289 @@
+"""Client transport to the CSP parties: concurrent fan-out and pooled connections.
+
+A query needs a reply from every party, so its latency is that of the slowest party
+rather than the sum of all of them once the requests are sent concurrently.  Each
+party may have its own timeout, and an overall deadline bounds the whole round;
+parties that miss their limit are reported as timed out instead of blocking the
+caller.  A ``CSPSession`` keeps HTTP/1.1 connections to the parties open between
+queries so interactive use does not pay a TCP handshake per request.
+"""
+
+from __future__ import annotations
+
+import http.client
+import io
+import threading
+import time
+import urllib.error
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from . import wire
+
+
+@dataclass
+class PartyResult:
+    party: int
+    endpoint: str
+    reply: dict | None = None
+    error: BaseException | None = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FanoutResult:
+    parties: List[PartyResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(p.ok for p in self.parties)
+
+    @property
+    def latencies(self) -> List[float]:
+        return [p.latency for p in self.parties]
+
+    def replies(self) -> List[dict]:
+        """Replies in party order; raises ``FanoutError`` if any party failed."""
+        if not self.ok:
+            raise FanoutError(self)
+        return [p.reply for p in self.parties]
+
+
+class FanoutError(RuntimeError):
+    def __init__(self, result: FanoutResult) -> None:
+        failed = [p for p in result.parties if not p.ok]
+        detail = "; ".join(f"party {p.party} ({p.endpoint}): {p.error}" for p in failed)
+        super().__init__(f"{len(failed)} of {len(result.parties)} CSP parties failed: {detail}")
+        self.result = result
+
+
+def _limits(count: int, party_timeout, deadline: float | None) -> List[float | None]:
+    if party_timeout is None or isinstance(party_timeout, (int, float)):
+        party_timeout = [party_timeout] * count
+    if len(party_timeout) != count:
+        raise ValueError(f"expected {count} party timeouts, got {len(party_timeout)}")
+    return [min((t for t in (pt, deadline) if t is not None), default=None) for pt in party_timeout]
+
+
+def fan_out(endpoints: Sequence[str], send: Callable[[int, str, float | None], dict], *,
+            party_timeout: float | Sequence[float | None] | None = None,
+            deadline: float | None = None,
+            on_reply: Callable[[int, dict], None] | None = None) -> FanoutResult:
+    """Call ``send(party, endpoint, timeout)`` for every party concurrently.
+
+    ``party_timeout`` (one value or one per party) and ``deadline`` are in seconds
+    from the start of the round; a party's effective limit is the smaller of the two
+    and is also passed to ``send`` as its socket timeout.  ``on_reply(party, reply)``
+    runs on the calling thread as each reply arrives (e.g. ``ShareCombiner.add``),
+    overlapping client work with the parties still in flight; an exception it raises
+    is recorded as that party's error.  Never raises for a party failure: check
+    ``FanoutResult.ok`` or call ``replies()``.
+    """
+    limits = _limits(len(endpoints), party_timeout, deadline)
+    result = FanoutResult([PartyResult(party, endpoint) for party, endpoint in enumerate(endpoints)])
+    if not endpoints:
+        return result
+
+    # written by the worker threads; read only for parties that finished in time
+    started: dict = {}
+    ended: dict = {}
+
+    def call(party: int):
+        started[party] = time.perf_counter()
+        try:
+            return send(party, endpoints[party], limits[party])
+        finally:
+            ended[party] = time.perf_counter()
+
+    start = time.perf_counter()
+    # one thread per party so every request leaves at once
+    pool = ThreadPoolExecutor(max_workers=len(endpoints), thread_name_prefix='csp-fanout')
+    try:
+        pending = {pool.submit(call, party): party for party in range(len(endpoints))}
+        while pending:
+            due = [start + limits[p] for p in pending.values() if limits[p] is not None]
+            timeout = max(0.0, min(due) - time.perf_counter()) if due else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                party = pending.pop(fut)
+                entry = result.parties[party]
+                entry.latency = ended[party] - started[party]
+                try:
+                    entry.reply = fut.result()
+                    if on_reply is not None:
+                        on_reply(party, entry.reply)
+                except Exception as e:
+                    entry.error = e
+            now = time.perf_counter()
+            for fut, party in list(pending.items()):
+                if limits[party] is not None and now >= start + limits[party]:
+                    del pending[fut]
+                    fut.cancel()
+                    entry = result.parties[party]
+                    entry.error = TimeoutError(f"no reply within {limits[party]:g}s")
+                    entry.latency = now - start
+    finally:
+        # a timed-out request is left to its socket timeout rather than waited for
+        pool.shutdown(wait=False)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def eval_all(endpoints: Sequence[str], payloads: Sequence[Sequence[dict]], security_param: int, *,
+             wire_format: str = "binary", party_timeout=None, deadline: float | None = None,
+             session: "CSPSession | None" = None, on_reply=None) -> FanoutResult:
+    """Send each party its ``/eval`` tokens (``payloads[party]``) concurrently."""
+    def send(party: int, base: str, timeout: float | None) -> dict:
+        return wire.post_eval(base.rstrip("/") + "/eval", payloads[party], security_param,
+                              party_id=party, wire=wire_format, timeout=timeout, session=session)
+    return fan_out(endpoints, send, party_timeout=party_timeout, deadline=deadline, on_reply=on_reply)
+
+
+def eval_batch_all(endpoints: Sequence[str], payloads: Sequence[Sequence[Sequence[dict]]], security_param: int, *,
+                   wire_format: str = "binary", party_timeout=None, deadline: float | None = None,
+                   session: "CSPSession | None" = None, on_reply=None) -> FanoutResult:
+    """Send each party its ``/eval_batch`` queries (``payloads[party]``) concurrently."""
+    def send(party: int, base: str, timeout: float | None) -> dict:
+        return wire.post_eval_batch(base.rstrip("/") + "/eval_batch", payloads[party], security_param,
+                                    party_id=party, wire=wire_format, timeout=timeout, session=session)
+    return fan_out(endpoints, send, party_timeout=party_timeout, deadline=deadline, on_reply=on_reply)
+
+
+# Idle connections are dropped after this many seconds, before the CSP's own
+# keep-alive timeout (15 s) closes them from the other end.
+IDLE_TIMEOUT = 10.0
+
+# Failures of a reused connection that mean the server closed it while it sat idle.
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                 ConnectionAbortedError, BrokenPipeError)
+
+
+class CSPSession:
+    """Persistent HTTP/1.1 connections to the CSP endpoints, reused across queries.
+
+    Thread-safe: a request borrows an idle connection to its host (or opens one) and
+    returns it once the response has been read, so concurrent fan-out to several
+    parties and back-to-back queries all reuse the same sockets.  A reused connection
+    that the server has already closed is replaced and the request retried once;
+    ``/eval`` and ``/eval_batch`` are read-only, so the retry is safe.  Connections idle
+    for longer than ``idle_timeout`` are closed instead of reused, so the session does
+    not keep sockets the server is about to time out.
+    """
+
+    def __init__(self, max_idle_per_host: int = 1, timeout: float | None = None,
+                 idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.max_idle_per_host = max(1, int(max_idle_per_host))
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        # (connection, time it was returned) per (scheme, netloc)
+        self._idle: Dict[Tuple[str, str], List[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._opened = 0
+        self._reused = 0
+        self._reconnects = 0
+        self._expired = 0
+
+    def _acquire(self, key: Tuple[str, str]) -> Tuple[http.client.HTTPConnection, bool]:
+        stale = []
+        try:
+            with self._lock:
+                self._requests += 1
+                idle = self._idle.get(key, [])
+                cutoff = time.monotonic() - self.idle_timeout
+                while idle:
+                    conn, since = idle.pop()
+                    if since >= cutoff:
+                        self._reused += 1
+                        return conn, True
+                    stale.append(conn)
+                self._expired += len(stale)
+                self._opened += 1
+        finally:
+            for conn in stale:
+                conn.close()
+        scheme, netloc = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(netloc, timeout=self.timeout), False
+
+    def _release(self, key: Tuple[str, str], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def post(self, url: str, data: bytes, headers: dict, timeout: float | None = None):
+        """POST ``data``; returns ``(body, response headers)``, raising ``HTTPError`` on 4xx/5xx."""
+        parts = urlsplit(url)
+        key = (parts.scheme or "http", parts.netloc)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        timeout = self.timeout if timeout is None else timeout
+        while True:
+            conn, reused = self._acquire(key)
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("POST", path, body=data, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except _STALE_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                with self._lock:
+                    self._reconnects += 1
+                continue
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            if resp.status >= 400:
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+            return body, resp.headers
+
+    def eval_all(self, endpoints: Sequence[str], payloads: Sequence[Sequence[dict]], security_param: int,
+                 **kwargs) -> FanoutResult:
+        return eval_all(endpoints, payloads, security_param, session=self, **kwargs)
+
+    def eval_batch_all(self, endpoints: Sequence[str], payloads: Sequence[Sequence[Sequence[dict]]],
+                       security_param: int, **kwargs) -> FanoutResult:
+        return eval_batch_all(endpoints, payloads, security_param, session=self, **kwargs)
+
+    def stats(self) -> dict:
+        """Connection-reuse counters since the session was created."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "connections_opened": self._opened,
+                "reused": self._reused,
+                "reconnects": self._reconnects,
+                "expired": self._expired,
+                "idle": sum(len(v) for v in self._idle.values()),
+                "reuse_rate": self._reused / self._requests if self._requests else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def __enter__(self) -> "CSPSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
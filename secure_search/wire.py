@@ -0,0 +1,340 @@
+"""Compact binary encoding of ``/eval`` requests and responses.
+
+JSON carries every per-object cell as its own base64 string; the binary format sends
+each token's ``n * byte_len`` share as one contiguous blob instead.  The format is
+negotiated per request through HTTP headers, and JSON remains the default so the
+endpoints stay easy to inspect by hand:
+
+* a request body in binary is sent with ``Content-Type: BINARY_CONTENT_TYPE``;
+* a binary reply is requested with ``Accept: BINARY_CONTENT_TYPE``.
+
+All integers are big-endian.  Request::
+
+    "SSRQ" u8 version  u16 security_param  u32 party_id (0xFFFFFFFF = none)  u32 tokens
+    per token:  u8 type (0 kw, 1 spa)  u16 buckets
+    per bucket: u16 ncols  ncols * u32 column  ceil(ncols / 8) bytes of packed bits (LSB first)
+
+Batch request (``/eval_batch``): ``"SSRB" u8 version u16 security_param u32 party_id
+u32 queries``, then per query ``u32 length`` and a complete request as above.
+
+Response (``kind`` 0 = single index, 1 = segmented, 2 = batch)::
+
+    "SSRS" u8 version  u8 kind
+    kind 0: body
+    kind 1: u64 generation  u32 segments, then per segment: u16 id length, id (utf-8), body
+    kind 2: u32 queries, then per query: u32 length, a complete kind 0 or 1 response
+    body:   u32 n  u16 byte_len  u16 lam  u32 tokens, then per token one frame:
+            u32 frame length  n * byte_len share  lam proof
+
+Decoded responses are dicts with ``result_blobs`` / ``proof_blobs`` (one ``bytes``
+per token) in place of the JSON ``result_shares`` / ``proof_shares`` lists.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import struct
+import urllib.request
+from typing import List, Sequence, Tuple
+
+JSON_CONTENT_TYPE = "application/json"
+BINARY_CONTENT_TYPE = "application/x-secure-search-shares"
+
+WIRE_FORMATS = ("binary", "json")
+# Every CSP response names the index version it was computed on in this header.
+INDEX_VERSION_HEADER = "X-Index-Version"
+
+VERSION = 1
+REQUEST_MAGIC = b"SSRQ"
+BATCH_REQUEST_MAGIC = b"SSRB"
+RESPONSE_MAGIC = b"SSRS"
+KIND_SINGLE = 0
+KIND_SEGMENTED = 1
+KIND_BATCH = 2
+_NO_PARTY = 0xFFFFFFFF
+
+_TOKEN_TYPES = {"kw": 0, "spa": 1}
+_TOKEN_NAMES = {v: k for k, v in _TOKEN_TYPES.items()}
+
+_REQ_HEAD = struct.Struct(">4sBHII")
+_RESP_HEAD = struct.Struct(">4sBB")
+_BODY_HEAD = struct.Struct(">IHHI")
+
+
+class WireError(ValueError):
+    """Raised for malformed or unsupported binary frames."""
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.view = memoryview(data)
+        self.pos = 0
+
+    def take(self, size: int) -> memoryview:
+        end = self.pos + size
+        if end > len(self.view):
+            raise WireError("truncated frame")
+        out = self.view[self.pos:end]
+        self.pos = end
+        return out
+
+    def unpack(self, fmt: struct.Struct) -> tuple:
+        return fmt.unpack(self.take(fmt.size))
+
+    def u16(self) -> int:
+        return int.from_bytes(self.take(2), "big")
+
+    def u32(self) -> int:
+        return int.from_bytes(self.take(4), "big")
+
+    def done(self) -> None:
+        if self.pos != len(self.view):
+            raise WireError("trailing bytes after frame")
+
+
+def wants_binary(accept: str | None) -> bool:
+    return bool(accept) and BINARY_CONTENT_TYPE in accept
+
+
+def is_binary(content_type: str | None) -> bool:
+    return bool(content_type) and content_type.split(";", 1)[0].strip() == BINARY_CONTENT_TYPE
+
+
+# -- requests ---------------------------------------------------------------
+
+def _pack_bits(bits: Sequence) -> bytes:
+    out = bytearray((len(bits) + 7) // 8)
+    for i, b in enumerate(bits):
+        if int(b):
+            out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+
+def _unpack_bits(data: memoryview, count: int) -> List[int]:
+    return [(data[i >> 3] >> (i & 7)) & 1 for i in range(count)]
+
+
+def encode_eval_request(tokens: Sequence[dict], security_param: int, party_id: int | None = None) -> bytes:
+    """Encode one party's token payload (as built by ``prepare_query_plan``)."""
+    parts = [_REQ_HEAD.pack(REQUEST_MAGIC, VERSION, int(security_param),
+                            _NO_PARTY if party_id is None else int(party_id), len(tokens))]
+    for tok in tokens:
+        buckets = tok.get("buckets", [])
+        parts.append(struct.pack(">BH", _TOKEN_TYPES[tok.get("type", "kw")], len(buckets)))
+        for binfo in buckets:
+            cols = binfo["columns"]
+            parts.append(struct.pack(f">H{len(cols)}I", len(cols), *cols))
+            parts.append(_pack_bits(binfo["bits"]))
+    return b"".join(parts)
+
+
+def decode_eval_request(data: bytes) -> dict:
+    """Inverse of ``encode_eval_request``; returns the JSON-shaped ``/eval`` payload."""
+    r = _Reader(data)
+    magic, version, lam, party, count = r.unpack(_REQ_HEAD)
+    if magic != REQUEST_MAGIC or version != VERSION:
+        raise WireError("not a binary eval request")
+    tokens = []
+    for _ in range(count):
+        typ, nb = r.unpack(struct.Struct(">BH"))
+        if typ not in _TOKEN_NAMES:
+            raise WireError(f"unknown token type {typ}")
+        buckets = []
+        for _ in range(nb):
+            ncols = r.u16()
+            cols = list(struct.unpack(f">{ncols}I", r.take(4 * ncols)))
+            bits = _unpack_bits(r.take((ncols + 7) // 8), ncols)
+            buckets.append({"columns": cols, "bits": bits})
+        tokens.append({"type": _TOKEN_NAMES[typ], "buckets": buckets})
+    r.done()
+    payload = {"tokens": tokens, "security_param": lam}
+    if party != _NO_PARTY:
+        payload["party_id"] = party
+    return payload
+
+
+def encode_batch_request(queries: Sequence[Sequence[dict]], security_param: int, party_id: int | None = None) -> bytes:
+    """Encode one party's token payloads for several queries (``/eval_batch``)."""
+    parts = [_REQ_HEAD.pack(BATCH_REQUEST_MAGIC, VERSION, int(security_param),
+                            _NO_PARTY if party_id is None else int(party_id), len(queries))]
+    for tokens in queries:
+        item = encode_eval_request(tokens, security_param)
+        parts.append(len(item).to_bytes(4, "big"))
+        parts.append(item)
+    return b"".join(parts)
+
+
+def decode_batch_request(data: bytes) -> dict:
+    """Inverse of ``encode_batch_request``; returns the JSON-shaped ``/eval_batch`` payload."""
+    r = _Reader(data)
+    magic, version, lam, party, count = r.unpack(_REQ_HEAD)
+    if magic != BATCH_REQUEST_MAGIC or version != VERSION:
+        raise WireError("not a binary batch request")
+    queries = [{"tokens": decode_eval_request(bytes(r.take(r.u32())))["tokens"]} for _ in range(count)]
+    r.done()
+    payload = {"queries": queries, "security_param": lam}
+    if party != _NO_PARTY:
+        payload["party_id"] = party
+    return payload
+
+
+def decode_request(body: bytes, content_type: str | None = None) -> dict:
+    """Decode an endpoint request body in either format."""
+    if is_binary(content_type):
+        if body[:4] == BATCH_REQUEST_MAGIC:
+            return decode_batch_request(body)
+        return decode_eval_request(body)
+    return json.loads(body.decode("utf-8"))
+
+
+# -- responses --------------------------------------------------------------
+
+def _encode_body(vec_blobs: Sequence[bytes], proof_blobs: Sequence[bytes], n: int, byte_len: int, lam: int) -> List[bytes]:
+    parts = [_BODY_HEAD.pack(n, byte_len, lam, len(vec_blobs))]
+    for vec, proof in zip(vec_blobs, proof_blobs):
+        if len(vec) != n * byte_len or len(proof) != lam:
+            raise WireError("share size does not match the response header")
+        parts.append((len(vec) + len(proof)).to_bytes(4, "big"))
+        parts.append(vec)
+        parts.append(proof)
+    return parts
+
+
+def _decode_body(r: _Reader) -> dict:
+    n, byte_len, lam, count = r.unpack(_BODY_HEAD)
+    vec_len = n * byte_len
+    result_blobs, proof_blobs = [], []
+    for _ in range(count):
+        frame = r.take(r.u32())
+        if len(frame) != vec_len + lam:
+            raise WireError("frame length does not match the response header")
+        result_blobs.append(bytes(frame[:vec_len]))
+        proof_blobs.append(bytes(frame[vec_len:]))
+    return {"n": n, "byte_len": byte_len, "result_blobs": result_blobs, "proof_blobs": proof_blobs}
+
+
+def encode_eval_response(vec_blobs: Sequence[bytes], proof_blobs: Sequence[bytes], n: int, byte_len: int, lam: int) -> bytes:
+    """Encode a single-index ``/eval`` reply (one frame per token)."""
+    return b"".join([_RESP_HEAD.pack(RESPONSE_MAGIC, VERSION, KIND_SINGLE)]
+                    + _encode_body(vec_blobs, proof_blobs, n, byte_len, lam))
+
+
+def encode_segmented_response(segments: Sequence[Tuple[str, Sequence[bytes], Sequence[bytes], int, int]],
+                              generation: int, lam: int) -> bytes:
+    """Encode a segmented reply from ``(segment_id, vec_blobs, proof_blobs, n, byte_len)`` tuples."""
+    parts = [_RESP_HEAD.pack(RESPONSE_MAGIC, VERSION, KIND_SEGMENTED),
+             struct.pack(">QI", int(generation or 0), len(segments))]
+    for seg_id, vecs, proofs, n, byte_len in segments:
+        raw_id = str(seg_id).encode("utf-8")
+        parts.append(len(raw_id).to_bytes(2, "big") + raw_id)
+        parts.extend(_encode_body(vecs, proofs, n, byte_len, lam))
+    return b"".join(parts)
+
+
+def encode_batch_response(replies: Sequence[bytes]) -> bytes:
+    """Wrap encoded per-query replies (kind 0 or 1) into one ``/eval_batch`` reply."""
+    parts = [_RESP_HEAD.pack(RESPONSE_MAGIC, VERSION, KIND_BATCH), len(replies).to_bytes(4, "big")]
+    for item in replies:
+        parts.append(len(item).to_bytes(4, "big"))
+        parts.append(item)
+    return b"".join(parts)
+
+
+def decode_eval_response(data: bytes) -> dict:
+    """Decode a binary ``/eval`` or ``/eval_batch`` reply."""
+    r = _Reader(data)
+    magic, version, kind = r.unpack(_RESP_HEAD)
+    if magic != RESPONSE_MAGIC or version != VERSION:
+        raise WireError("not a binary eval response")
+    if kind == KIND_SINGLE:
+        out = _decode_body(r)
+    elif kind == KIND_SEGMENTED:
+        generation, count = r.unpack(struct.Struct(">QI"))
+        segments = []
+        for _ in range(count):
+            seg_id = bytes(r.take(r.u16())).decode("utf-8")
+            segments.append({"segment": seg_id, **_decode_body(r)})
+        out = {"segments": segments, "generation": generation}
+    elif kind == KIND_BATCH:
+        out = {"results": [decode_eval_response(bytes(r.take(r.u32()))) for _ in range(r.u32())]}
+    else:
+        raise WireError(f"unknown response kind {kind}")
+    r.done()
+    return out
+
+
+def decode_response(body: bytes, content_type: str | None = None):
+    """Decode an endpoint reply in either format."""
+    if is_binary(content_type):
+        return decode_eval_response(body)
+    return json.loads(body.decode("utf-8"))
+
+
+def token_shares(resp: dict, t_idx: int) -> Tuple[bytes, bytes]:
+    """One token's ``(n * byte_len share, proof)`` from a decoded reply in either format."""
+    if "result_blobs" in resp:
+        return resp["result_blobs"][t_idx], resp["proof_blobs"][t_idx]
+    cells = resp["result_shares"][t_idx]
+    vec = b"".join(base64.b64decode(c) for c in cells)
+    return vec, base64.b64decode(resp["proof_shares"][t_idx])
+
+
+# -- client helper ------------------------------------------------------------
+
+def _post(url: str, binary: bytes, body: dict, party_id: int | None, wire: str, timeout: float | None,
+          session=None) -> dict:
+    """POST and decode; the reply gains ``index_version`` from the response header.
+
+    ``session`` is a ``transport.CSPSession`` whose pooled connections are used instead
+    of a fresh ``urllib`` connection per request.
+    """
+    if wire == "binary":
+        data = binary
+        headers = {"Content-Type": BINARY_CONTENT_TYPE, "Accept": BINARY_CONTENT_TYPE}
+    elif wire == "json":
+        if party_id is not None:
+            body["party_id"] = party_id
+        data = json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": JSON_CONTENT_TYPE}
+    else:
+        raise ValueError(f"unknown wire format: {wire}")
+    if session is not None:
+        raw, resp_headers = session.post(url, data, headers, timeout)
+    else:
+        req = urllib.request.Request(url, data=data, headers=headers)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            raw, resp_headers = resp.read(), resp.headers
+    reply = decode_response(raw, resp_headers.get("Content-Type"))
+    version = resp_headers.get(INDEX_VERSION_HEADER)
+    if version and isinstance(reply, dict):
+        reply.setdefault("index_version", version)
+    return reply
+
+
+def post_eval(url: str, tokens: Sequence[dict], security_param: int, party_id: int | None = None,
+              wire: str = "binary", timeout: float | None = None, session=None) -> dict:
+    """POST one party's tokens to a CSP ``/eval`` endpoint and decode the reply."""
+    binary = encode_eval_request(tokens, security_param, party_id) if wire == "binary" else b""
+    body = {"tokens": list(tokens), "security_param": security_param}
+    return _post(url, binary, body, party_id, wire, timeout, session)
+
+
+def eval_batch_all(endpoints: Sequence[str], payloads: Sequence[Sequence[Sequence[dict]]], security_param: int,
+                   wire: str = "binary", timeout: float | None = None, session=None) -> List[dict]:
+    """Send each party its batch (``payloads[party]``) to ``<endpoint>/eval_batch``, concurrently.
+
+    ``timeout`` applies per party; failures raise ``transport.FanoutError``.
+    """
+    from .transport import eval_batch_all as fan_out_batch  # transport builds on this module
+
+    return fan_out_batch(endpoints, payloads, security_param, wire_format=wire, party_timeout=timeout,
+                         session=session).replies()
+
+
+def post_eval_batch(url: str, queries: Sequence[Sequence[dict]], security_param: int, party_id: int | None = None,
+                    wire: str = "binary", timeout: float | None = None, session=None) -> dict:
+    """POST one party's payloads for several queries to ``/eval_batch``; reply holds ``results``."""
+    binary = encode_batch_request(queries, security_param, party_id) if wire == "binary" else b""
+    body = {"queries": [{"tokens": list(tokens)} for tokens in queries], "security_param": security_param}
+    return _post(url, binary, body, party_id, wire, timeout, session)
@@ -10,16 +10,11 @@ from SetupProcess import Setup, F
 from secure_search import prepare_query_plan, combine_csp_responses, decrypt_matches
 from verification import verify_fx_hmac
 from GBF import fingerprint
+from positions import hash_positions, index_hashing
 
 def bytes_xor(a: bytes, b: bytes) -> bytes:
     return bytes(x ^ y for x, y in zip(a, b))
 
-def hash_positions(item: str, size: int, k: int):
-    import hashlib
-    h1 = int(hashlib.sha256(item.encode("utf-8")).hexdigest(), 16)
-    h2 = int(hashlib.md5(item.encode("utf-8")).hexdigest(), 16)
-    return [(h1 + i * h2) % size for i in range(k)]
-
 def simulate_csp(aui, payload):
     lam = int(aui["security_param"])
     byte_len = int(aui["segment_length"])
@@ -68,7 +63,7 @@ kw_token_idx = 0
 kw_token = plan.tokens[kw_token_idx][1]
 m2 = int(aui["m2"])
 k_tex = int(aui.get("k_tex", 4))
-kw_positions = hash_positions(kw_token, m2, k_tex)
+kw_positions = hash_positions(kw_token, m2, k_tex, index_hashing(aui))
 
 responses = [
     simulate_csp(aui, plan.payloads[party_id])
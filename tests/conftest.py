@@ -0,0 +1,67 @@
+"""Shared fixtures: a small authenticated index built from the head of the bundled dataset."""
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for _p in (ROOT, os.path.join(ROOT, 'online_demo')):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import pytest  # noqa: E402
+
+from config_loader import load_config  # noqa: E402
+
+CONFIG_PATH = os.path.join(ROOT, 'conFig.ini')
+DATASET_PATH = os.path.join(ROOT, 'us-colleges-and-universities.csv')
+INDEX_ROWS = 120
+LAMBDA = 16
+
+
+@pytest.fixture(scope='session')
+def config():
+    return load_config(CONFIG_PATH)
+
+
+@pytest.fixture(scope='session')
+def small_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('data') / 'head.csv'
+    with open(DATASET_PATH, encoding='utf-8-sig') as src:
+        lines = [next(src) for _ in range(INDEX_ROWS + 1)]
+    path.write_text(''.join(lines), encoding='utf-8')
+    return path
+
+
+@pytest.fixture(scope='session')
+def small_index(small_csv, tmp_path_factory):
+    """(aui, keys) of the first INDEX_ROWS records, written and memory-mapped like a real index."""
+    from secure_search import build_index_from_csv, load_index_artifacts, save_index_artifacts
+
+    aui, keys = build_index_from_csv(str(small_csv), CONFIG_PATH)
+    aui_path, key_path = save_index_artifacts(aui, keys, tmp_path_factory.mktemp('index'))
+    return load_index_artifacts(aui_path, key_path)
+
+
+@pytest.fixture(scope='session')
+def evaluate(small_index):
+    """``evaluate(plan)`` -> every CSP party's reply to ``plan``, as the servers send it."""
+    from secure_search.csp_engine import make_evaluator
+
+    evaluator = make_evaluator(small_index[0])
+
+    def replies(plan):
+        return [dict(zip(('result_blobs', 'proof_blobs'), evaluator.evaluate(payload, plan.security_param)))
+                for payload in plan.payloads]
+    return replies
+
+
+@pytest.fixture
+def served(small_index):
+    """``small_index`` installed as the CSP server's index for the duration of a test."""
+    import csp_server
+
+    previous = csp_server.CSPState.snapshot
+    csp_server.CSPState.quiet = True
+    csp_server.install_index(small_index[0])
+    yield small_index[0]
+    csp_server.CSPState.snapshot = previous
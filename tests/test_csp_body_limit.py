@@ -0,0 +1,69 @@
+"""Oversized request bodies are refused with 413 before they are read."""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+import csp_async
+import csp_server
+
+LIMIT = 1024
+OVERSIZED = (b'POST /eval HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n'
+             b'Content-Length: %d\r\n\r\n' % (LIMIT + 1))
+
+
+def _reply(sock) -> bytes:
+    data = b''
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+
+@pytest.fixture
+def threaded_port():
+    csp_server.CSPState.quiet = True
+    srv = csp_server.make_server(0, threads=1, host='127.0.0.1', max_body=LIMIT)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_threaded_server_refuses_oversized_body(threaded_port):
+    with socket.create_connection(('127.0.0.1', threaded_port), timeout=5) as sock:
+        sock.sendall(OVERSIZED)  # the body never follows
+        reply = _reply(sock)
+    assert reply.startswith(b'HTTP/1.1 413')
+    assert b'byte limit' in reply
+
+
+def test_threaded_server_rejects_invalid_content_length(threaded_port):
+    with socket.create_connection(('127.0.0.1', threaded_port), timeout=5) as sock:
+        sock.sendall(b'POST /eval HTTP/1.1\r\nHost: x\r\nContent-Length: nope\r\n\r\n')
+        assert _reply(sock).startswith(b'HTTP/1.1 400')
+
+
+def test_async_server_refuses_oversized_body():
+    async def run():
+        server = csp_async.AsyncCSPServer(threads=1, max_body=LIMIT)
+        srv = await server.start('127.0.0.1', 0)
+        try:
+            port = srv.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(OVERSIZED)
+            await writer.drain()
+            reply = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return reply
+        finally:
+            server.close()
+
+    csp_server.CSPState.quiet = True
+    reply = asyncio.run(run())
+    assert reply.startswith(b'HTTP/1.1 413')
+    assert b'Connection: close' in reply
@@ -0,0 +1,83 @@
+"""Idle keep-alive connections must not hold the CSP server's worker threads."""
+
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for _p in (ROOT, os.path.join(ROOT, 'online_demo')):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import pytest  # noqa: E402
+
+import csp_server  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    csp_server.CSPState.quiet = True
+    srv = csp_server.make_server(0, threads=1, host='127.0.0.1')
+    srv.idle_timeout = 1.0
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _status(port: int, timeout: float = 5.0) -> dict:
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', '/index_status')
+        resp = conn.getresponse()
+        assert resp.status == 200
+        return json.loads(resp.read())
+    finally:
+        conn.close()
+
+
+def test_idle_keepalive_connection_does_not_block_other_clients(server):
+    port = server.server_address[1]
+    idle = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    idle.request('GET', '/index_status')
+    idle.getresponse().read()  # keep the connection open and send nothing more
+
+    start = time.perf_counter()
+    _status(port)
+    assert time.perf_counter() - start < 1.0
+
+    # the parked connection is still usable
+    idle.request('GET', '/index_status')
+    assert idle.getresponse().status == 200
+    idle.close()
+
+
+def test_pipelined_requests_are_all_answered(server):
+    port = server.server_address[1]
+    request = b'GET /index_status HTTP/1.1\r\nHost: x\r\n\r\n'
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        sock.sendall(request * 3)
+        data = b''
+        while data.count(b'HTTP/1.1 200') < 3:
+            chunk = sock.recv(65536)
+            assert chunk
+            data += chunk
+
+
+def test_idle_connections_are_closed_after_timeout(server):
+    port = server.server_address[1]
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.request('GET', '/index_status')
+    conn.getresponse().read()
+    deadline = time.monotonic() + 4
+    while server.idle_connections() != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.idle_connections() == 1
+    assert conn.sock.recv(1) == b''  # closed by the server after idle_timeout
+    assert server.idle_connections() == 0
+    conn.close()
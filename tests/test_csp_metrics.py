@@ -0,0 +1,67 @@
+"""CSP metrics: cache hit/miss counters survive index reloads."""
+
+import argparse
+import json
+import re
+
+import pytest
+
+import csp_server
+from secure_search import prepare_query_plan
+from secure_search.index_format import write_index
+
+
+def _metric(name: str) -> float:
+    text = csp_server.METRICS.render()
+    assert f'# TYPE {name} counter' in text
+    return float(re.search(rf'^{name} (\S+)$', text, re.M).group(1))
+
+
+def _eval(plan):
+    body = json.dumps({"tokens": plan.payloads[0], "security_param": plan.security_param}).encode()
+    status, _, _, _ = csp_server.handle_request('/eval', body, 'application/json')
+    assert status == 200
+
+
+@pytest.fixture
+def cache_budget():
+    yield
+    csp_server.CSPState.cache.resize(csp_server.CACHE_MB * 1024 * 1024)
+
+
+def test_cache_counters_survive_reload_and_publish(served, config, tmp_path, cache_budget):
+    plan = prepare_query_plan("UNIVERSITY FLORIDA", served, config)
+    hits, misses = _metric('csp_cache_hits_total'), _metric('csp_cache_misses_total')
+    _eval(plan)
+    _eval(plan)
+    assert _metric('csp_cache_hits_total') > hits
+    assert _metric('csp_cache_misses_total') > misses
+    hits, misses = _metric('csp_cache_hits_total'), _metric('csp_cache_misses_total')
+
+    # a reload with a new cache budget, as on SIGHUP, keeps the running totals
+    path = tmp_path / 'aui.idx'
+    write_index(path, served)
+    args = argparse.Namespace(backend='numpy', quiet=True, cache_mb=1.0, slow_ms=None, slow_log=None,
+                              segments=None, aui=str(path))
+    csp_server.load_from_args(args)
+    assert csp_server.CSPState.cache.max_bytes == 1024 * 1024
+    assert csp_server.CSPState.cache.stats()['entries'] == 0
+    assert _metric('csp_cache_hits_total') == hits
+    assert _metric('csp_cache_misses_total') == misses
+
+    _eval(plan)
+    csp_server.install_index(served)
+    assert _metric('csp_cache_misses_total') > misses
+    assert _metric('csp_cache_hits_total') >= hits
+
+
+def test_resize_evicts_to_the_new_budget():
+    cache = csp_server.AggregationCache(1000)
+    for i in range(5):
+        cache.put(('s', i), bytes(100), bytes(16))
+    assert cache.get(('s', 4)) is not None
+    cache.resize(250)
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['bytes'] <= 250
+    assert stats['evictions'] == 3 and stats['hits'] == 1
+    assert cache.get(('s', 4)) is not None  # the most recently used entry stays
@@ -0,0 +1,67 @@
+"""Owner-precomputed pad tables: same pads as derived from Ke, bound to one index and key."""
+
+import os
+
+import numpy as np
+import pytest
+
+from secure_search import combine_csp_responses, decrypt_matches, prepare_query_plan, run_fx_hmac_verification
+from secure_search.pad_table import DerivedPads, PadTable, build_pad_table
+
+
+@pytest.fixture(scope='module')
+def table_path(small_index, tmp_path_factory):
+    aui, keys = small_index
+    return build_pad_table(tmp_path_factory.mktemp('pads') / 'pads.tbl', aui, keys, rows_per_pass=7)
+
+
+@pytest.mark.parametrize('use_mmap', [True, False])
+def test_table_pads_equal_derived_pads(small_index, table_path, use_mmap):
+    aui, keys = small_index
+    table = PadTable.open(table_path, aui, keys, use_mmap=use_mmap)
+    derived = DerivedPads(aui, keys[0])
+    n, m = len(aui['ids']), aui['m1'] + aui['m2']
+    rows = [0, 1, 6, 7, 50, n - 1]
+    columns = [0, 3, aui['m1'] - 1, aui['m1'], m - 1]
+    assert np.array_equal(table.cells(rows, columns), derived.cells(rows, columns))
+    assert np.array_equal(table.cells(range(n), range(m)), derived.cells(range(n), range(m)))
+
+
+def test_table_gives_the_same_results(small_index, table_path, config, evaluate):
+    aui, keys = small_index
+    table = PadTable.open(table_path, aui, keys)
+    plan = prepare_query_plan("UNIVERSITY FLORIDA", aui, config)
+    vecs, proofs = combine_csp_responses(plan, evaluate(plan), aui)
+    assert decrypt_matches(plan, vecs, aui, keys, pads=table) == decrypt_matches(plan, vecs, aui, keys)
+    assert run_fx_hmac_verification(plan, vecs, proofs, aui, keys, pads=table)
+
+
+def test_table_for_another_key_is_rejected(small_index, table_path, config):
+    aui, keys = small_index
+    other_keys = (os.urandom(len(keys[0])),) + tuple(keys[1:])
+    with pytest.raises(ValueError, match='different encryption key'):
+        PadTable.open(table_path, aui, other_keys)
+    table = PadTable.open(table_path, aui)  # without keys only the index binding is checked
+    with pytest.raises(ValueError, match='different encryption key'):
+        decrypt_matches(prepare_query_plan("ORLANDO", aui, config), [], aui, other_keys, pads=table)
+
+
+def test_table_for_another_index_is_rejected(small_index, table_path):
+    aui, keys = small_index
+    sigma = list(aui['I_tex']['sigma'])
+    sigma[0] = bytes(len(sigma[0]))
+    changed = dict(aui, I_tex=dict(aui['I_tex'], sigma=sigma))
+    with pytest.raises(ValueError, match='stale pad table'):
+        PadTable.open(table_path, changed, keys)
+    resized = dict(aui, ids=list(aui['ids'])[:-1])
+    with pytest.raises(ValueError, match='shape'):
+        PadTable.open(table_path, resized, keys)
+
+
+def test_file_that_is_not_a_pad_table_is_rejected(small_index, tmp_path):
+    aui, keys = small_index
+    bogus = tmp_path / 'bogus.tbl'
+    bogus.write_bytes(b'not a pad table' * 10)
+    with pytest.raises(ValueError):
+        PadTable.open(bogus, aui, keys)
+
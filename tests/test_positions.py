@@ -0,0 +1,88 @@
+"""GBF position hashing: families, odd filter sizes and the position cache."""
+
+import copy
+
+import pytest
+
+import prepare_dataset
+from GBF import fingerprint
+from SetupProcess import Setup
+from convert_dataset import convert_dataset
+from positions import BLAKE2B_FAMILY, LEGACY_FAMILY, cache_clear, check_hashing, hash_positions
+from secure_search import combine_csp_responses, decrypt_matches, prepare_query_plan, run_fx_hmac_verification
+from secure_search.csp_engine import make_evaluator
+
+TOKENS = [f"token-{i}" for i in range(2000)] + ["ORLANDO", "CELL:57:-163"]
+
+
+def test_check_hashing_normalises_and_rejects():
+    assert check_hashing(None) == {"family": LEGACY_FAMILY, "key": ""}
+    assert check_hashing({"family": "BLAKE2B", "key": None}) == {"family": BLAKE2B_FAMILY, "key": ""}
+    with pytest.raises(ValueError):
+        check_hashing({"family": "md4"})
+    with pytest.raises(ValueError):
+        check_hashing({"family": BLAKE2B_FAMILY, "key": "k" * 65})
+
+
+@pytest.mark.parametrize("size", [2, 3, 7, 99, 101, 199, 200])
+@pytest.mark.parametrize("key", ["", "secret"])
+def test_blake2b_steps_never_collapse_onto_one_column(size, key):
+    hashing = {"family": BLAKE2B_FAMILY, "key": key}
+    for tok in TOKENS:
+        positions = hash_positions(tok, size, 4, hashing)
+        assert all(0 <= p < size for p in positions)
+        # the step is never a multiple of size, so neighbouring positions differ
+        assert all(a != b for a, b in zip(positions, positions[1:])), (tok, positions)
+    if size in (2, 3):
+        assert len({p for tok in TOKENS for p in hash_positions(tok, size, 4, hashing)}) == size
+
+
+def test_size_one_maps_everything_to_column_zero():
+    for family in (LEGACY_FAMILY, BLAKE2B_FAMILY):
+        assert hash_positions("ORLANDO", 1, 3, {"family": family}) == [0, 0, 0]
+
+
+def test_families_and_keys_give_different_positions():
+    cache_clear()
+    legacy = [hash_positions(tok, 199, 4) for tok in TOKENS[:50]]
+    assert legacy == [hash_positions(tok, 199, 4, {"family": LEGACY_FAMILY}) for tok in TOKENS[:50]]
+    plain = [hash_positions(tok, 199, 4, {"family": BLAKE2B_FAMILY}) for tok in TOKENS[:50]]
+    keyed = [hash_positions(tok, 199, 4, {"family": BLAKE2B_FAMILY, "key": "k"}) for tok in TOKENS[:50]]
+    assert plain != legacy and plain != keyed
+
+
+def _plain_matches(db, token, size, k, hashing):
+    """Records whose plaintext keyword GBF answers ``token``."""
+    positions = hash_positions(token, size, k, hashing)
+    target = fingerprint(token, len(db[0].keyword_gbf.array[0]) * 8)
+    out = []
+    for record in db:
+        acc = bytes(len(target))
+        for pos in positions:
+            acc = bytes(x ^ y for x, y in zip(acc, record.keyword_gbf.array[pos]))
+        if acc == target:
+            out.append(record.id)
+    return out
+
+
+def test_odd_sized_blake2b_index_round_trips(small_csv, config):
+    cfg = copy.deepcopy(config)
+    cfg["spatial_bloom_filter"]["size"] = 101
+    cfg["keyword_bloom_filter"]["size"] = 199
+    cfg["hashing"] = {"family": BLAKE2B_FAMILY, "key": "odd"}
+    db = convert_dataset(prepare_dataset.load_and_transform(str(small_csv))[:40], cfg)
+    aui, keys = Setup(db, cfg)
+    assert aui["hashing"] == {"family": BLAKE2B_FAMILY, "key": "odd"}
+
+    evaluator = make_evaluator(aui)
+    found = 0
+    for query in ("ORLANDO", "UNIVERSITY", "COLLEGE", "FL"):
+        plan = prepare_query_plan(query, aui, cfg)
+        replies = [dict(zip(("result_blobs", "proof_blobs"), evaluator.evaluate(payload, plan.security_param)))
+                   for payload in plan.payloads]
+        vecs, proofs = combine_csp_responses(plan, replies, aui)
+        _, hits = decrypt_matches(plan, vecs, aui, keys)
+        assert hits == _plain_matches(db, plan.keyword_tokens[0], 199, aui["k_tex"], aui["hashing"])
+        assert run_fx_hmac_verification(plan, vecs, proofs, aui, keys)
+        found += len(hits)
+    assert found
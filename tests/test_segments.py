@@ -0,0 +1,87 @@
+"""Segmented index: appends, tombstones and compaction keep query results intact."""
+
+import threading
+
+import pytest
+
+import prepare_dataset
+from convert_dataset import convert_dataset
+from secure_search import SegmentedIndex, combine_segment_responses, prepare_query_plan
+from secure_search.csp_engine import make_evaluator
+from secure_search.segments import evaluate_segments
+
+QUERIES = ["ORLANDO", "UNIVERSITY FLORIDA", "COLLEGE; R: 25,-90,45,-70"]
+ORLANDO_ID = 133872  # first record of the dataset
+
+
+@pytest.fixture(scope='module')
+def records(small_csv, config):
+    return convert_dataset(prepare_dataset.load_and_transform(str(small_csv)), config)
+
+
+def search(index, config):
+    """Hits and verification of every query, answered by local CSPs over the live segments."""
+    evaluators = [(seg_id, make_evaluator(aui)) for seg_id, aui, _, _ in index.segments()]
+    out = []
+    for query in QUERIES:
+        plan = prepare_query_plan(query, index.plan_aui(), config)
+        replies = []
+        for payload in plan.payloads:
+            results = evaluate_segments(evaluators, payload, plan.security_param)
+            replies.append({"segments": [{"segment": seg_id, "result_blobs": vecs, "proof_blobs": proofs}
+                                         for seg_id, vecs, proofs in results]})
+        hits, verified = combine_segment_responses(plan, replies, index)
+        out.append((sorted(map(str, hits)), verified))
+    return out
+
+
+def test_compaction_keeps_hits(tmp_path, records, config):
+    index = SegmentedIndex.create(tmp_path, config)
+    index.append(records[:50])
+    index.append(records[50:90])
+    index.append(records[90:])
+    assert index.delete([ORLANDO_ID]) == 1
+    before = search(index, config)
+    assert all(verified for _, verified in before)
+    assert str(ORLANDO_ID) not in before[0][0]
+    assert any(hits for hits, _ in before)
+
+    merged = index.compact()
+    assert index.segment_ids() == [merged]
+    assert index.segments()[0][3] == set()  # tombstoned rows are dropped, not carried
+    assert search(index, config) == before
+    assert search(SegmentedIndex.open(tmp_path), config) == before
+    assert sorted(tmp_path.glob('*.idx')) == [tmp_path / f'{merged}.idx']
+
+
+def test_updates_during_background_compaction_are_kept(tmp_path, records, config, monkeypatch):
+    index = SegmentedIndex.create(tmp_path, config)
+    first = index.append(records[:60])
+    second = index.append(records[60:100])
+
+    started, resume = threading.Event(), threading.Event()
+    live_records = index._live_records
+
+    def paused(*args):
+        started.set()
+        assert resume.wait(30)
+        return live_records(*args)
+
+    monkeypatch.setattr(index, '_live_records', paused)
+    thread = index.compact_in_background(segment_ids=[first, second])
+    assert started.wait(30)
+    late = index.append(records[100:])       # a segment written while compacting
+    assert index.delete([ORLANDO_ID]) == 1   # a row of a segment being merged
+    resume.set()
+    thread.join(60)
+    assert not thread.is_alive()
+
+    merged = [seg_id for seg_id in index.segment_ids() if seg_id != late]
+    assert len(merged) == 1 and merged[0] not in (first, second)
+    assert index.segment_ids() == [merged[0], late]
+    assert ORLANDO_ID in index.segments()[0][3]  # the late tombstone moved to the merged segment
+
+    reference = SegmentedIndex.create(tmp_path / 'reference', config)
+    reference.append(records)
+    reference.delete([ORLANDO_ID])
+    assert search(index, config) == search(reference, config)
@@ -0,0 +1,90 @@
+"""ShareCombiner: incremental folding of the parties' replies."""
+
+import numpy as np
+import pytest
+
+from secure_search import (
+    ShareCombiner,
+    combine_csp_responses,
+    decrypt_matches,
+    prepare_query_plan,
+    run_fx_hmac_verification,
+)
+from secure_search.wire import decode_eval_response, encode_eval_response
+
+
+@pytest.fixture(scope='module')
+def plan_replies(small_index, config, evaluate):
+    plan = prepare_query_plan("UNIVERSITY FLORIDA", small_index[0], config)
+    return plan, evaluate(plan)
+
+
+def test_out_of_order_folding_matches_combine_csp_responses(small_index, plan_replies):
+    aui, keys = small_index
+    plan, replies = plan_replies
+    expected = combine_csp_responses(plan, replies, aui)
+    combiner = ShareCombiner(plan, aui)
+    for reply in reversed(replies):
+        combiner.add(reply)
+    assert combiner.result() == expected
+
+    vecs, proofs = combiner.arrays()
+    assert decrypt_matches(plan, vecs, aui, keys) == decrypt_matches(plan, expected[0], aui, keys)
+    assert run_fx_hmac_verification(plan, vecs, proofs, aui, keys)
+
+
+def test_binary_and_json_replies_fold_alike(small_index, plan_replies):
+    aui, _ = small_index
+    plan, replies = plan_replies
+    n, byte_len, lam = len(aui['ids']), aui['segment_length'], aui['security_param']
+    binary = [decode_eval_response(encode_eval_response(r['result_blobs'], r['proof_blobs'], n, byte_len, lam))
+              for r in replies]
+    combiner = ShareCombiner(plan, aui)
+    for reply in binary:
+        combiner.add(reply)
+    assert combiner.result() == combine_csp_responses(plan, replies, aui)
+
+
+def test_invalid_reply_is_rejected_without_folding(small_index, plan_replies):
+    aui, _ = small_index
+    plan, replies = plan_replies
+    combiner = ShareCombiner(plan, aui)
+    combiner.add(replies[0])
+    before = combiner.vecs.copy(), combiner.proofs.copy()
+
+    short_share = dict(replies[1], result_blobs=list(replies[1]['result_blobs']))
+    short_share['result_blobs'][-1] = short_share['result_blobs'][-1][:-1]
+    short_proof = dict(replies[1], proof_blobs=[p[:-1] for p in replies[1]['proof_blobs']])
+    missing_token = dict(replies[1], result_blobs=replies[1]['result_blobs'][:-1],
+                         proof_blobs=replies[1]['proof_blobs'][:-1])
+    missing_proof = dict(replies[1], proof_blobs=replies[1]['proof_blobs'][:-1])
+    for bad in (short_share, short_proof, missing_token, missing_proof):
+        with pytest.raises(ValueError):
+            combiner.add(bad)
+    assert combiner.replies == 1
+    assert np.array_equal(combiner.vecs, before[0]) and np.array_equal(combiner.proofs, before[1])
+
+
+def test_reply_from_another_index_version_is_rejected(small_index, plan_replies):
+    aui, _ = small_index
+    plan, replies = plan_replies
+    combiner = ShareCombiner(plan, aui)
+    combiner.add(replies[0], index_version='v1')
+    before = combiner.vecs.copy()
+    with pytest.raises(ValueError, match='index versions'):
+        combiner.add(replies[1], index_version='v2')
+    assert combiner.replies == 1 and np.array_equal(combiner.vecs, before)
+
+
+def test_missing_party_raises(small_index, plan_replies):
+    aui, _ = small_index
+    plan, replies = plan_replies
+    combiner = ShareCombiner(plan, aui)
+    for reply in replies[:-1]:
+        combiner.add(reply)
+    with pytest.raises(ValueError, match='party replies'):
+        combiner.arrays()
+    with pytest.raises(ValueError, match='party replies'):
+        combiner.result()
+    with pytest.raises(ValueError, match='party replies'):
+        combine_csp_responses(plan, replies[:-1], aui)
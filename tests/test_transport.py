@@ -0,0 +1,131 @@
+"""Client transport against local CSP servers: fan-out limits and pooled connections."""
+
+import socket
+import threading
+import time
+
+import pytest
+
+import csp_server
+from secure_search import ShareCombiner, combine_csp_responses, prepare_query_plan, run_fx_hmac_verification
+from secure_search.transport import CSPSession, eval_all
+from secure_search.wire import post_eval
+
+
+@pytest.fixture
+def start_server(served):
+    servers = []
+
+    def start(idle_timeout=csp_server.KEEPALIVE_TIMEOUT):
+        srv = csp_server.make_server(0, threads=2, host='127.0.0.1')
+        srv.idle_timeout = idle_timeout
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return f'http://127.0.0.1:{srv.server_address[1]}'
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+@pytest.fixture
+def hung_endpoint():
+    """An endpoint that accepts connections and never answers."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    yield f'http://127.0.0.1:{listener.getsockname()[1]}'
+    listener.close()
+
+
+@pytest.fixture
+def plan(served, config):
+    return prepare_query_plan("UNIVERSITY FLORIDA", served, config)
+
+
+def test_fan_out_folds_every_reply(start_server, plan, small_index, evaluate):
+    aui, keys = small_index
+    endpoints = [start_server() for _ in range(plan.num_parties)]
+    combiner = ShareCombiner(plan, aui)
+    with CSPSession() as session:
+        result = eval_all(endpoints, plan.payloads, plan.security_param, session=session,
+                          on_reply=lambda _, reply: combiner.add(reply))
+    assert result.ok
+    assert combiner.result() == combine_csp_responses(plan, evaluate(plan), aui)
+    vecs, proofs = combiner.arrays()
+    assert run_fx_hmac_verification(plan, vecs, proofs, aui, keys)
+
+
+def test_party_timeout_only_fails_the_slow_party(start_server, hung_endpoint, plan):
+    endpoints = [start_server(), start_server(), hung_endpoint]
+    start = time.perf_counter()
+    result = eval_all(endpoints, plan.payloads, plan.security_param, party_timeout=[5, 5, 0.3])
+    assert time.perf_counter() - start < 2.0
+    assert [p.ok for p in result.parties] == [True, True, False]
+    assert isinstance(result.parties[2].error, TimeoutError)
+    assert not result.ok
+
+
+def test_deadline_bounds_the_whole_round(start_server, hung_endpoint, plan):
+    endpoints = [start_server(), hung_endpoint, hung_endpoint]
+    start = time.perf_counter()
+    result = eval_all(endpoints, plan.payloads, plan.security_param, party_timeout=30, deadline=0.3)
+    assert time.perf_counter() - start < 2.0
+    assert [p.ok for p in result.parties] == [True, False, False]
+    assert all(isinstance(p.error, TimeoutError) for p in result.parties[1:])
+
+
+def test_session_reuses_connections(start_server, plan):
+    url = start_server() + '/eval'
+    with CSPSession() as session:
+        for _ in range(3):
+            post_eval(url, plan.payloads[0], plan.security_param, session=session)
+        stats = session.stats()
+    assert stats['connections_opened'] == 1 and stats['reused'] == 2
+
+
+def test_stale_pooled_connection_is_retried_once(start_server, plan):
+    url = start_server(idle_timeout=0.2) + '/eval'
+    with CSPSession(idle_timeout=60) as session:
+        first = post_eval(url, plan.payloads[0], plan.security_param, session=session)
+        time.sleep(0.6)  # the server closes the parked connection meanwhile
+        second = post_eval(url, plan.payloads[0], plan.security_param, session=session)
+        stats = session.stats()
+    assert first['result_blobs'] == second['result_blobs']
+    assert stats['reconnects'] == 1 and stats['connections_opened'] == 2
+
+
+def test_fresh_connection_failure_is_not_retried(plan):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    url = f'http://127.0.0.1:{listener.getsockname()[1]}/eval'
+
+    def close_every_connection():
+        for _ in range(2):
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            conn.recv(65536)
+            conn.close()
+
+    threading.Thread(target=close_every_connection, daemon=True).start()
+    try:
+        with CSPSession() as session:
+            with pytest.raises(ConnectionError):
+                post_eval(url, plan.payloads[0], plan.security_param, session=session)
+            assert session.stats()['reconnects'] == 0
+    finally:
+        listener.close()
+
+
+def test_idle_connections_expire_in_the_session(start_server, plan):
+    url = start_server() + '/eval'
+    with CSPSession(idle_timeout=0.2) as session:
+        post_eval(url, plan.payloads[0], plan.security_param, session=session)
+        time.sleep(0.4)
+        post_eval(url, plan.payloads[0], plan.security_param, session=session)
+        stats = session.stats()
+    assert stats['expired'] == 1 and stats['reconnects'] == 0 and stats['connections_opened'] == 2
@@ -0,0 +1,106 @@
+"""FX+HMAC verification: the batched Verifier against the per-token equation."""
+
+import hashlib
+import hmac
+
+import pytest
+
+from SetupProcess import F, FC_eval, FX, bytes_xor
+from positions import hash_positions, index_hashing
+from secure_search import Verifier, combine_csp_responses, prepare_query_plan, run_fx_hmac_verification
+from verification import verify_fx_hmac
+
+QUERIES = ["ORLANDO", "UNIVERSITY FLORIDA", "COLLEGE; R: 28.3,-81.5,28.7,-81.2", "NOSUCHWORD"]
+
+
+def baseline_verify(tokens, aui, keys, vecs, proofs):
+    """proof[t] == XOR_i FX(Ki, res_t[i] ^ pad_i) ^ N_S,ID, one token and one object at a time."""
+    Ke, Kv, Kh = keys
+    ids = aui['ids']
+    m1, m2, lam, bl = aui['m1'], aui['m2'], aui['security_param'], aui['segment_length']
+    hashing = index_hashing(aui)
+    cat_ids = "".join(str(x) for x in ids).encode('utf-8')
+    for tok, vec, proof in zip(tokens, vecs, proofs):
+        if tok.startswith("CELL:"):
+            cols = hash_positions(tok, m1, aui['k_spa'], hashing)
+        else:
+            cols = [m1 + j for j in hash_positions(tok, m2, aui['k_tex'], hashing)]
+        acc = bytes(lam)
+        for i, obj_id in enumerate(ids, start=1):
+            pad = F(Ke, (str(i) + str(obj_id)).encode('utf-8'), (m1 + m2) * bl)
+            cell = vec[i - 1]
+            for c in cols:
+                cell = bytes_xor(cell, pad[c * bl:(c + 1) * bl])
+            acc = bytes_xor(acc, FX(FC_eval(Kv, str(i).encode('utf-8'), lam), cell, lam))
+        for c in cols:
+            acc = bytes_xor(acc, hmac.new(Kh, str(c + 1).encode('utf-8') + cat_ids, hashlib.sha256).digest()[:lam])
+        if acc != bytes(proof):
+            return False
+    return True
+
+
+@pytest.fixture(scope='module')
+def results(small_index, config, evaluate):
+    aui, _ = small_index
+    out = []
+    for query in QUERIES:
+        plan = prepare_query_plan(query, aui, config)
+        vecs, proofs = combine_csp_responses(plan, evaluate(plan), aui)
+        out.append((plan, [tok for _, tok in plan.tokens], vecs, proofs))
+    return out
+
+
+def _flip_vector(vecs):
+    bad = [list(cells) for cells in vecs]
+    bad[0][5] = bytes([bad[0][5][0] ^ 4]) + bad[0][5][1:]
+    return bad
+
+
+def _flip_proof(proofs):
+    return [bytes([proofs[0][0] ^ 1]) + proofs[0][1:]] + list(proofs[1:])
+
+
+def test_verifier_agrees_with_per_token_baseline(small_index, results):
+    aui, keys = small_index
+    verifier = Verifier(aui, keys)
+    for _, tokens, vecs, proofs in results:
+        assert baseline_verify(tokens, aui, keys, vecs, proofs)
+        assert verifier.verify(tokens, vecs, proofs)
+        for bad_vecs, bad_proofs in ((_flip_vector(vecs), proofs), (vecs, _flip_proof(proofs))):
+            assert not baseline_verify(tokens, aui, keys, bad_vecs, bad_proofs)
+            assert not verifier.verify(tokens, bad_vecs, bad_proofs)
+
+
+@pytest.mark.parametrize('rounds', [None, 40])
+def test_tampered_results_are_rejected(small_index, results, rounds):
+    aui, keys = small_index
+    verifier = Verifier(aui, keys)
+    items = [(tokens, vecs, proofs) for _, tokens, vecs, proofs in results]
+    assert verifier.verify_many(items, rounds=rounds) == [True] * len(items)
+
+    tampered = list(items)
+    tokens, vecs, proofs = items[1]
+    tampered[1] = (tokens, _flip_vector(vecs), proofs)
+    tokens, vecs, proofs = items[2]
+    tampered[2] = (tokens, vecs, _flip_proof(proofs))
+    # a bad result passes all subset checks with probability 2**-rounds; a failed
+    # check falls back to per-token checks, which name the bad items
+    assert verifier.verify_many(tampered, rounds=rounds) == [True, False, False, True]
+
+
+@pytest.mark.parametrize('rounds', [None, 4])
+def test_wrong_length_proof_is_rejected(small_index, results, rounds):
+    aui, keys = small_index
+    plan, tokens, vecs, proofs = results[1]
+    assert not run_fx_hmac_verification(plan, vecs, [proofs[0][:-1]] + proofs[1:], aui, keys, rounds=rounds)
+    assert not run_fx_hmac_verification(plan, vecs, proofs[:-1], aui, keys, rounds=rounds)
+    assert verify_fx_hmac(plan.query, aui, keys, vecs, proofs, tokens_override=tokens, rounds=rounds)
+
+
+def test_fx_tables_are_built_only_for_touched_records(small_index, results):
+    aui, keys = small_index
+    verifier = Verifier(aui, keys, max_fx_rows=8)
+    assert not verifier._fx_rows
+    for _, tokens, vecs, proofs in results:
+        assert verifier.verify(tokens, vecs, proofs)
+        assert len(verifier._fx_rows) <= 8
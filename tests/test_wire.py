@@ -0,0 +1,97 @@
+"""Binary wire format: round trips, malformed frames and security_param handling."""
+
+import json
+
+import pytest
+
+import csp_server
+from secure_search import prepare_query_plan, wire
+from secure_search.wire import WireError
+
+TOKENS = [
+    {"type": "kw", "buckets": [{"columns": [3, 17, 199], "bits": [1, 0, 1]},
+                               {"columns": [0], "bits": [0]}]},
+    {"type": "spa", "buckets": [{"columns": list(range(11)), "bits": [1, 1, 0, 0, 1, 0, 1, 1, 1, 0, 1]}]},
+    {"type": "kw", "buckets": []},
+]
+
+
+def test_eval_request_round_trip():
+    data = wire.encode_eval_request(TOKENS, 16, party_id=2)
+    assert wire.decode_request(data, wire.BINARY_CONTENT_TYPE) == {
+        "tokens": TOKENS, "security_param": 16, "party_id": 2}
+    assert "party_id" not in wire.decode_eval_request(wire.encode_eval_request(TOKENS, 16))
+
+
+def test_batch_request_round_trip():
+    queries = [TOKENS, TOKENS[:1], []]
+    data = wire.encode_batch_request(queries, 16, party_id=0)
+    assert wire.decode_request(data, wire.BINARY_CONTENT_TYPE + "; v=1") == {
+        "queries": [{"tokens": q} for q in queries], "security_param": 16, "party_id": 0}
+
+
+def test_response_round_trips():
+    n, byte_len, lam = 5, 4, 16
+    vecs = [bytes(range(i, i + n * byte_len)) for i in range(3)]
+    proofs = [bytes([i]) * lam for i in range(3)]
+    single = wire.encode_eval_response(vecs, proofs, n, byte_len, lam)
+    assert wire.decode_response(single, wire.BINARY_CONTENT_TYPE) == {
+        "n": n, "byte_len": byte_len, "result_blobs": vecs, "proof_blobs": proofs}
+
+    segmented = wire.encode_segmented_response(
+        [("seg-0", vecs, proofs, n, byte_len), ("seg-1", vecs[:1], proofs[:1], n, byte_len)], 7, lam)
+    decoded = wire.decode_eval_response(segmented)
+    assert decoded["generation"] == 7
+    assert [s["segment"] for s in decoded["segments"]] == ["seg-0", "seg-1"]
+    assert decoded["segments"][1]["result_blobs"] == vecs[:1]
+
+    batch = wire.decode_eval_response(wire.encode_batch_response([single, segmented]))
+    assert batch["results"][0]["proof_blobs"] == proofs
+    assert batch["results"][1]["generation"] == 7
+    assert wire.token_shares(batch["results"][0], 2) == (vecs[2], proofs[2])
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"XXXX" + wire.encode_eval_request(TOKENS, 16)[4:],
+    wire.encode_eval_request(TOKENS, 16)[:-1],
+    wire.encode_eval_request(TOKENS, 16) + b"\0",
+    wire.encode_eval_request([{"type": "kw", "buckets": []}], 16)[:-3] + b"\x07\x00\x00",
+])
+def test_malformed_requests_are_rejected(data):
+    with pytest.raises(WireError):
+        wire.decode_eval_request(data)
+
+
+def test_malformed_responses_are_rejected():
+    good = wire.encode_eval_response([bytes(8)], [bytes(16)], 2, 4, 16)
+    for data in (good[:-1], good + b"\0", good[:6] + b"\x09" + good[7:], b"SSRS\x01\x05"):
+        with pytest.raises(WireError):
+            wire.decode_eval_response(data)
+    with pytest.raises(WireError):
+        wire.encode_eval_response([bytes(8)], [bytes(15)], 2, 4, 16)
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_mismatched_security_param_is_a_client_error(served, config, binary):
+    plan = prepare_query_plan("ORLANDO", served, config)
+    for path, build in (("/eval", lambda lam: (plan.payloads[0], lam)),
+                        ("/eval_batch", lambda lam: ([plan.payloads[0]], lam))):
+        for lam, expected in ((16, 200), (8, 400), (32, 400)):
+            body, ctype = _request(path, *build(lam), binary)
+            status, reply, _, _ = csp_server.handle_request(
+                path, body, ctype, wire.BINARY_CONTENT_TYPE if binary else None)
+            assert status == expected, (path, lam, reply)
+            if status == 400:
+                assert b"security_param" in reply
+
+
+def _request(path, tokens, lam, binary):
+    if path == "/eval":
+        if binary:
+            return wire.encode_eval_request(tokens, lam), wire.BINARY_CONTENT_TYPE
+        return json.dumps({"tokens": tokens, "security_param": lam}).encode(), wire.JSON_CONTENT_TYPE
+    if binary:
+        return wire.encode_batch_request(tokens, lam), wire.BINARY_CONTENT_TYPE
+    body = {"queries": [{"tokens": t} for t in tokens], "security_param": lam}
+    return json.dumps(body).encode(), wire.JSON_CONTENT_TYPE
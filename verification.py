@@ -1,7 +1,14 @@
 import hashlib
 import hmac
-from SetupProcess import FC_eval, FX, F
+import secrets
+
+import numpy as np
+from SetupProcess import FC_eval, pad_cells
 from QueryUtils import tokenize_normalized
+from positions import hash_positions, index_hashing
+
+# Records whose FX tables a Verifier keeps (about 2 KiB each for 4-byte cells, lambda = 16).
+MAX_FX_ROWS = 65536
 
 
 def _col_bytes(matrix_2d):
@@ -66,9 +73,196 @@ def verify_integrity(authenticated_index: dict, K_final: tuple, tags: dict) -> b
     return True
 
 
+def _token_cells(vectors, n: int, byte_len: int) -> np.ndarray:
+    """(n, byte_len) uint8 view of one token's combined vector (per-object bytes or a flat buffer)."""
+    if isinstance(vectors, np.ndarray):
+        return vectors.reshape(n, byte_len)
+    return np.frombuffer(b"".join(bytes(v) for v in vectors), dtype=np.uint8).reshape(n, byte_len)
+
+
+class Verifier:
+    """
+    FX+HMAC verification state for one (authenticated index, keys) pair.
+
+    Everything that depends only on the index and keys is derived at most once and reused
+    by every query: the HMAC(Kh) key schedule, the per-column HMAC(Kh, j||cat_ids) tags
+    (the column label precedes cat_ids, so tags are memoised per column rather than
+    resumed from a cat_ids midstate) and, per record, the key Ki = FC_eval(Kv, i) with
+    its FX tables (one 16-entry table per nibble of the cell, folded from the bit blocks
+    PRF(Ki, b) like FXTable does per byte).
+
+    Record tables are built lazily, only for records whose decrypted cells are non-zero
+    -- the matches of the queries seen so far -- so a fresh Verifier costs no per-record
+    HMACs.  Each cached record holds 2 * segment_length * 16 * lambda bytes (2 KiB for
+    4-byte cells and lambda = 16); at most max_fx_rows records are kept, the oldest
+    being dropped first.
+
+    verify_many() checks all tokens of several queries in one pass over the objects:
+    the pads of every selected column are read once, and FX(Ki, res_t[i] ^ pad) summed
+    over i is one table lookup per nibble of the decrypted cells and an XOR-reduction,
+    since FX is XOR-linear in its input for a fixed Ki.
+    """
+
+    def __init__(self, authenticated_index: dict, K_final: tuple, pads=None, max_fx_rows: int = MAX_FX_ROWS):
+        Ke, Kv, Kh = K_final
+        ids = authenticated_index.get('ids', [])
+        self.n = len(ids)
+        self.m1 = int(authenticated_index['m1'])
+        self.m2 = int(authenticated_index['m2'])
+        self.lam = int(authenticated_index['security_param'])
+        self.byte_len = int(authenticated_index['segment_length'])
+        self.k_tex = int(authenticated_index.get('k_tex', 4))
+        self.k_spa = int(authenticated_index.get('k_spa', 3))
+        self.hashing = index_hashing(authenticated_index)
+        self.Ke = Ke
+        # optional secure_search.pad_table.PadTable for this index; pads are derived from Ke otherwise
+        self.pads = pads
+        self._row_data = [(str(i) + str(ids[i - 1])).encode('utf-8') for i in range(1, self.n + 1)]
+        self.cat_ids = "".join(str(x) for x in ids).encode('utf-8')
+        self._kh = hmac.new(Kh, digestmod=hashlib.sha256)
+        self._column_tags = {}
+        self.Kv = Kv
+        self.max_fx_rows = max_fx_rows
+        self._fx_rows = {}  # record index (0-based) -> its (2 * byte_len, 16, lam) FX tables
+        self._fx_labels = [b"FX" + b.to_bytes(4, 'big') for b in range(self.byte_len * 8)]
+
+    def record_key(self, row: int) -> bytes:
+        """Ki = FC_eval(Kv, i) of the record at 0-based ``row``."""
+        return FC_eval(self.Kv, str(row + 1).encode('utf-8'), output_len=self.lam)
+
+    def _fx_table(self, row: int) -> np.ndarray:
+        # bit blocks PRF(Ki, b), bit order as in FX
+        base = hmac.new(self.record_key(row), digestmod=hashlib.sha256)
+        out = bytearray()
+        for label in self._fx_labels:
+            h = base.copy()
+            h.update(label)
+            out += h.digest()[:self.lam]
+        blocks = np.frombuffer(bytes(out), dtype=np.uint8).reshape(self.byte_len * 2, 4, self.lam)
+        # table[nibble, v] = FX of nibble value v; 8-byte words when lam allows
+        table = np.zeros((len(blocks), 16, self.lam), dtype=np.uint8)
+        for v in range(1, 16):
+            low = v & -v
+            table[:, v] = table[:, v ^ low] ^ blocks[:, low.bit_length() - 1]
+        return table.view('<u8') if self.lam % 8 == 0 else table
+
+    def fx_tables(self, rows) -> np.ndarray:
+        """Stacked FX tables of ``rows`` (record-major, 2 * byte_len nibbles each), built on first use."""
+        cache = self._fx_rows
+        tables = []
+        for row in rows:
+            table = cache.get(row)
+            if table is None:
+                table = self._fx_table(row)
+                while cache and len(cache) >= self.max_fx_rows:
+                    del cache[next(iter(cache))]
+                if self.max_fx_rows > 0:
+                    cache[row] = table
+            tables.append(table)
+        return np.concatenate(tables)
+
+    def token_columns(self, tok) -> list:
+        """Global pad/tag columns (spatial first, then m1 + j) selected by a token."""
+        if isinstance(tok, str) and tok.startswith("CELL:"):
+            return hash_positions(tok, self.m1, self.k_spa, self.hashing)
+        return [self.m1 + j for j in hash_positions(tok, self.m2, self.k_tex, self.hashing)]
+
+    def _column_tag(self, col: int) -> np.ndarray:
+        tag = self._column_tags.get(col)
+        if tag is None:
+            h = self._kh.copy()
+            h.update(str(col + 1).encode('utf-8'))
+            h.update(self.cat_ids)
+            tag = self._column_tags[col] = np.frombuffer(h.digest()[:self.lam], dtype=np.uint8)
+        return tag
+
+    def nsid(self, columns) -> np.ndarray:
+        """N_S,ID = XOR_{j in S} HMAC(Kh, j||cat_ids) for the token's columns."""
+        acc = np.zeros(self.lam, dtype=np.uint8)
+        for col in columns:
+            acc ^= self._column_tag(col)
+        return acc
+
+    def _pad_cells(self, columns: list) -> np.ndarray:
+        if self.pads is not None:
+            return self.pads.cells(np.arange(self.n), columns)
+        total_len = (self.m1 + self.m2) * self.byte_len
+        return pad_cells(self.Ke, self._row_data, total_len, columns, self.byte_len)
+
+    def fx_sum(self, plain: np.ndarray) -> np.ndarray:
+        """XOR_i FX(Ki, plain[i]) for (n, byte_len) cells: one pass over the objects."""
+        nibbles = np.stack([plain & 15, plain >> 4], axis=-1).reshape(-1)
+        # zero nibbles contribute nothing; honest cells are mostly zero outside matches
+        live = np.flatnonzero(nibbles)
+        if not len(live):
+            return np.zeros(self.lam, dtype=np.uint8)
+        per_row = self.byte_len * 2
+        rows, slot = np.unique(live // per_row, return_inverse=True)
+        tables = self.fx_tables(rows.tolist())
+        picked = tables[slot * per_row + live % per_row, nibbles[live]]
+        return np.bitwise_xor.reduce(picked, axis=0).view(np.uint8)
+
+    def verify(self, tokens: list, combined_vectors, combined_proofs, rounds: int | None = None) -> bool:
+        return self.verify_many([(tokens, combined_vectors, combined_proofs)], rounds=rounds)[0]
+
+    def verify_many(self, items, rounds: int | None = None) -> list:
+        """
+        Verify several (tokens, combined_vectors, combined_proofs) results; one bool per item.
+
+        rounds=None checks every token (one FX pass each).  With rounds=r and more than r
+        tokens in total, r random-subset checks are made instead: each XORs the decrypted
+        vectors and the proof ^ N_S,ID targets of a random subset of all tokens and checks
+        one FX pass of the combination, which FX's XOR-linearity makes equal to the XOR of
+        the per-token sums.  A subset misses a wrong token with probability 1/2, so a bad
+        result passes with probability at most 2**-r.  If a subset check fails, the tokens
+        are checked one by one to tell which items are wrong.
+        """
+        results = [True] * len(items)
+        checks = []  # (item index, columns, vector cells, proof)
+        for idx, (tokens, vectors, proofs) in enumerate(items):
+            if len(tokens) != len(vectors) or len(tokens) != len(proofs):
+                results[idx] = False
+                continue
+            for tok, vec, proof in zip(tokens, vectors, proofs):
+                checks.append((idx, self.token_columns(tok), vec, bytes(proof)))
+        if not checks:
+            return results
+
+        # pads of every selected column, for all objects at once
+        union = sorted({c for _, cols, _, _ in checks for c in cols})
+        pos = {c: k for k, c in enumerate(union)}
+        # column-major so each column's pads are one contiguous (n, byte_len) block
+        cells = np.ascontiguousarray(self._pad_cells(union).transpose(1, 0, 2))
+        plains = np.empty((len(checks), self.n, self.byte_len), dtype=np.uint8)
+        targets = np.empty((len(checks), self.lam), dtype=np.uint8)
+        for t_idx, (_, cols, vec, proof) in enumerate(checks):
+            plain = plains[t_idx]
+            plain[...] = _token_cells(vec, self.n, self.byte_len)
+            for c in cols:
+                plain ^= cells[pos[c]]
+            if len(proof) != self.lam:
+                results[checks[t_idx][0]] = False
+                targets[t_idx] = 0
+                continue
+            targets[t_idx] = np.frombuffer(proof, dtype=np.uint8) ^ self.nsid(cols)
+
+        if rounds is not None and 0 < rounds < len(checks):
+            subsets = np.unpackbits(np.frombuffer(secrets.token_bytes(rounds * ((len(checks) + 7) // 8)),
+                                                  dtype=np.uint8)).reshape(rounds, -1)[:, :len(checks)].view(bool)
+            if all(np.array_equal(self.fx_sum(np.bitwise_xor.reduce(plains[subset], axis=0)),
+                                  np.bitwise_xor.reduce(targets[subset], axis=0))
+                   for subset in subsets):
+                return results
+
+        for t_idx, (idx, _, _, _) in enumerate(checks):
+            if results[idx] and not np.array_equal(self.fx_sum(plains[t_idx]), targets[t_idx]):
+                results[idx] = False
+        return results
+
+
 def verify_fx_hmac(query: str, authenticated_index: dict, K_final: tuple,
                    combined_vectors: list, combined_proofs: list,
-                   tokens_override: list | None = None) -> bool:
+                   tokens_override: list | None = None, pads=None, rounds: int | None = None) -> bool:
     """
     Strict verification per paper: For each token block t,
       combined_proof[t] == (XOR_i FX(Ki, res_t[i])) XOR N_S,ID
@@ -77,63 +271,12 @@ def verify_fx_hmac(query: str, authenticated_index: dict, K_final: tuple,
     - combined_vectors: list of object-level plaintext XOR vectors per token (bytes per object)
       Caller must pass decrypted res_t[i] (after removing one-time pad on selected columns).
     - combined_proofs: list of bytes (XOR of sigma over selected columns)
-    """
-    Ke, Kv, Kh = K_final
-    ids = authenticated_index.get('ids', [])
-    m1 = authenticated_index['m1']
-    m2 = authenticated_index['m2']
-    lam = authenticated_index['security_param']
-    byte_len = authenticated_index['segment_length']
-    k_tex = authenticated_index.get('k_tex', 4)
-    k_spa = authenticated_index.get('k_spa', 3)
-
-    cat_ids = "".join(str(x) for x in ids).encode('utf-8')
-
-    # Selection indices per normalized token
-    import hashlib
-    def _hash_pos(item: str, size: int, k: int):
-        h1 = int(hashlib.sha256(item.encode('utf-8')).hexdigest(), 16)
-        h2 = int(hashlib.md5(item.encode('utf-8')).hexdigest(), 16)
-        return [(h1 + i * h2) % size for i in range(k)]
+    - pads: optional secure_search.pad_table.PadTable; pads are then read from the
+      owner-precomputed table instead of derived from Ke
+    - rounds: randomized batch verification with this many subset checks (see Verifier.verify_many)
 
+    Builds a one-off Verifier, which only derives the FX tables of the records the
+    result touches; callers verifying many queries should keep one to reuse them.
+    """
     tokens = tokens_override if tokens_override is not None else (tokenize_normalized(query) or [query])
-
-    if len(tokens) != len(combined_vectors) or len(tokens) != len(combined_proofs):
-        return False
-
-    n = len(ids)
-    for t_idx, tok in enumerate(tokens):
-        is_spatial = isinstance(tok, str) and tok.startswith("CELL:")
-        if is_spatial:
-            indices = _hash_pos(tok, m1, k_spa)
-        else:
-            indices = _hash_pos(tok, m2, k_tex)
-        # sum FX over objects
-        fx_sum = b"\x00" * lam
-        fx_pad_sum = b"\x00" * lam
-        for i in range(1, n + 1):
-            Ki = FC_eval(Kv, str(i).encode('utf-8'), output_len=lam)
-            fx_val = FX(Ki, combined_vectors[t_idx][i - 1], output_len=lam)
-            fx_sum = bytes(a ^ b for a, b in zip(fx_sum, fx_val))
-            # pad_acc for this object and token selection
-            total_len = (m1 + m2) * byte_len
-            pad = F(K_final[0], (str(i) + str(ids[i - 1])).encode('utf-8'), total_len)
-            pad_acc = b"\x00" * byte_len
-            for j in indices:
-                start = (j * byte_len) if is_spatial else ((m1 + j) * byte_len)
-                pad_acc = bytes(a ^ b for a, b in zip(pad_acc, pad[start:start + byte_len]))
-            fx_pad = FX(Ki, pad_acc, output_len=lam)
-            fx_pad_sum = bytes(a ^ b for a, b in zip(fx_pad_sum, fx_pad))
-        # N_S,ID
-        nsid = b"\x00" * lam
-        for j in indices:
-            if is_spatial:
-                h = hmac.new(Kh, str(j + 1).encode('utf-8') + cat_ids, hashlib.sha256).digest()[:lam]
-            else:
-                h = hmac.new(Kh, str(j + 1 + m1).encode('utf-8') + cat_ids, hashlib.sha256).digest()[:lam]
-            nsid = bytes(a ^ b for a, b in zip(nsid, h))
-        expected = bytes(a ^ b for a, b in zip(fx_sum, nsid))
-        expected = bytes(a ^ b for a, b in zip(expected, fx_pad_sum))
-        if expected != combined_proofs[t_idx]:
-            return False
-    return True
+    return Verifier(authenticated_index, K_final, pads).verify(tokens, combined_vectors, combined_proofs, rounds=rounds)
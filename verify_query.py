@@ -1,17 +1,12 @@
 ﻿from QueryUtils import pad_query_blocks
-import hashlib
-
-
-def _hash_pos(item: str, size: int, k: int):
-    h1 = int(hashlib.sha256(item.encode('utf-8')).hexdigest(), 16)
-    h2 = int(hashlib.md5(item.encode('utf-8')).hexdigest(), 16)
-    return [(h1 + i * h2) % size for i in range(k)]
+from positions import hash_positions, index_hashing
 
 
 def recompute_proofs_only(query: str, AUI: dict, suppression: dict | None):
     I_tex = AUI['I_tex']
     m2 = AUI['m2']
     k_tex = AUI.get('k_tex', 4)
+    hashing = index_hashing(AUI)
 
     tokens = [t for t in query.split() if t.strip()] or [query]
     if suppression and suppression.get('enable_padding', True):
@@ -22,7 +17,7 @@ def recompute_proofs_only(query: str, AUI: dict, suppression: dict | None):
     proofs = []
     lam = len(I_tex['sigma'][0]) if I_tex['sigma'] else 16
     for tok in tokens:
-        idxs = _hash_pos(tok, m2, k_tex)
+        idxs = hash_positions(tok, m2, k_tex, hashing)
         p = b"\x00" * lam
         for j in idxs:
             p = bytes(a ^ b for a, b in zip(p, I_tex['sigma'][j]))